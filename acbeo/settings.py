@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
+
 import os
 from pathlib import Path
 
@@ -26,12 +27,23 @@ SECRET_KEY = os.getenv(
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("ENVIRONMENT") != "PROD"
 
+# Log queries slower than SLOW_QUERY_MS with their plan, see `manage.py slow_queries`
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "/tmp/acbeo-slow-queries.log")
+
 LOGGING = {
     "version": 1,
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
         },
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERY_LOG,
+            "maxBytes": 5 * 1024 * 1024,
+            "backupCount": 3,
+            "delay": True,
+        },
     },
     "loggers": {
         "spam-protection": {
@@ -39,6 +51,20 @@ LOGGING = {
             "level": "INFO",
             "format": "{asctime} {levelname} {message}",
         },
+        # A JSON line per request in production, see news/middleware.py
+        "instrumentation": {
+            "handlers": ["console"],
+            "level": os.getenv(
+                "INSTRUMENTATION_LOG_LEVEL", "WARNING" if DEBUG else "INFO"
+            ),
+            "propagate": False,
+        },
+        # A JSON line per slow query, see news/middleware.py
+        "slow_queries": {
+            "handlers": ["slow_queries"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -79,15 +105,32 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "news.middleware.InstrumentationMiddleware",
     "news.middleware.RedirectToNonWwwMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "news.middleware.CompressionMiddleware",
+    "news.middleware.CachedAuthenticationMiddleware",
+    "news.middleware.ReadYourWritesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "news.middleware.ProfilerMiddleware",
 ]
 
+# Allows Prometheus to scrape /metrics, see news/metrics.py
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Profile 1 in PROFILE_SAMPLE_RATE requests and keep slow ones, see news/middleware.py
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", BASE_DIR / "profiles")
+
+# Compress responses of these types and sizes, but not pages with CSRF tokens, see
+# news/middleware.py. Static files are compressed when building the container.
+COMPRESSION_CONTENT_TYPES = ["text/html", "application/json"]
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+
 ROOT_URLCONF = "acbeo.urls"
 
 LOGIN_URL = "login"
@@ -95,6 +138,32 @@ LOGIN_REDIRECT_URL = "/"
 AUTH_USER_MODEL = "news.Pilot"
 
 SESSION_COOKIE_AGE = 240 * 24 * 60 * 60  # Stay logged in for 240 days
+# Sessions and logged in pilots are read from the cache, which must be shared by the
+# workers, see news/middleware.py. Expired sessions are deleted by clear_sessions.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+if "REDIS_URL" in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR", "/tmp/acbeo-cache"),
+            # Django's default of 300 entries would cull sessions of active pilots
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10_000))},
+        }
+    }
+# Tests use a cache and storage of their own, see acbeo/test_runner.py
+TEST_RUNNER = "acbeo.test_runner.TestRunner"
+
+# Server-sent events, served via ASGI only, see trainings/events.py. Streams end after
+# their duration and clients reconnect.
+EVENTS_POLL_INTERVAL = int(os.getenv("EVENTS_POLL_INTERVAL", 5))  # Seconds
+EVENTS_STREAM_DURATION = int(os.getenv("EVENTS_STREAM_DURATION", 300))  # Seconds
 
 TEMPLATES = [
     {
@@ -121,15 +190,52 @@ WSGI_APPLICATION = "acbeo.wsgi.application"
 if "DATABASE_URL" in os.environ:
     import dj_database_url
 
-    DATABASES = {"default": dj_database_url.config(conn_max_age=600)}
+    # Reconnect after the database restarted, instead of failing a request
+    DATABASES = {
+        "default": dj_database_url.config(conn_max_age=600, conn_health_checks=True)
+    }
+    # Share connections between threads of a worker, needs psycopg 3 with pool
+    if "DATABASE_POOL_MAX_SIZE" in os.environ:
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.environ["DATABASE_POOL_MAX_SIZE"]),
+                "timeout": int(os.getenv("DATABASE_POOL_TIMEOUT", "10")),
+            }
+        }
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction starts, such that waiting for it
+            # respects busy_timeout instead of failing when upgrading from a read
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
         }
     }
 
+# Heavy reporting views read from a replica, see news/database.py
+REPLICA_DATABASE = "replica"
+if "REPLICA_DATABASE_URL" in os.environ:
+    import dj_database_url
+
+    DATABASES[REPLICA_DATABASE] = dj_database_url.parse(
+        os.environ["REPLICA_DATABASE_URL"], conn_max_age=600, conn_health_checks=True
+    )
+DATABASE_ROUTERS = ["news.database.ReplicaRouter"]
+REPLICA_STICKINESS = int(os.getenv("REPLICA_STICKINESS", "10"))  # s
+
+# Applied to each connection to SQLite, see news/database.py
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -32 * 1024,  # in KiB
+    "busy_timeout": 5000,  # ms
+    "temp_store": "memory",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -167,8 +273,32 @@ USE_TZ = True
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATIC_URL = "static/"
+# Files get hashed names, such that WhiteNoise serves them as immutable, and gzip and
+# brotli variants. References to missing files, e.g. in CSS, fail collectstatic.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Accounts of the journal for the accounting software, see bookkeeping/journal.py
+JOURNAL_ACCOUNTS = {
+    "cash": "1000",
+    "bank": "1020",
+    "twint": "1025",
+    "flights": "3000",
+    "day_passes": "3100",
+    "prepaid_flights": "3200",
+    "equipment": "3400",
+    # Expenses by reason, others are booked on "expenses"
+    "Tanken": "6200",
+    "Parkkarte": "6200",
+    "Kleber Axalpstrasse": "6200",
+    "expenses": "6700",
+}
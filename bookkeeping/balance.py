@@ -0,0 +1,182 @@
+"""
+Balance of the reports of a year. It only contains plain values, e.g. transactions as
+dicts, such that it can be cached, see news/caching.py.
+"""
+
+from datetime import date
+from itertools import groupby
+
+from django.utils.formats import date_format
+
+from . import journal
+from .models import Absorption, Bill, Expense, PaymentMethods, Purchase, Report, Run
+from news import caching
+from news.models import Pilot
+from trainings.models import Signup, Training
+
+# Models the balance depends on, e.g. on pilots for descriptions and the active pilots
+MODELS = [Absorption, Bill, Expense, Pilot, Purchase, Report, Run, Signup, Training]
+caching.track(*MODELS)
+
+
+# Revenue in the order of the balance, bank transfers are only used for absorptions
+REVENUE = [
+    "revenue_from_absorptions",
+    "revenue_from_day_passes",
+    "revenue_from_prepaid_flights",
+    "revenue_from_flights",
+    "revenue_from_equipment",
+    "total_revenue",
+]
+REVENUE_METHODS = [
+    method for method in PaymentMethods if method != PaymentMethods.BANK_TRANSFER
+]
+
+
+def as_transaction(expediture):
+    return {
+        "date": expediture.report.training.date,
+        "description": expediture.description,
+        "amount": expediture.amount,
+    }
+
+
+def revenue(bills, absorptions):
+    """Revenue by category and payment method"""
+    revenue = {category: {} for category in REVENUE}
+    for method in REVENUE_METHODS:
+        absorptions_paid_with_method = [
+            absorption for absorption in absorptions if absorption.method == method
+        ]
+        revenue["revenue_from_absorptions"][method.label] = sum(
+            absorption.amount for absorption in absorptions_paid_with_method
+        )
+
+        bills_paid_with_method = [bill for bill in bills if bill.method == method]
+        purchases = [
+            purchase
+            for bill in bills_paid_with_method
+            for purchase in bill.signup.purchases.all()
+        ]
+        revenue["revenue_from_day_passes"][method.label] = sum(
+            purchase.price for purchase in purchases if purchase.is_day_pass
+        )
+        revenue["revenue_from_prepaid_flights"][method.label] = sum(
+            purchase.price for purchase in purchases if purchase.is_prepaid_flights
+        )
+        revenue["revenue_from_equipment"][method.label] = sum(
+            purchase.price for purchase in purchases if purchase.is_equipment
+        )
+        revenue["total_revenue"][method.label] = (
+            sum(bill.amount for bill in bills_paid_with_method)
+            + revenue["revenue_from_absorptions"][method.label]
+        )
+        revenue["revenue_from_flights"][method.label] = (
+            revenue["total_revenue"][method.label]
+            - revenue["revenue_from_absorptions"][method.label]
+            - revenue["revenue_from_day_passes"][method.label]
+            - revenue["revenue_from_prepaid_flights"][method.label]
+            - revenue["revenue_from_equipment"][method.label]
+        )
+    return revenue
+
+
+def aggregate(reports):
+    balance = {}
+
+    # Overview
+    reports = sorted(reports, key=lambda report: report.training.date)
+    balance["num_reports"] = len(reports)
+    runs = [run for report in reports for run in report.runs.all()]
+    balance["num_runs"] = len(set(run.created_on for run in runs))
+    balance["num_flights"] = sum(run.is_flight for run in runs)
+    signups = [signup for report in reports for signup in report.training.signups.all()]
+    balance["num_pilots"] = len(
+        set(signup.pilot for signup in signups if signup.is_paid)
+    )
+    balance["num_open_signups"] = sum(signup.must_be_paid for signup in signups)
+
+    # Revenue, per report for the journal and summed up for the year
+    revenue_by_report = [
+        revenue(report.bills.all(), report.absorptions.all()) for report in reports
+    ]
+    for category in REVENUE:
+        balance[category] = {
+            method.label: sum(
+                revenue_of_report[category][method.label]
+                for revenue_of_report in revenue_by_report
+            )
+            for method in REVENUE_METHODS
+        }
+    absorptions = [
+        absorption for report in reports for absorption in report.absorptions.all()
+    ]
+    bills = [bill for report in reports for bill in report.bills.all()]
+
+    # Expeditures
+    expeditures = absorptions + [
+        expense for report in reports for expense in report.expenses.all()
+    ]
+    by_reason = lambda expediture: expediture.reason
+    balance["expeditures_by_reason"] = {
+        reason: sum(expediture.amount for expediture in expeditures_with_reason)
+        for reason, expeditures_with_reason in groupby(
+            sorted(expeditures, key=by_reason), key=by_reason
+        )
+    }
+    balance["total_expeditures"] = sum(expediture.amount for expediture in expeditures)
+    by_date = lambda expediture: expediture.report.training.date
+    balance["expediture_list"] = [
+        as_transaction(expediture)
+        for expediture in sorted(expeditures, key=by_date)
+        if expediture.amount
+    ]
+
+    # Amount
+    balance["first_cash"] = reports[0].cash_at_start
+    if reports[-1].cash_at_end is not None:
+        balance["latest_cash"] = reports[-1].cash_at_end
+        balance["amount"] = reports[-1].cash_at_end - (
+            reports[0].cash_at_start
+            + balance["total_revenue"].get(PaymentMethods.CASH.label, 0)
+            - balance.get("total_expeditures", 0)
+        )
+
+    # Bank transfers
+    balance["bank_transfers"] = [
+        as_transaction(absorption)
+        for absorption in absorptions
+        if absorption.method == PaymentMethods.BANK_TRANSFER and absorption.amount
+    ]
+
+    # TWINT
+    transactions = absorptions + bills
+    transactions = [
+        transaction
+        for transaction in transactions
+        if transaction.method == PaymentMethods.TWINT and transaction.amount
+    ]
+    by_week = lambda expediture: expediture.report.training.date.isocalendar().week
+    twint_by_week = {
+        week: sorted(transactions_in_week, key=by_date)
+        for week, transactions_in_week in groupby(
+            sorted(transactions, key=by_week), key=by_week
+        )
+    }
+
+    def label(week, transactions_in_week):
+        monday = date.fromisocalendar(reports[0].training.date.year, week, 1)
+        sunday = date.fromisocalendar(reports[0].training.date.year, week, 7)
+        total = sum(transaction.amount for transaction in transactions_in_week)
+        return f"{date_format(monday, 'j.n.')} - {date_format(sunday, 'j.n.')}, Total {total}"
+
+    balance["twint_weeks"] = {
+        label(week, transactions_in_week): list(
+            map(as_transaction, transactions_in_week)
+        )
+        for week, transactions_in_week in twint_by_week.items()
+    }
+
+    # Journal
+    balance["journal"] = journal.entries(reports, revenue_by_report)
+    return balance
@@ -0,0 +1,132 @@
+"""
+CSV exports of the bills, purchases, expenses, absorptions, and runs of a season. Rows
+are read with `.iterator()` and joined with `select_related` rather than prefetched,
+such that memory does not grow with the number of rows and each export is one query.
+"""
+
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Absorption, Bill, Expense, Purchase, Run
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer handing written lines to the generator, see Django's docs"""
+
+    def write(self, value):
+        return value
+
+
+def of_year(queryset, year, using):
+    return (
+        queryset.using(using)
+        .filter(report__training__date__year=year)
+        .order_by("report__training__date", "pk")
+    )
+
+
+def bills(year, using=DEFAULT_DB_ALIAS):
+    yield ["Datum", "Pilot·in", "Flüge", "Abo-Flüge", "Betrag", "Zahlungsart"]
+    queryset = of_year(Bill.objects, year, using).select_related(
+        "report__training", "signup__pilot"
+    )
+    flights = [Run.Kind.FLIGHT, Run.Kind.FLIGHT_WITH_POSTBUS, Run.Kind.FLIGHT_WITH_LIFT]
+    queryset = queryset.annotate(
+        flights=Count("signup__runs", filter=Q(signup__runs__kind__in=flights))
+    )
+    for bill in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            bill.report.training.date,
+            bill.signup.pilot,
+            bill.flights,
+            bill.prepaid_flights,
+            bill.amount,
+            bill.get_method_display(),
+        ]
+
+
+def purchases(year, using=DEFAULT_DB_ALIAS):
+    yield ["Datum", "Pilot·in", "Artikel", "Preis"]
+    queryset = of_year(Purchase.objects, year, using).select_related(
+        "report__training", "signup__pilot"
+    )
+    for purchase in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            purchase.report.training.date,
+            purchase.signup.pilot,
+            purchase.description,
+            purchase.price,
+        ]
+
+
+def expenses(year, using=DEFAULT_DB_ALIAS):
+    yield ["Datum", "Grund", "Betrag"]
+    queryset = of_year(Expense.objects, year, using).select_related("report__training")
+    for expense in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [expense.report.training.date, expense.reason, expense.amount]
+
+
+def absorptions(year, using=DEFAULT_DB_ALIAS):
+    yield ["Datum", "Pilot·in", "Betrag", "Zahlungsart"]
+    queryset = of_year(Absorption.objects, year, using).select_related(
+        "report__training", "signup__pilot"
+    )
+    for absorption in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            absorption.report.training.date,
+            absorption.signup.pilot,
+            absorption.amount,
+            absorption.get_method_display(),
+        ]
+
+
+def runs(year, using=DEFAULT_DB_ALIAS):
+    yield ["Datum", "Zeit", "Pilot·in", "Art"]
+    queryset = (
+        of_year(Run.objects, year, using)
+        .select_related("report__training", "signup__pilot")
+        .order_by("report__training__date", "created_on", "pk")
+    )
+    for run in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            run.report.training.date,
+            timezone.localtime(run.created_on).strftime("%H:%M"),
+            run.signup.pilot,
+            run.get_kind_display(),
+        ]
+
+
+# Exports by their name in URLs and file names
+EXPORTS = {
+    "rechnungen": bills,
+    "einkaeufe": purchases,
+    "ausgaben": expenses,
+    "abschoepfungen": absorptions,
+    "runs": runs,
+}
+
+
+def as_csv(rows):
+    """Lines of CSV, starting with a BOM such that Excel reads UTF-8"""
+    writer = csv.writer(Echo())
+    yield "\ufeff"
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def in_chunks(lines):
+    """
+    Lines joined by chunks, each read in a thread. Served via ASGI, Django would read a
+    synchronous iterator at once, thus holding the whole export in memory.
+    """
+    lines = iter(lines)
+    read = sync_to_async(lambda: "".join(islice(lines, CHUNK_SIZE)))
+    while chunk := await read():
+        yield chunk
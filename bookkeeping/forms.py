@@ -4,7 +4,9 @@ from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
 from django.forms import modelformset_factory
 from django.utils.formats import date_format
+from django.utils.html import escape
 
+from . import reconciliation
 from .models import Absorption, Bill, Expense, PaymentMethods, Purchase, Report, Run
 from trainings.models import Signup
 
@@ -137,3 +139,40 @@ class PurchaseCreateForm(forms.ModelForm):
         Purchase.save_item(
             self.instance.signup, self.instance.report, int(self.cleaned_data["item"])
         )
+
+
+class MultipleFileField(forms.FileField):
+    """See Django's docs on uploading multiple files"""
+
+    class MultipleFileInput(forms.ClearableFileInput):
+        allow_multiple_selected = True
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", self.MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        clean_file = super().clean
+        if isinstance(data, (list, tuple)):
+            return [clean_file(file, initial) for file in data]
+
+        return [clean_file(data, initial)]
+
+
+class TwintStatementsForm(forms.Form):
+    statements = MultipleFileField()
+    max_days = forms.IntegerField(
+        initial=reconciliation.MAX_DAYS, min_value=0, max_value=31
+    )
+
+    def clean_statements(self):
+        """Parse all uploaded statements into their transactions"""
+        statements = [
+            (statement.name, statement.read())
+            for statement in self.cleaned_data["statements"]
+        ]
+        try:
+            return reconciliation.parse_statements(statements)
+        except ValueError as error:
+            # Errors are shown as safe and contain the names of the files
+            raise ValidationError(escape(str(error)))
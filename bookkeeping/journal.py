@@ -0,0 +1,123 @@
+"""
+Double-entry journal of a year for the club's accounting software. The entries are part
+of the balance, see balance.py, such that the season is aggregated and cached once. They
+refer to accounts by keys, which are mapped to `settings.JOURNAL_ACCOUNTS` on export.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import PaymentMethods
+
+METHOD_ACCOUNTS = {
+    PaymentMethods.CASH: "cash",
+    PaymentMethods.BANK_TRANSFER: "bank",
+    PaymentMethods.TWINT: "twint",
+}
+logger = logging.getLogger(__name__)
+
+# Categories of revenue in the balance, except absorptions, which are transfers
+REVENUE_ACCOUNTS = ["flights", "day_passes", "prepaid_flights", "equipment"]
+
+
+def entry(date, description, postings):
+    """Entry with postings as (debit, credit, amount), each balanced on its own"""
+    return {
+        "date": date,
+        "description": description,
+        "postings": [
+            (debit, credit, amount) if amount > 0 else (credit, debit, -amount)
+            for debit, credit, amount in postings
+            if amount
+        ],
+    }
+
+
+def entries(reports, revenue_by_report):
+    """Entries of the reports, with their revenue split as in the balance"""
+    entries = []
+    for report, revenue in zip(reports, revenue_by_report):
+        date = report.training.date
+        for method in PaymentMethods:
+            if method.label not in revenue["total_revenue"]:
+                continue
+
+            entries.append(
+                entry(
+                    date,
+                    f"Einnahmen {method.label}",
+                    [
+                        (
+                            METHOD_ACCOUNTS[method],
+                            account,
+                            revenue[f"revenue_from_{account}"][method.label],
+                        )
+                        for account in REVENUE_ACCOUNTS
+                    ],
+                )
+            )
+        for absorption in report.absorptions.all():
+            entries.append(
+                entry(
+                    date,
+                    absorption.description,
+                    [(METHOD_ACCOUNTS[absorption.method], "cash", absorption.amount)],
+                )
+            )
+        for expense in report.expenses.all():
+            entries.append(
+                entry(
+                    date,
+                    expense.description,
+                    [(expense.reason, "cash", expense.amount)],
+                )
+            )
+    return [entry for entry in entries if entry["postings"]]
+
+
+def account(key):
+    """
+    Account of a key. Expenses are booked by reason, or on the account for others, e.g.
+    for reasons given by hand. Other keys must be mapped.
+    """
+    accounts = settings.JOURNAL_ACCOUNTS
+    if key in accounts:
+        return accounts[key]
+
+    if key in METHOD_ACCOUNTS.values() or key in REVENUE_ACCOUNTS:
+        raise ImproperlyConfigured(f"JOURNAL_ACCOUNTS lacks an account for {key}.")
+    if "expenses" not in accounts:
+        raise ImproperlyConfigured("JOURNAL_ACCOUNTS lacks an account for expenses.")
+    logger.warning("No account for expenses for %s, booked on expenses.", key)
+    return accounts["expenses"]
+
+
+def rows(entries):
+    """
+    Rows for CSV, one per debit and credit account, with numbered entries. The accounts
+    are mapped at once, such that missing ones fail before streaming.
+    """
+    keys = {
+        key
+        for entry in entries
+        for debit, credit, _ in entry["postings"]
+        for key in [debit, credit]
+    }
+    accounts = {key: account(key) for key in sorted(keys)}
+
+    def generate():
+        yield ["Datum", "Beleg", "Beschreibung", "Soll", "Haben", "Betrag"]
+        for number, entry in enumerate(entries, start=1):
+            for debit, credit, amount in entry["postings"]:
+                yield [
+                    entry["date"],
+                    number,
+                    entry["description"],
+                    accounts[debit],
+                    accounts[credit],
+                    f"{amount:.2f}",
+                ]
+
+    return generate()
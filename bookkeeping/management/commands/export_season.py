@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from bookkeeping import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the bills, purchases, expenses, absorptions, and runs of a season to "
+        "CSV files, like the exports on the balance. Memory doesn't grow with the rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("year", type=int)
+        parser.add_argument(
+            "kinds", nargs="*", help=f"of {', '.join(exports.EXPORTS)}, by default all"
+        )
+        parser.add_argument("--output-dir", type=Path, default=Path("."))
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        directory = Path(options["output_dir"])
+        if not directory.is_dir():
+            raise CommandError(f"{directory} is not a directory.")
+
+        if unknown := set(options["kinds"]) - set(exports.EXPORTS):
+            raise CommandError(f"Unknown exports: {', '.join(sorted(unknown))}.")
+
+        for kind in options["kinds"] or exports.EXPORTS:
+            path = directory / f"{options['year']}_{kind}.csv"
+            rows = exports.EXPORTS[kind](options["year"], using=options["database"])
+            num_lines = 0
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                for line in exports.as_csv(rows):
+                    file.write(line)
+                    num_lines += 1
+            # Minus the BOM and the header
+            self.stdout.write(f"{num_lines - 2:8} rows in {path}")
+        self.stdout.write(self.style.SUCCESS(f"Exported {options['year']}."))
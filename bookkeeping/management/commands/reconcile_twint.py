@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from bookkeeping import reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        "Match the transactions of TWINT statements in CSV, e.g. of a whole season, "
+        "with the bills and absorptions paid with TWINT, and list unmatched ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("statements", type=Path, nargs="+")
+        parser.add_argument("--max-days", type=int, default=reconciliation.MAX_DAYS)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        statements = []
+        for path in map(Path, options["statements"]):
+            if not path.is_file():
+                raise CommandError(f"{path} does not exist.")
+            statements.append((path.name, path.read_bytes()))
+
+        try:
+            transactions = reconciliation.parse_statements(statements)
+        except ValueError as error:
+            raise CommandError(error)
+
+        result = reconciliation.reconcile_with_records(
+            transactions, max_days=options["max_days"], using=options["database"]
+        )
+        for record in result["unmatched_records"]:
+            self.stdout.write(
+                f"Not in statements: {record['date']} {record['description']}, "
+                f"Fr. {record['amount']}"
+            )
+        for transaction in result["unmatched_transactions"]:
+            self.stdout.write(
+                f"Not in reports: {transaction['date']} {transaction['description']}, "
+                f"Fr. {transaction['amount']}"
+            )
+
+        summary = f"Matched {len(result['matches'])} of {len(transactions)} transactions."
+        if result["unmatched_records"] or result["unmatched_transactions"]:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookkeeping", "0004_alter_bill_amount_alter_bill_prepaid_flights_and_more"),
+        ("trainings", "0007_remove_signup_trainings_s_status_c94ee7_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="purchase",
+            name="bookkeeping_descrip_50a862_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="run",
+            name="bookkeeping_created_e59385_idx",
+        ),
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(
+                fields=["report", "method"], name="bookkeeping_report__8f8469_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="purchase",
+            index=models.Index(
+                fields=["signup", "description"], name="bookkeeping_signup__f1a8e2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="run",
+            index=models.Index(
+                fields=["report", "created_on", "signup"],
+                name="bookkeeping_report__ec2fbf_idx",
+            ),
+        ),
+    ]
@@ -130,7 +130,7 @@ class Run(models.Model):
     created_on = models.DateTimeField()
 
     class Meta:
-        indexes = [models.Index(fields=["created_on"])]
+        indexes = [models.Index(fields=["report", "created_on", "signup"])]
         unique_together = (("signup", "report", "created_on"),)
         ordering = ("report", "created_on", "signup__pilot")
 
@@ -192,6 +192,7 @@ class Bill(models.Model):
     method = models.SmallIntegerField(choices=PAYMENT_CHOICES)
 
     class Meta:
+        indexes = [models.Index(fields=["report", "method"])]
         unique_together = (("signup", "report"),)
 
     def __str__(self):
@@ -347,7 +348,7 @@ class Purchase(models.Model):
     price = models.SmallIntegerField(validators=[MinValueValidator(0)])
 
     class Meta:
-        indexes = [models.Index(fields=["description"])]
+        indexes = [models.Index(fields=["signup", "description"])]
 
     @classmethod
     def save_item(cls, signup, report, choice):
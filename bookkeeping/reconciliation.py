@@ -0,0 +1,189 @@
+"""
+Reconciliation of TWINT statements with the bills and absorptions paid with TWINT, which
+the balance otherwise groups by week to compare them manually. Transactions and records
+are indexed by amount and matched in one pass over their dates, in O(n log n).
+"""
+
+import csv
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from io import StringIO
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .balance import as_transaction
+from .models import Absorption, Bill, PaymentMethods
+
+# Payments can be booked some days after the training
+MAX_DAYS = 3
+
+# Columns of the statements, which differ between exports and languages
+DATE_COLUMNS = ["datum", "transaktionsdatum", "buchungsdatum", "date"]
+AMOUNT_COLUMNS = ["betrag", "betrag chf", "transaktionsbetrag", "amount"]
+REFERENCE_COLUMNS = [
+    "transaktions-id",
+    "transaktionsnummer",
+    "referenz",
+    "transaction id",
+]
+DATE_FORMATS = ["%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d"]
+
+
+def find_column(header, names):
+    columns = [column.strip().lower() for column in header]
+    return next((columns.index(name) for name in names if name in columns), None)
+
+
+def parse_date(value):
+    # Without the time, e.g. of 2024-06-01T10:00:00 or 01.06.2024 10:00
+    value = value.strip().split()[0][:10]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unbekanntes Datum {value}.")
+
+
+def parse_amount(value):
+    value = value.replace("CHF", "").replace("'", "").replace("’", "").strip()
+    if "," in value and "." not in value:
+        value = value.replace(",", ".")
+    try:
+        return Decimal(value.replace(" ", ""))
+    except InvalidOperation:
+        raise ValueError(f"Unbekannter Betrag {value}.")
+
+
+def parse_statement(content, name="TWINT"):
+    """Transactions of a TWINT statement in CSV, as dicts like balance.as_transaction"""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            content = content.decode("cp1252")
+    try:
+        dialect = csv.Sniffer().sniff(content[:4096], delimiters=",;\t")
+    except csv.Error:
+        raise ValueError(f"{name} ist keine CSV-Datei.")
+
+    rows = csv.reader(StringIO(content), dialect)
+    for header in rows:
+        date_column = find_column(header, DATE_COLUMNS)
+        amount_column = find_column(header, AMOUNT_COLUMNS)
+        if date_column is not None and amount_column is not None:
+            break
+    else:
+        raise ValueError(f"Keine Spalten für Datum und Betrag in {name} gefunden.")
+
+    reference_column = find_column(header, REFERENCE_COLUMNS)
+    transactions = []
+    for row in rows:
+        # Skip empty lines, totals, and footers
+        if (
+            len(row) <= max(date_column, amount_column)
+            or not row[date_column].strip()[:1].isdigit()
+        ):
+            continue
+
+        line = f"{name}, Zeile {rows.line_num}"
+        try:
+            transactions.append(
+                {
+                    "date": parse_date(row[date_column]),
+                    "description": line,
+                    "amount": parse_amount(row[amount_column]),
+                    "reference": (
+                        row[reference_column].strip()
+                        if reference_column is not None
+                        else line
+                    ),
+                }
+            )
+        except ValueError as error:
+            raise ValueError(f"{line}: {error}")
+    return transactions
+
+
+def records(since, until, using=DEFAULT_DB_ALIAS):
+    """Bills and absorptions paid with TWINT between the dates, as transactions"""
+    filters = {
+        "method": PaymentMethods.TWINT,
+        "amount__gt": 0,
+        "report__training__date__gte": since,
+        "report__training__date__lte": until,
+    }
+    return [
+        as_transaction(record)
+        for model in [Bill, Absorption]
+        for record in model.objects.using(using)
+        .filter(**filters)
+        .select_related("report__training", "signup__pilot")
+    ]
+
+
+def reconcile(transactions, records, max_days=MAX_DAYS):
+    """
+    Match transactions to records of the same amount at most `max_days` apart. Per
+    amount, both are sorted by date and each transaction is matched to the earliest
+    record still in reach, which matches as many as possible.
+    """
+    by_amount = defaultdict(lambda: ([], []))
+    for transaction in transactions:
+        by_amount[transaction["amount"]][0].append(transaction)
+    for record in records:
+        by_amount[record["amount"]][1].append(record)
+
+    by_date = lambda transaction: transaction["date"]
+    window = timedelta(days=max_days)
+    matches, unmatched_transactions, unmatched_records = [], [], []
+    for transactions_of_amount, records_of_amount in by_amount.values():
+        transactions_of_amount.sort(key=by_date)
+        records_of_amount.sort(key=by_date)
+        i = 0
+        for transaction in transactions_of_amount:
+            while (
+                i < len(records_of_amount)
+                and records_of_amount[i]["date"] < transaction["date"] - window
+            ):
+                unmatched_records.append(records_of_amount[i])
+                i += 1
+            if (
+                i < len(records_of_amount)
+                and records_of_amount[i]["date"] <= transaction["date"] + window
+            ):
+                matches.append((transaction, records_of_amount[i]))
+                i += 1
+            else:
+                unmatched_transactions.append(transaction)
+        unmatched_records.extend(records_of_amount[i:])
+
+    return {
+        "matches": sorted(matches, key=lambda match: by_date(match[1])),
+        "unmatched_transactions": sorted(unmatched_transactions, key=by_date),
+        "unmatched_records": sorted(unmatched_records, key=by_date),
+    }
+
+
+def parse_statements(statements):
+    """
+    Transactions of statements, e.g. of a whole season, as (name, content). Those
+    contained in overlapping statements are only counted once.
+    """
+    transactions = {}
+    for name, content in statements:
+        for transaction in parse_statement(content, name):
+            transactions.setdefault(transaction["reference"], transaction)
+    return list(transactions.values())
+
+
+def reconcile_with_records(transactions, max_days=MAX_DAYS, using=DEFAULT_DB_ALIAS):
+    """Reconcile transactions with the records of their period, in one query each"""
+    if not transactions:
+        return reconcile([], [])
+
+    window = timedelta(days=max_days)
+    since = min(transaction["date"] for transaction in transactions) - window
+    until = max(transaction["date"] for transaction in transactions) + window
+    return reconcile(transactions, records(since, until, using), max_days)
@@ -259,14 +259,14 @@ class DatabaseCallsTests(TestCase):
         self.report = Report.objects.create(training=training, cash_at_start=420)
 
     def test_absorption_create_view(self):
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(6):
             response = self.client.get(
                 reverse("create_absorption", kwargs={"date": TODAY})
             )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/absorption_create.html")
 
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(7):
             response = self.client.post(
                 reverse("create_absorption", kwargs={"date": TODAY}),
                 data={
@@ -286,7 +286,7 @@ class DatabaseCallsTests(TestCase):
             amount=15,
             method=PaymentMethods.CASH,
         )
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(6):
             response = self.client.get(
                 reverse(
                     "update_absorption",
@@ -298,7 +298,7 @@ class DatabaseCallsTests(TestCase):
 
         new_amount = 420
         new_method = PaymentMethods.TWINT
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(5):
             response = self.client.post(
                 reverse(
                     "update_absorption",
@@ -316,7 +316,7 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(new_amount, absorption.amount)
         self.assertEqual(new_method, absorption.method)
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(2):
             response = self.client.post(
                 reverse(
                     "update_absorption",
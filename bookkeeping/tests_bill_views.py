@@ -150,6 +150,26 @@ class BillListViewTests(TestCase):
         self.assertTemplateUsed(response, "bookkeeping/bill_list.html")
         self.assertContains(response, self.purchase.description)
 
+    def test_years_cached_per_pilot(self):
+        previous_year = reverse("bills", kwargs={"year": TODAY.year - 1})
+        response = self.client.get(reverse("bills"))
+        self.assertNotContains(response, previous_year)
+
+        training = Training.objects.create(date=TODAY - timedelta(days=365))
+        Bill.objects.create(
+            signup=Signup.objects.create(pilot=self.guest_2, training=training),
+            report=Report.objects.create(training=training, cash_at_start=0),
+            prepaid_flights=0,
+            amount=42,
+            method=PaymentMethods.CASH,
+        )
+        response = self.client.get(reverse("bills"))
+        self.assertNotContains(response, previous_year)
+
+        self.client.force_login(self.guest_2)
+        response = self.client.get(reverse("bills"))
+        self.assertContains(response, previous_year)
+
     def test_detailed_flights_shown(self):
         response = self.client.get(reverse("bills"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -1292,13 +1312,13 @@ class DatabaseCallsTests(TestCase):
             training.select_signups()
 
     def test_bill_list_view(self):
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(7):
             response = self.client.get(reverse("bills"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/bill_list.html")
 
     def test_pilot_list_view(self):
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(7):
             response = self.client.get(reverse("pilots"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/pilot_list.html")
@@ -1306,9 +1326,7 @@ class DatabaseCallsTests(TestCase):
     def test_bill_batch_create_view(self):
         Bill.objects.all().delete()
 
-        # signup.needs_day_pass costs three extra queries per selected guest. Beware, two
-        # spot are reserved for organizers, thus there are at most 9 selected guests.
-        with self.assertNumQueries(13 + 3 * min(self.num_guests, 9)):
+        with self.assertNumQueries(12):
             response = self.client.get(
                 reverse("batch_create_bills", kwargs={"date": TODAY})
             )
@@ -1319,7 +1337,7 @@ class DatabaseCallsTests(TestCase):
         Bill.objects.all().delete()
 
         signup = self.signups[-1]
-        with self.assertNumQueries(16):
+        with self.assertNumQueries(15):
             response = self.client.get(
                 reverse(
                     "create_bill",
@@ -1331,7 +1349,7 @@ class DatabaseCallsTests(TestCase):
 
         # Previous unpaid signup requires extra call.
         signup = self.signups[0]
-        with self.assertNumQueries(17):
+        with self.assertNumQueries(15):
             response = self.client.get(
                 reverse(
                     "create_bill",
@@ -1341,7 +1359,7 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/bill_create.html")
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             response = self.client.post(
                 reverse(
                     "create_bill",
@@ -1358,7 +1376,7 @@ class DatabaseCallsTests(TestCase):
 
     def test_bill_update_view(self):
         bill = self.bills[3]
-        with self.assertNumQueries(11):
+        with self.assertNumQueries(10):
             response = self.client.get(
                 reverse(
                     "update_bill",
@@ -1368,7 +1386,7 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/bill_update.html")
 
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(7):
             response = self.client.post(
                 reverse(
                     "update_bill",
@@ -254,7 +254,7 @@ class DatabaseCallsTests(TestCase):
         self.report = Report.objects.create(training=training, cash_at_start=420)
 
     def test_expense_create_view(self):
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(4):
             response = self.client.get(
                 reverse("create_expense", kwargs={"date": TODAY})
             )
@@ -262,7 +262,7 @@ class DatabaseCallsTests(TestCase):
         self.assertTemplateUsed(response, "bookkeeping/expense_create.html")
 
         mocked_image = mock.MagicMock(spec=File)
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(4):
             response = self.client.post(
                 reverse("create_expense", kwargs={"date": TODAY}),
                 data={
@@ -277,7 +277,7 @@ class DatabaseCallsTests(TestCase):
 
     def test_expense_update_view(self):
         expense = Expense.objects.create(report=self.report, reason="Gas", amount=11)
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(3):
             response = self.client.get(
                 reverse(
                     "update_expense",
@@ -289,7 +289,7 @@ class DatabaseCallsTests(TestCase):
 
         new_reason = "Petrol"
         new_amount = 23
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(2):
             response = self.client.post(
                 reverse("update_expense", kwargs={"date": TODAY, "pk": expense.pk}),
                 data={"reason": new_reason, "amount": new_amount},
@@ -300,7 +300,7 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(new_reason, expense.reason)
         self.assertEqual(new_amount, expense.amount)
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(2):
             response = self.client.post(
                 reverse("update_expense", kwargs={"date": TODAY, "pk": expense.pk}),
                 data={"reason": "Petrol", "amount": 24, "delete": ""},
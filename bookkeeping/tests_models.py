@@ -8,6 +8,7 @@ from django.test import SimpleTestCase, TestCase
 from django.utils import timezone
 
 from .models import Bill, Expense, PaymentMethods, Purchase, Report, Run
+from news.testing import IndexTestMixin
 from trainings.models import Signup, Training
 
 
@@ -487,3 +488,31 @@ class PurchaseTests(TestCase):
         Purchase.objects.all().delete()
         self.pilot.refresh_from_db()
         self.assertEqual(0, self.pilot.prepaid_flights)
+
+
+class IndexTests(IndexTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = Report.objects.create(training=self.training, cash_at_start=100)
+
+    def test_runs_of_report(self):
+        self.assertUsesIndex(
+            Run._meta.indexes[0].name,
+            self.report.runs.filter(created_on=timezone.now()).order_by(
+                "created_on", "signup"
+            ),
+        )
+
+    def test_bills_of_report(self):
+        self.assertUsesIndex(
+            Bill._meta.indexes[0].name,
+            self.report.bills.filter(method=PaymentMethods.CASH),
+        )
+
+    def test_day_passes_of_signup(self):
+        self.assertUsesIndex(
+            Purchase._meta.indexes[0].name,
+            Purchase.objects.filter(
+                signup=self.signup, description=Purchase.DAY_PASS_DESCRIPTION
+            ),
+        )
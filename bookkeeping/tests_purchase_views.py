@@ -230,7 +230,7 @@ class DatabaseCallsTests(TestCase):
         self.report = Report.objects.create(training=training, cash_at_start=1337)
 
     def test_purchase_create_view(self):
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(6):
             response = self.client.get(
                 reverse(
                     "create_purchase", kwargs={"date": TODAY, "signup": self.signup.pk}
@@ -239,7 +239,7 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/purchase_create.html")
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(4):
             response = self.client.post(
                 reverse(
                     "create_purchase", kwargs={"date": TODAY, "signup": self.signup.pk}
@@ -252,7 +252,7 @@ class DatabaseCallsTests(TestCase):
 
     def test_purchase_delete_view(self):
         purchase = Purchase.save_day_pass(signup=self.signup, report=self.report)
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(5):
             response = self.client.post(
                 reverse("delete_purchase", kwargs={"date": TODAY, "pk": purchase.pk}),
                 follow=False,
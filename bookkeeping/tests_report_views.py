@@ -1,15 +1,29 @@
+import csv
 from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from itertools import product
 from http import HTTPStatus
+import os
 from random import randint
+from tempfile import TemporaryDirectory
+import time
 from unittest import mock
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from . import exports
 from .models import Absorption, Bill, Expense, PaymentMethods, Report, Run
+from news import caching
 from trainings.models import Purchase, Signup, Training
 
 
@@ -131,6 +145,17 @@ class ReportListViewTests(TestCase):
             response, reverse("reports", kwargs={"year": TODAY.year - 4})
         )
 
+    def test_years_cached(self):
+        self.client.get(reverse("reports"))
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get(reverse("reports"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        caching.invalidate(Report)
+        with CaptureQueriesContext(connection) as computed:
+            self.client.get(reverse("reports"))
+        self.assertEqual(len(computed) - 1, len(cached))
+
     def test_num_runs_shown(self):
         response = self.client.get(reverse("reports"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -486,6 +511,110 @@ class BalanceViewTests(TestCase):
         )
         self.assertContains(response, f"Total {self.twint_absorption.amount}")
 
+    def get_journal(self):
+        # The fixture has expenses without accounts, which are booked on expenses
+        with self.assertLogs("bookkeeping.journal", "WARNING") as logs:
+            response = self.client.get(
+                reverse("journal", kwargs={"year": TODAY.year})
+            )
+        self.assertIn("other", logs.output[-1])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(f"{TODAY.year}_journal.csv", response["Content-Disposition"])
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(content.splitlines()))
+
+    def test_journal_split_like_balance(self):
+        header, *rows = self.get_journal()
+        self.assertEqual(
+            header, ["Datum", "Beleg", "Beschreibung", "Soll", "Haben", "Betrag"]
+        )
+        accounts = settings.JOURNAL_ACCOUNTS
+        debits, credits = {}, {}
+        for _, _, _, debit, credit, amount in rows:
+            debits[debit] = debits.get(debit, 0) + Decimal(amount)
+            credits[credit] = credits.get(credit, 0) + Decimal(amount)
+        self.assertEqual(debits[accounts["cash"]], self.cash_bill.amount)
+        self.assertEqual(credits[accounts["day_passes"]], self.day_pass.price)
+        self.assertEqual(
+            credits[accounts["prepaid_flights"]], self.prepaid_flights.price
+        )
+        self.assertEqual(credits[accounts["equipment"]], self.twint_bill.amount)
+        self.assertNotIn(accounts["flights"], credits)
+        self.assertEqual(debits[accounts["bank"]], self.bank_absorption.amount)
+        self.assertEqual(
+            debits[accounts["twint"]],
+            self.twint_bill.amount + self.twint_absorption.amount,
+        )
+        self.assertEqual(
+            debits[accounts["expenses"]],
+            self.first_gas.amount + self.second_gas.amount + self.other_expense.amount,
+        )
+        self.assertEqual(
+            credits[accounts["cash"]],
+            self.bank_absorption.amount
+            + self.twint_absorption.amount
+            + self.first_gas.amount
+            + self.second_gas.amount
+            + self.other_expense.amount,
+        )
+        self.assertEqual(sorted(set(int(row[1]) for row in rows)), list(range(1, 8)))
+
+    def test_journal_from_cached_balance(self):
+        self.client.get(reverse("balance"))
+        with CaptureQueriesContext(connection) as context:
+            self.get_journal()
+        self.assertEqual(len(context), 0)
+
+        with self.settings(
+            JOURNAL_ACCOUNTS={**settings.JOURNAL_ACCOUNTS, "Gas": "6201"}
+        ):
+            rows = self.get_journal()
+        self.assertIn("6201", [row[3] for row in rows])
+
+    def test_journal_fails_without_account(self):
+        accounts = {**settings.JOURNAL_ACCOUNTS}
+        del accounts["twint"]
+        with self.settings(JOURNAL_ACCOUNTS=accounts), self.assertLogs(
+            "bookkeeping.journal", "WARNING"
+        ), self.assertRaisesMessage(ImproperlyConfigured, "twint"):
+            self.client.get(reverse("journal", kwargs={"year": TODAY.year}))
+
+    async def test_journal_streamed_via_asgi(self):
+        await self.async_client.aforce_login(self.orga)
+        with self.assertLogs("bookkeeping.journal", "WARNING"):
+            response = await self.async_client.get(
+                reverse("journal", kwargs={"year": TODAY.year})
+            )
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = list(csv.reader(content.decode("utf-8-sig").splitlines()))
+        self.assertEqual(rows, await sync_to_async(self.get_journal)())
+
+    def test_balance_cached_until_pilot_changed(self):
+        self.client.get(reverse("balance"))
+        self.client.force_login(self.guest)
+        self.client.force_login(self.orga)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("balance"))
+        self.assertEqual(1, len(context))
+
+        self.guest.first_name = "Renamed"
+        self.guest.save()
+        response = self.client.get(reverse("balance"))
+        self.assertContains(response, "Rechnung Renamed")
+
+    def test_balance_cached_until_changed(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse("balance"))
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(reverse("balance"))
+        self.assertLess(len(second), len(first))
+        self.assertContains(response, self.other_expense.reason)
+
+        Expense.objects.create(report=self.last_report, reason="Zmittag", amount=42)
+        response = self.client.get(reverse("balance"))
+        self.assertContains(response, "Zmittag")
+
     def test_no_reports_in_year_404(self):
         response = self.client.get(reverse("balance", kwargs={"year": 1984}))
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -503,6 +632,132 @@ class BalanceViewTests(TestCase):
         self.assertTemplateUsed(response, "bookkeeping/report_balance.html")
         self.assertNotContains(response, TODAY.year)
 
+    def test_exports_linked(self):
+        response = self.client.get(reverse("balance"))
+        self.assertContains(
+            response, reverse("export", kwargs={"year": TODAY.year, "kind": "runs"})
+        )
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        self.orga = get_user_model().objects.create(
+            email="orga@example.com",
+            first_name="Orga",
+            last_name="Nisator",
+            role=get_user_model().Role.ORGA,
+        )
+        self.client.force_login(self.orga)
+
+        self.training = Training.objects.create(date=TODAY)
+        signup = Signup.objects.create(pilot=self.orga, training=self.training)
+        self.report = Report.objects.create(training=self.training, cash_at_start=420)
+        for i, kind in enumerate([Run.Kind.FLIGHT, Run.Kind.BREAK, Run.Kind.BOAT]):
+            Run(
+                signup=signup,
+                report=self.report,
+                kind=kind,
+                created_on=timezone.now() - timedelta(minutes=i),
+            ).save()
+        Purchase.save_day_pass(signup=signup, report=self.report)
+        Bill.objects.create(
+            signup=signup,
+            report=self.report,
+            prepaid_flights=0,
+            amount=30,
+            method=PaymentMethods.TWINT,
+        )
+        Expense.objects.create(report=self.report, reason="Benzin, bleifrei", amount=87)
+        Absorption.objects.create(
+            report=self.report,
+            signup=signup,
+            amount=42,
+            method=PaymentMethods.BANK_TRANSFER,
+        )
+
+    def get_rows(self, kind, year=TODAY.year):
+        response = self.client.get(
+            reverse("export", kwargs={"year": year, "kind": kind})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(f"{year}_{kind}.csv", response["Content-Disposition"])
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(content.splitlines()))
+
+    def test_orga_required(self):
+        guest = get_user_model().objects.create(email="guest@example.com")
+        self.client.force_login(guest)
+        response = self.client.get(
+            reverse("export", kwargs={"year": TODAY.year, "kind": "runs"})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_unknown_kind_404(self):
+        response = self.client.get(
+            reverse("export", kwargs={"year": TODAY.year, "kind": "pilots"})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_rows_exported(self):
+        date = TODAY.isoformat()
+        self.assertEqual(
+            self.get_rows("rechnungen")[1:],
+            [[date, "Orga Nisator", "1", "0.00", "30.00", "TWINT"]],
+        )
+        self.assertEqual(
+            self.get_rows("einkaeufe")[1:],
+            [[date, "Orga Nisator", Purchase.DAY_PASS_DESCRIPTION, "30"]],
+        )
+        self.assertEqual(
+            self.get_rows("ausgaben"),
+            [["Datum", "Grund", "Betrag"], [date, "Benzin, bleifrei", "87"]],
+        )
+        self.assertEqual(
+            self.get_rows("abschoepfungen")[1:],
+            [[date, "Orga Nisator", "42", "Überweisung"]],
+        )
+        runs = self.get_rows("runs")[1:]
+        self.assertEqual([run[3] for run in runs], ["Boat", "Break", "Flight"])
+
+    async def test_streamed_in_chunks_via_asgi(self):
+        await self.async_client.aforce_login(self.orga)
+        with mock.patch.object(exports, "CHUNK_SIZE", 2):
+            response = await self.async_client.get(
+                reverse("export", kwargs={"year": TODAY.year, "kind": "runs"})
+            )
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # BOM and header, then the three runs
+        self.assertEqual(3, len(chunks))
+        rows = list(csv.reader(b"".join(chunks).decode("utf-8-sig").splitlines()))
+        self.assertEqual(rows, await sync_to_async(self.get_rows)("runs"))
+
+    def test_other_years_not_exported(self):
+        self.assertEqual(len(self.get_rows("runs", year=TODAY.year - 1)), 1)
+
+    def test_one_query_per_export(self):
+        for kind in exports.EXPORTS:
+            with self.subTest(kind=kind):
+                with CaptureQueriesContext(connection) as context:
+                    list(exports.EXPORTS[kind](TODAY.year))
+                self.assertEqual(len(context), 1)
+
+    def test_export_season_command(self):
+        with TemporaryDirectory() as directory:
+            call_command(
+                "export_season",
+                TODAY.year,
+                "ausgaben",
+                output_dir=directory,
+                stdout=StringIO(),
+            )
+            self.assertEqual(os.listdir(directory), [f"{TODAY.year}_ausgaben.csv"])
+            path = os.path.join(directory, f"{TODAY.year}_ausgaben.csv")
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                rows = list(csv.reader(file))
+        self.assertEqual(rows[1], [TODAY.isoformat(), "Benzin, bleifrei", "87"])
+
 
 class ReportCreateViewTests(TestCase):
     def setUp(self):
@@ -1126,13 +1381,13 @@ class DatabaseCallsTests(TestCase):
             training.select_signups()
 
     def test_report_list_view(self):
-        with self.assertNumQueries(17):
+        with self.assertNumQueries(12):
             response = self.client.get(reverse("reports"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/report_list.html")
 
     def test_balance_view(self):
-        with self.assertNumQueries(20):
+        with self.assertNumQueries(12):
             response = self.client.get(reverse("balance"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/report_balance.html")
@@ -1141,12 +1396,12 @@ class DatabaseCallsTests(TestCase):
         training = Training.objects.filter(date=TODAY)[0]
         Report.objects.filter(training=training).delete()
 
-        with self.assertNumQueries(13):
+        with self.assertNumQueries(12):
             response = self.client.get(reverse("create_report"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/report_create.html")
 
-        with self.assertNumQueries(12):
+        with self.assertNumQueries(10):
             response = self.client.post(
                 reverse("create_report"), data={"cash_at_start": 420}, follow=False
             )
@@ -1154,12 +1409,12 @@ class DatabaseCallsTests(TestCase):
         self.assertTrue(Report.objects.filter(training=training).exists())
 
     def test_report_update_view(self):
-        with self.assertNumQueries(15):
+        with self.assertNumQueries(14):
             response = self.client.get(reverse("update_report", kwargs={"date": TODAY}))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/report_update.html")
 
-        with self.assertNumQueries(14):
+        with self.assertNumQueries(12):
             response = self.client.post(
                 reverse("update_report", kwargs={"date": TODAY}),
                 data={
@@ -1170,3 +1425,81 @@ class DatabaseCallsTests(TestCase):
                 follow=False,
             )
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+
+class ReplicaTests(TestCase):
+    """Two SQLite databases standing in for the primary and its replica"""
+
+    databases = "__all__"  # Including the replica, added in setUpClass
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.addClassCleanup(cls.directory.cleanup)
+        connections.settings["replica"] = {
+            **connections["default"].settings_dict,
+            "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        cls.addClassCleanup(connections.settings.pop, "replica")
+        cls.addClassCleanup(connections["replica"].close)
+        call_command("migrate", database="replica", verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        self.orga = get_user_model().objects.create(
+            email="orga@example.com", role=get_user_model().Role.ORGA
+        )
+        self.client.force_login(self.orga)
+        training = Training.objects.create(date=TODAY)
+        signup = Signup.objects.create(pilot=self.orga, training=training)
+        report = Report.objects.create(training=training, cash_at_start=1337)
+        Bill.objects.create(
+            signup=signup,
+            report=report,
+            prepaid_flights=0,
+            amount=42,
+            method=PaymentMethods.CASH,
+        )
+
+    def test_reports_are_read_from_replica(self):
+        for url in ["reports", "balance", "pilots", "bills"]:
+            with self.subTest(url=url):
+                response = self.client.get(reverse(url))
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+        Training.objects.using("replica").create(date=TODAY.replace(year=2020, day=1))
+        Report.objects.using("replica").create(
+            training=Training.objects.using("replica").get(), cash_at_start=0
+        )
+        with CaptureQueriesContext(connections["default"]) as primary:
+            response = self.client.get(reverse("reports"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(2020, response.context["year"])
+        # Including the queries of rendering the template
+        self.assertFalse(
+            [query["sql"] for query in primary if "trainings_" in query["sql"]]
+        )
+
+    def test_other_views_read_from_primary(self):
+        response = self.client.get(reverse("update_report", kwargs={"date": TODAY}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_read_your_writes(self):
+        response = self.client.post(
+            reverse("update_pilot"),
+            data={
+                "first_name": "Orga",
+                "last_name": "Nizer",
+                "email": "orga@example.com",
+                "phone": "+41 79 123 45 67",
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.client.get(reverse("reports"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(TODAY.year, response.context["year"])
+
+        later = time.time() + settings.REPLICA_STICKINESS + 1
+        with mock.patch("time.time", return_value=later):
+            response = self.client.get(reverse("reports"))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -618,7 +618,7 @@ class DatabaseCallsTests(TestCase):
         training.select_signups()
 
     def test_run_create_view(self):
-        with self.assertNumQueries(11):
+        with self.assertNumQueries(10):
             response = self.client.get(reverse("create_run"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/run_create.html")
@@ -627,7 +627,7 @@ class DatabaseCallsTests(TestCase):
         for i in range(self.num_pilots):
             data[f"form-{i}-kind"] = Run.Kind.FLIGHT
         # Creating each run costs a call 🤷
-        with self.assertNumQueries(13 + self.num_pilots):
+        with self.assertNumQueries(11 + self.num_pilots):
             response = self.client.post(reverse("create_run"), data=data)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         self.assertEqual(
@@ -635,7 +635,7 @@ class DatabaseCallsTests(TestCase):
         )
 
     def test_run_update_view(self):
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(8):
             response = self.client.get(reverse("update_run", kwargs={"run": 1}))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "bookkeeping/run_update.html")
@@ -650,7 +650,7 @@ class DatabaseCallsTests(TestCase):
             data[f"form-{i}-id"] = self.runs[i].pk
         # Unfortunately, validating a formset costs a call for each form and caching
         # would be complicated, see https://stackoverflow.com/questions/40665770/.
-        with self.assertNumQueries(9 + 2 * self.num_pilots):
+        with self.assertNumQueries(7 + 2 * self.num_pilots):
             response = self.client.post(
                 reverse("update_run", kwargs={"run": 1}), data=data, follow=False
             )
@@ -658,8 +658,9 @@ class DatabaseCallsTests(TestCase):
 
         del data["save"]
         data["delete"] = ""
-        # Deleting can be done in one go, validation still costs.
-        with self.assertNumQueries(10 + self.num_pilots):
+        # Deleting can be done in one go, validation still costs. The runs are loaded
+        # to send post_delete, invalidating cached balances.
+        with self.assertNumQueries(9 + self.num_pilots):
             response = self.client.post(
                 reverse("update_run", kwargs={"run": 1}), data=data, follow=False
             )
@@ -0,0 +1,196 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from http import HTTPStatus
+from io import StringIO
+import os
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import reconciliation
+from .models import Absorption, Bill, PaymentMethods, Report
+from trainings.models import Signup, Training
+
+
+TODAY = timezone.now().date()
+YESTERDAY = TODAY - timedelta(days=1)
+
+
+def statement(*transactions, delimiter=";"):
+    lines = [delimiter.join(["Datum", "Zeit", "Transaktions-ID", "Betrag"])]
+    lines += [
+        delimiter.join([day.strftime("%d.%m.%Y"), "14:03", reference, amount])
+        for day, reference, amount in transactions
+    ]
+    return "\n".join(lines).encode()
+
+
+class ReconcileTests(TestCase):
+    def transaction(self, day, amount):
+        return {"date": date(2024, 6, day), "amount": Decimal(amount)}
+
+    def test_matched_by_amount_within_days(self):
+        transactions = [self.transaction(3, 30), self.transaction(9, 30)]
+        records = [self.transaction(1, 30), self.transaction(2, 27)]
+        result = reconciliation.reconcile(transactions, records, max_days=2)
+        self.assertEqual(result["matches"], [(transactions[0], records[0])])
+        self.assertEqual(result["unmatched_transactions"], [transactions[1]])
+        self.assertEqual(result["unmatched_records"], [records[1]])
+
+    def test_as_many_as_possible_matched(self):
+        transactions = [self.transaction(day, "18.00") for day in [2, 3]]
+        records = [self.transaction(day, 18) for day in [1, 4, 7]]
+        result = reconciliation.reconcile(transactions, records, max_days=1)
+        self.assertEqual(len(result["matches"]), 2)
+        self.assertEqual(result["unmatched_transactions"], [])
+        self.assertEqual(result["unmatched_records"], [records[2]])
+
+    def test_statements_parsed(self):
+        content = (
+            "TWINT Abrechnung Juni\n\n"
+            "Date,Transaction ID,Amount\n"
+            '2024-06-01T10:00:00,a,"1\'230.50"\n'
+            "2024-06-02,b,-12.00\n"
+            "Total,,1218.50\n"
+        )
+        transactions = reconciliation.parse_statements(
+            [("juni.csv", content.encode()), ("overlap.csv", content.encode())]
+        )
+        self.assertEqual(
+            [(t["date"], t["amount"]) for t in transactions],
+            [(date(2024, 6, 1), Decimal("1230.50")), (date(2024, 6, 2), -12)],
+        )
+
+    def test_unknown_statements_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Keine Spalten"):
+            reconciliation.parse_statement(b"Name;Wert\nA;1\n")
+        with self.assertRaisesMessage(ValueError, "Zeile 2"):
+            reconciliation.parse_statement(b"Datum;Betrag\n31.02.2024;12\n")
+
+
+class TwintReconciliationViewTests(TestCase):
+    def setUp(self):
+        self.orga = get_user_model().objects.create(
+            email="orga@example.com", first_name="Orga", role=get_user_model().Role.ORGA
+        )
+        self.client.force_login(self.orga)
+        self.guest = get_user_model().objects.create(
+            email="guest@example.com", first_name="Guest"
+        )
+
+        report = Report.objects.create(
+            training=Training.objects.create(date=YESTERDAY), cash_at_start=420
+        )
+        orga_signup = Signup.objects.create(
+            pilot=self.orga, training=report.training
+        )
+        guest_signup = Signup.objects.create(
+            pilot=self.guest, training=report.training
+        )
+        self.bill = Bill.objects.create(
+            signup=guest_signup,
+            report=report,
+            prepaid_flights=0,
+            amount=45,
+            method=PaymentMethods.TWINT,
+        )
+        Bill.objects.create(
+            signup=orga_signup,
+            report=report,
+            prepaid_flights=0,
+            amount=27,
+            method=PaymentMethods.CASH,
+        )
+        self.absorption = Absorption.objects.create(
+            report=report,
+            signup=orga_signup,
+            amount=60,
+            method=PaymentMethods.TWINT,
+        )
+
+    def test_orga_required_to_see(self):
+        self.client.force_login(self.guest)
+        response = self.client.get(reverse("reconcile_twint"))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.assertTemplateUsed(response, "403.html")
+
+    def test_linked_from_balance(self):
+        response = self.client.get(reverse("balance"))
+        self.assertContains(response, reverse("reconcile_twint"))
+
+    def test_unmatched_listed(self):
+        response = self.client.post(
+            reverse("reconcile_twint"),
+            data={
+                "statements": [
+                    SimpleUploadedFile(
+                        "juni.csv", statement((TODAY, "1", "45.00"), (TODAY, "2", "9"))
+                    ),
+                    SimpleUploadedFile("juli.csv", statement((TODAY, "1", "45.00"))),
+                ],
+                "max_days": 3,
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "bookkeeping/twint_reconciliation.html")
+        self.assertContains(response, "1 von 2 Zahlungen zugeordnet")
+        self.assertContains(response, self.absorption.description)
+        self.assertNotContains(response, self.bill.description)
+        self.assertContains(response, "juni.csv, Zeile 3")
+
+    def test_everything_matched_within_days(self):
+        response = self.client.post(
+            reverse("reconcile_twint"),
+            data={
+                "statements": SimpleUploadedFile(
+                    "juni.csv", statement((TODAY, "1", "45"), (YESTERDAY, "2", "60"))
+                ),
+                "max_days": 1,
+            },
+        )
+        self.assertContains(response, "Alles zugeordnet")
+
+        response = self.client.post(
+            reverse("reconcile_twint"),
+            data={
+                "statements": SimpleUploadedFile(
+                    "juni.csv", statement((TODAY, "1", "45"), (YESTERDAY, "2", "60"))
+                ),
+                "max_days": 0,
+            },
+        )
+        self.assertContains(response, "1 von 2 Zahlungen zugeordnet")
+
+    def test_invalid_statement_shown(self):
+        response = self.client.post(
+            reverse("reconcile_twint"),
+            data={
+                "statements": SimpleUploadedFile("notes.csv", b"Name;Wert\nA;1\n"),
+                "max_days": 3,
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, "Keine Spalten für Datum und Betrag in notes.csv")
+
+    def test_one_query_per_model(self):
+        transactions = reconciliation.parse_statement(statement((TODAY, "1", "45")))
+        with CaptureQueriesContext(connection) as context:
+            reconciliation.reconcile_with_records(transactions)
+        self.assertEqual(len(context), 2)
+
+    def test_reconcile_twint_command(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "juni.csv")
+            with open(path, "wb") as file:
+                file.write(statement((TODAY, "1", "45.00")))
+            stdout = StringIO()
+            call_command("reconcile_twint", path, stdout=stdout)
+        self.assertIn(f"Not in statements: {YESTERDAY}", stdout.getvalue())
+        self.assertIn("Matched 1 of 1 transactions.", stdout.getvalue())
@@ -11,8 +11,12 @@ urlpatterns = [
     path("<int:year>/", views.ReportListView.as_view(), name="reports"),
     path("bilanz/", views.BalanceView.as_view(), name="balance"),
     path("bilanz/<int:year>/", views.BalanceView.as_view(), name="balance"),
+    path("bilanz/<int:year>/journal/", views.JournalView.as_view(), name="journal"),
     path("pilotinnen/", views.PilotListView.as_view(), name="pilots"),
     path("pilotinnen/<int:year>/", views.PilotListView.as_view(), name="pilots"),
+    path(
+        "export/<int:year>/<slug:kind>/", views.ExportView.as_view(), name="export"
+    ),
     path("erstellen/", views.ReportCreateView.as_view(), name="create_report"),
     path("<date:date>/", views.ReportUpdateView.as_view(), name="update_report"),
     path(
@@ -63,6 +67,11 @@ urlpatterns = [
         name="delete_purchase",
     ),
     path("twint/", views.TwintView.as_view(), name="twint"),
+    path(
+        "twint/abgleichen/",
+        views.TwintReconciliationView.as_view(),
+        name="reconcile_twint",
+    ),
     path("meine-rechnungen/", views.BillListView.as_view(), name="bills"),
     path("meine-rechnungen/<int:year>/", views.BillListView.as_view(), name="bills"),
 ]
@@ -2,79 +2,108 @@ from datetime import date, timedelta
 from decimal import Decimal
 from itertools import groupby
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import prefetch_related_objects
-from django.http import Http404, HttpResponseRedirect
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.formats import date_format
 from django.views import generic
 
-from . import forms
+from . import balance, exports, forms, journal, reconciliation
 from .models import Absorption, Bill, Expense, PaymentMethods, Purchase, Report, Run
+from news import caching
+from news.views import AsyncListView, ReadFromReplicaMixin
 from trainings.views import OrgaRequiredMixin
 from trainings.models import Signup, Training
 
 
-class YearArchiveView(generic.ListView):
+class YearArchiveView(ReadFromReplicaMixin, AsyncListView):
     """
     Django's generic.YearArchiveView doesn't work with dates in related objects, see
-    https://stackoverflow.com/questions/74500864.
+    https://stackoverflow.com/questions/74500864. The reports are read from the replica.
     """
 
     filters = {}
+    prefetch = []
+
+    def get_or_compute(self, namespace, *parts, models, compute):
+        """
+        Cache the computed value, unless it was read from the replica, which can lag
+        behind the versions of the models, see news/caching.py.
+        """
+        if router.db_for_read(self.model) != DEFAULT_DB_ALIAS:
+            return compute()
+
+        key = caching.versioned_key(namespace, *parts, models=models)
+        return caching.get_or_compute(key, compute)
+
+    def get_years(self):
+        """Years with objects, cached per model and filters"""
+        filters = [
+            f"{field}={getattr(value, 'pk', value)}"
+            for field, value in sorted(self.filters.items())
+        ]
+        return self.get_or_compute(
+            "years",
+            self.model._meta.label_lower,
+            *filters,
+            models=[self.model],
+            compute=lambda: [
+                date.year
+                for date in self.model.objects.filter(**self.filters).dates(
+                    self.date_field, "year"
+                )
+            ],
+        )
 
-    def get_queryset(self):
+    async def aget_queryset(self):
         """Get objects of the given year, default to most recent year"""
+        self.years = await sync_to_async(self.get_years)()
         if not (year := self.kwargs.get("year")):
-            years = self.model.objects.filter(**self.filters).dates(
-                self.date_field, "year"
-            )
-            if not years:
+            if not self.years:
                 raise Http404(f"Noch keine {self.name} vorhanden.")
 
-            year = max([date.year for date in years])
+            year = max(self.years)
             self.kwargs["year"] = year
 
+        # Rather than querying whether the year has objects, e.g. with exists()
+        if year not in self.years:
+            raise Http404(f"Keine {self.name} im Jahr {year}.")
+
         since = date(year=year, month=1, day=1)
         until = date(year=year + 1, month=1, day=1)
         assert self.date_field.endswith("__date")
-        queryset = (
+        return (
             self.model.objects.filter(**self.filters)
             .filter(
                 **{self.date_field + "__gte": since, self.date_field + "__lt": until}
             )
             .select_related(self.date_field[:-6])
+            .prefetch_related(*self.prefetch)
             .order_by(self.date_field)
         )
-        if not queryset:
-            raise Http404(f"Keine {self.name} im Jahr {year}.")
-
-        return queryset
 
     def get_context_data(self, **kwargs):
         """Add previous and next year if there are objects in them"""
         context = super().get_context_data(**kwargs)
         year = self.kwargs["year"]
         context["year"] = year
-        years = [
-            date.year
-            for date in self.model.objects.filter(**self.filters).dates(
-                self.date_field, "year"
-            )
-        ]
         context["previous_year"] = next(
             (
                 previous_year
-                for previous_year in reversed(years)
+                for previous_year in reversed(self.years)
                 if previous_year < year
             ),
             None,
         )
         context["next_year"] = next(
-            (next_year for next_year in years if year < next_year), None
+            (next_year for next_year in self.years if year < next_year), None
         )
         return context
 
@@ -83,27 +112,29 @@ class ReportListView(OrgaRequiredMixin, YearArchiveView):
     model = Report
     name = "Berichte"
     date_field = "training__date"
+    prefetch = [
+        "absorptions",
+        Prefetch("bills", Bill.objects.select_related("signup")),
+        "bills__signup__purchases",
+        "expenses",
+        Prefetch("training__signups", Signup.objects.select_related("pilot", "bill")),
+        "training__signups__purchases",
+        "training__signups__runs",
+        "runs",
+    ]
 
-    def get_queryset(self):
-        """Prefetch & compute cash difference between consecutive reports"""
-        queryset = super().get_queryset()
-        prefetch_related_objects(queryset, "absorptions")
-        prefetch_related_objects(queryset, "bills__signup__purchases")
-        prefetch_related_objects(queryset, "expenses")
-        prefetch_related_objects(queryset, "training__signups__purchases")
-        prefetch_related_objects(queryset, "training__signups__runs")
-        prefetch_related_objects(queryset, "training__signups__bill")
-        prefetch_related_objects(queryset, "training__signups__pilot")
-        prefetch_related_objects(queryset, "runs")
-
-        for previous_report, report in zip(queryset, queryset[1:]):
+    def get_context_data(self, **kwargs):
+        """Compute cash difference between consecutive reports"""
+        context = super().get_context_data(**kwargs)
+        reports = context["report_list"]
+        for previous_report, report in zip(reports, reports[1:]):
             if previous_report.cash_at_end is None:
                 report.difference_between_reports = "❓"
             else:
                 report.difference_between_reports = (
                     report.cash_at_start - previous_report.cash_at_end
                 )
-        return queryset
+        return context
 
 
 class BalanceView(OrgaRequiredMixin, YearArchiveView):
@@ -111,150 +142,73 @@ class BalanceView(OrgaRequiredMixin, YearArchiveView):
     name = "Berichte"
     date_field = "training__date"
     template_name = "bookkeeping/report_balance.html"
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        prefetch_related_objects(queryset, "absorptions__signup__pilot")
-        prefetch_related_objects(queryset, "bills__signup__pilot")
-        prefetch_related_objects(queryset, "bills__signup__purchases")
-        prefetch_related_objects(queryset, "expenses")
-        prefetch_related_objects(queryset, "training__signups__purchases")
-        prefetch_related_objects(queryset, "training__signups__runs")
-        prefetch_related_objects(queryset, "training__signups__bill")
-        prefetch_related_objects(queryset, "training__signups__pilot")
-        prefetch_related_objects(queryset, "runs")
-        return queryset
+    prefetch = [
+        Prefetch("absorptions", Absorption.objects.select_related("signup__pilot")),
+        Prefetch("bills", Bill.objects.select_related("signup__pilot")),
+        "bills__signup__purchases",
+        "expenses",
+        Prefetch("training__signups", Signup.objects.select_related("pilot", "bill")),
+        "training__signups__purchases",
+        "training__signups__runs",
+        "runs",
+    ]
+
+    async def get(self, request, *args, **kwargs):
+        """Only load the reports if their balance is not cached"""
+        self.object_list = await self.aget_queryset()
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        # Overview
-        reports = sorted(
-            context["report_list"], key=lambda report: report.training.date
-        )
-        context["num_reports"] = len(reports)
-        runs = [run for report in reports for run in report.runs.all()]
-        context["num_runs"] = len(set(run.created_on for run in runs))
-        context["num_flights"] = sum(run.is_flight for run in runs)
-        signups = [
-            signup for report in reports for signup in report.training.signups.all()
-        ]
-        context["num_pilots"] = len(
-            set(signup.pilot for signup in signups if signup.is_paid)
+        context.update(
+            self.get_or_compute(
+                "balance",
+                self.kwargs["year"],
+                models=balance.MODELS,
+                compute=lambda: balance.aggregate(context["report_list"]),
+            )
         )
-        context["num_open_signups"] = sum(signup.must_be_paid for signup in signups)
-
-        # Revenue
-        context["revenue_from_absorptions"] = {}
-        context["revenue_from_day_passes"] = {}
-        context["revenue_from_prepaid_flights"] = {}
-        context["revenue_from_flights"] = {}
-        context["revenue_from_equipment"] = {}
-        context["total_revenue"] = {}
-        absorptions = [
-            absorption for report in reports for absorption in report.absorptions.all()
-        ]
-        bills = [bill for report in reports for bill in report.bills.all()]
-        for method in PaymentMethods:
-            if method == PaymentMethods.BANK_TRANSFER:
-                continue
+        context["exports"] = exports.EXPORTS
+        return context
 
-            absorptions_paid_with_method = [
-                absorption for absorption in absorptions if absorption.method == method
-            ]
-            context["revenue_from_absorptions"][method.label] = sum(
-                absorption.amount for absorption in absorptions_paid_with_method
-            )
 
-            bills_paid_with_method = [bill for bill in bills if bill.method == method]
-            purchases = [
-                purchase
-                for bill in bills_paid_with_method
-                for purchase in bill.signup.purchases.all()
-            ]
-            context["revenue_from_day_passes"][method.label] = sum(
-                purchase.price for purchase in purchases if purchase.is_day_pass
-            )
-            context["revenue_from_prepaid_flights"][method.label] = sum(
-                purchase.price for purchase in purchases if purchase.is_prepaid_flights
-            )
-            context["revenue_from_equipment"][method.label] = sum(
-                purchase.price for purchase in purchases if purchase.is_equipment
-            )
-            context["total_revenue"][method.label] = (
-                sum(bill.amount for bill in bills_paid_with_method)
-                + context["revenue_from_absorptions"][method.label]
-            )
-            context["revenue_from_flights"][method.label] = (
-                context["total_revenue"][method.label]
-                - context["revenue_from_absorptions"][method.label]
-                - context["revenue_from_day_passes"][method.label]
-                - context["revenue_from_prepaid_flights"][method.label]
-                - context["revenue_from_equipment"][method.label]
-            )
+def csv_response(request, rows, filename):
+    """Stream rows as CSV, asynchronously when served via ASGI"""
+    lines = exports.as_csv(rows)
+    if isinstance(request, ASGIRequest):
+        lines = exports.in_chunks(lines)
+    return StreamingHttpResponse(
+        lines,
+        content_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-        # Expeditures
-        expeditures = absorptions + [
-            expense for report in reports for expense in report.expenses.all()
-        ]
-        by_reason = lambda expediture: expediture.reason
-        context["expeditures_by_reason"] = {
-            reason: sum(expediture.amount for expediture in expeditures_with_reason)
-            for reason, expeditures_with_reason in groupby(
-                sorted(expeditures, key=by_reason), key=by_reason
-            )
-        }
-        context["total_expeditures"] = sum(
-            expediture.amount for expediture in expeditures
-        )
-        by_date = lambda expediture: expediture.report.training.date
-        context["expediture_list"] = sorted(
-            [expediture for expediture in expeditures if expediture.amount], key=by_date
+
+class JournalView(BalanceView):
+    """Stream the journal of the balance as CSV, thus from the same cached aggregation"""
+
+    def render_to_response(self, context):
+        return csv_response(
+            self.request,
+            journal.rows(context["journal"]),
+            f"{self.kwargs['year']}_journal.csv",
         )
 
-        # Amount
-        context["first_cash"] = reports[0].cash_at_start
-        if reports[-1].cash_at_end is not None:
-            context["latest_cash"] = reports[-1].cash_at_end
-            context["amount"] = reports[-1].cash_at_end - (
-                reports[0].cash_at_start
-                + context["total_revenue"].get(PaymentMethods.CASH.label, 0)
-                - context.get("total_expeditures", 0)
-            )
 
-        # Bank transfers
-        context["bank_transfers"] = [
-            absorption
-            for absorption in absorptions
-            if absorption.method == PaymentMethods.BANK_TRANSFER and absorption.amount
-        ]
+class ExportView(OrgaRequiredMixin, ReadFromReplicaMixin, generic.View):
+    """Stream bills, purchases, expenses, absorptions, or runs of a year as CSV"""
 
-        # TWINT
-        transactions = absorptions + bills
-        transactions = [
-            transaction
-            for transaction in transactions
-            if transaction.method == PaymentMethods.TWINT and transaction.amount
-        ]
-        by_week = lambda expediture: expediture.report.training.date.isocalendar().week
-        twint_by_week = {
-            week: sorted(transactions_in_week, key=by_date)
-            for week, transactions_in_week in groupby(
-                sorted(transactions, key=by_week), key=by_week
-            )
-        }
-
-        def label(week, transactions_in_week):
-            monday = date.fromisocalendar(reports[0].training.date.year, week, 1)
-            sunday = date.fromisocalendar(reports[0].training.date.year, week, 7)
-            total = sum(transaction.amount for transaction in transactions_in_week)
-            return f"{date_format(monday, 'j.n.')} - {date_format(sunday, 'j.n.')}, Total {total}"
-
-        context["twint_weeks"] = {
-            label(week, transactions_in_week): transactions_in_week
-            for week, transactions_in_week in twint_by_week.items()
-        }
-        return context
+    def get(self, request, *args, **kwargs):
+        if not (rows := exports.EXPORTS.get(self.kwargs["kind"])):
+            raise Http404(f"Kein Export {self.kwargs['kind']}.")
+
+        # The stream is consumed after dispatch, outside of the replica context
+        using = router.db_for_read(Report)
+        year = self.kwargs["year"]
+        return csv_response(
+            request, rows(year, using=using), f"{year}_{self.kwargs['kind']}.csv"
+        )
 
 
 class ReportCreateView(OrgaRequiredMixin, generic.CreateView):
@@ -738,22 +692,19 @@ class BillListView(LoginRequiredMixin, YearArchiveView):
     model = Bill
     name = "Rechnungen"
     date_field = "signup__training__date"
+    prefetch = ["signup__runs", "signup__purchases", "signup__training__report"]
 
     @property
     def filters(self):
         return {"signup__pilot": self.request.user}
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        prefetch_related_objects(queryset, "signup__runs")
-        prefetch_related_objects(queryset, "signup__purchases")
-        prefetch_related_objects(queryset, "signup__training__report")
-
-        for bill in queryset:
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for bill in context["bill_list"]:
             bill.purchases = ", ".join(
                 [purchase.description for purchase in bill.signup.purchases.all()]
             )
-        return queryset
+        return context
 
 
 class PilotListView(OrgaRequiredMixin, YearArchiveView):
@@ -761,13 +712,7 @@ class PilotListView(OrgaRequiredMixin, YearArchiveView):
     name = "aktive Pilot·innen"
     date_field = "signup__training__date"
     template_name = "bookkeeping/pilot_list.html"
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        prefetch_related_objects(queryset, "signup__pilot")
-        prefetch_related_objects(queryset, "signup__runs")
-        prefetch_related_objects(queryset, "signup__training__report")
-        return queryset
+    prefetch = ["signup__pilot", "signup__runs", "signup__training__report"]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -792,13 +737,16 @@ class PilotListView(OrgaRequiredMixin, YearArchiveView):
         )
         return context
 
+
 class BillBatchCreateView(OrgaRequiredMixin, generic.TemplateView):
     """Create all bills that can be paid with abos"""
 
     template_name = "bookkeeping/bill_batch_create.html"
 
     def get_abo_only_signups_and_report(self, date):
-        training = get_object_or_404(Training, date=date)
+        training = get_object_or_404(
+            Training.objects.prefetch_related("signups__pilot"), date=date
+        )
         report = get_object_or_404(Report, training=training)
 
         active_signups = training.active_signups
@@ -809,8 +757,8 @@ class BillBatchCreateView(OrgaRequiredMixin, generic.TemplateView):
             signup
             for signup in active_signups
             if not signup.is_paid
-            and not signup.needs_day_pass
             and Bill(signup=signup, report=report).to_pay <= 0
+            and not signup.needs_day_pass
         ]
         return abo_only_signups, report
 
@@ -988,6 +936,25 @@ class TwintView(generic.TemplateView):
         return self.request.GET.get("next")
 
 
+class TwintReconciliationView(OrgaRequiredMixin, generic.FormView):
+    """Match uploaded TWINT statements with the bills and absorptions paid with TWINT"""
+
+    form_class = forms.TwintStatementsForm
+    template_name = "bookkeeping/twint_reconciliation.html"
+
+    def form_valid(self, form):
+        """Show the result instead of redirecting, as nothing is saved"""
+        transactions = form.cleaned_data["statements"]
+        result = reconciliation.reconcile_with_records(
+            transactions, max_days=form.cleaned_data["max_days"]
+        )
+        return self.render_to_response(
+            self.get_context_data(
+                form=form, num_transactions=len(transactions), **result
+            )
+        )
+
+
 class BillUpdateView(OrgaRequiredMixin, generic.UpdateView):
     form_class = forms.BillForm
     template_name = "bookkeeping/bill_update.html"
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings, read from the working directory. By default, acbeo/wsgi.py is served
+with synchronous workers. With `SERVER_INTERFACE=asgi`, acbeo/asgi.py is served with
+uvicorn workers instead, such that a worker awaiting the database or streaming events
+can meanwhile serve other requests.
+
+The workers write their metrics to PROMETHEUS_MULTIPROC_DIR, see news/metrics.py.
+"""
+
+import os
+import shutil
+
+bind = f":{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+if os.getenv("SERVER_INTERFACE", "wsgi") == "asgi":
+    wsgi_app = "acbeo.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "acbeo.wsgi:application"
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/acbeo-metrics")
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    """Drop metrics of previous runs"""
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
+from django.core.cache import cache
 
+from . import caching
 from .models import Post, Pilot
 
 
@@ -17,11 +19,21 @@ admin.site.register(Post, PostAdmin)
 @admin.action(description="Ausgewählte zu Mitgliedern machen")
 def make_member(modeladmin, request, queryset):
     queryset.update(role=Pilot.Role.MEMBER)
+    cache.delete_many(
+        [Pilot.cache_key(pk) for pk in queryset.values_list("pk", flat=True)]
+    )
+    # Updates don't send signals, e.g. for balances depending on roles
+    caching.invalidate(Pilot)
 
 
 @admin.action(description="Ausgewählte zu Leiter·innen machen")
 def make_orga(modeladmin, request, queryset):
     queryset.update(role=Pilot.Role.ORGA)
+    cache.delete_many(
+        [Pilot.cache_key(pk) for pk in queryset.values_list("pk", flat=True)]
+    )
+    # Updates don't send signals, e.g. for balances depending on roles
+    caching.invalidate(Pilot)
 
 
 class PilotAdmin(BaseUserAdmin):
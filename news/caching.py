@@ -0,0 +1,167 @@
+"""
+Cache expensive computations, e.g. yearly balances, in the cache shared by the workers,
+see CACHES in the settings. Keys contain a version per model the value depends on,
+which is incremented when an object of that model is saved or deleted. Thus cached
+values are never stale, and there is no need to know which keys to delete.
+"""
+
+import os
+import time
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db.models.signals import post_delete, post_save
+
+from . import metrics
+
+LOCK_TIMEOUT = 30  # s, longest expected computation
+LOCK_WAIT = 1  # s, as waiting blocks a thread, via ASGI the one running all sync code
+POLL_INTERVAL = 0.05  # s
+
+
+def version_key(model):
+    return f"version:{model._meta.label_lower}"
+
+
+def versioned_key(namespace, *parts, models=()):
+    """Key in the namespace, e.g. "balance", for parts like the year"""
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start at the current time rather than at 1, such that a version is not
+            # reused if it was evicted, returning values cached before
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return ":".join(
+        [namespace, *map(str, parts)]
+        + [
+            f"{model._meta.model_name}{versions[key]}"
+            for model, key in zip(models, keys)
+        ]
+    )
+
+
+def invalidate(*models):
+    """Expire cached values depending on the models, e.g. after QuerySet.update()"""
+    # Set a new version rather than incrementing it, which is not atomic on every
+    # backend, such that concurrent invalidations cannot end on a version seen before
+    cache.set_many(
+        {version_key(model): time.time_ns() for model in models}, timeout=None
+    )
+
+
+def logging_in(update_fields):
+    """Whether a save only updated the last_login of a pilot, which nothing cached shows"""
+    return bool(update_fields) and set(update_fields) <= {"last_login"}
+
+
+def invalidate_on_change(sender, update_fields=None, **kwargs):
+    if not logging_in(update_fields):
+        invalidate(sender)
+
+
+def track(*models):
+    """Invalidate cached values depending on the models whenever objects are saved"""
+    for model in models:
+        for signal in [post_save, post_delete]:
+            signal.connect(
+                invalidate_on_change,
+                sender=model,
+                dispatch_uid=f"invalidate_{model._meta.label_lower}",
+            )
+
+
+def lock_file(key):
+    """
+    File locking computations of the key, if the cache is in files, as unlike other
+    backends FileBasedCache.add() is not atomic. None otherwise.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, FileBasedCache):
+        return backend._key_to_file(f"lock:{key}") + ".lock"
+
+
+def acquire_lock(key, token):
+    """Lock computing the key, True if acquired"""
+    if (path := lock_file(key)) is None:
+        return cache.add(f"lock:{key}", token, timeout=LOCK_TIMEOUT)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if is_locked(key):
+                return False
+            # Expired, the computing worker failed or took too long
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(descriptor, "w") as file:
+            file.write(token)
+        return True
+    return False
+
+
+def release_lock(key, token):
+    """Release the lock, unless it expired and was acquired by another worker"""
+    if (path := lock_file(key)) is None:
+        if cache.get(f"lock:{key}") == token:
+            cache.delete(f"lock:{key}")
+        return
+
+    try:
+        with open(path) as file:
+            if file.read() == token:
+                os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def is_locked(key):
+    if (path := lock_file(key)) is None:
+        return cache.get(f"lock:{key}") is not None
+
+    try:
+        return time.time() - os.path.getmtime(path) < LOCK_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+
+def get_or_compute(key, compute, timeout=24 * 60 * 60):
+    """
+    Get the value of the key from the cache, or compute and cache it, values must not be
+    None. While one worker computes, others wait up to LOCK_WAIT for its value instead
+    of computing it concurrently, e.g. when many people look at the balance after a
+    training.
+    """
+    namespace = key.split(":")[0]
+    if (value := cache.get(key)) is not None:
+        metrics.CACHE_REQUESTS.labels(namespace=namespace, result="hit").inc()
+        return value
+
+    metrics.CACHE_REQUESTS.labels(namespace=namespace, result="miss").inc()
+    token = uuid.uuid4().hex
+    if acquire_lock(key, token):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+            return value
+        finally:
+            release_lock(key, token)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        if (value := cache.get(key)) is not None:
+            return value
+        if not is_locked(key):
+            break
+    # The computing worker failed or takes long
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,54 @@
+"""
+Tune SQLite, used without DATABASE_URL, for a web server: with the write-ahead log
+readers don't wait for a writer, e.g. during bill settlement, and vice versa. With
+REPLICA_DATABASE_URL, views with ReadFromReplicaMixin read from a replica.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+reading_from_replica = ContextVar("reading_from_replica", default=False)
+
+
+def apply_pragmas(connection, pragmas):
+    """Set PRAGMAs on a DB-API connection to SQLite"""
+    for name, value in pragmas.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+@contextmanager
+def replica():
+    """Read from the replica within this context, also in threads of sync_to_async"""
+    token = reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        reading_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            reading_from_replica.get()
+            and settings.REPLICA_DATABASE in settings.DATABASES
+        ):
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Always write to the primary, also objects loaded from the replica"""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,95 @@
+"""
+Resized AVIF and WebP variants of static images, written by `build_images` when building
+the container, such that phones download a fraction of the bytes. The manifest lists the
+widths of each image, from which the template tag `responsive_image` links them in a
+`srcset`, see news/templatetags/news_extras.py.
+"""
+
+import functools
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from PIL import Image
+
+WIDTHS = [320, 640, 960]
+# Preferred first, browsers take the first source they support. The qualities look
+# alike, AVIF being about a third smaller.
+FORMATS = {"avif": ("AVIF", "image/avif", 45), "webp": ("WEBP", "image/webp", 70)}
+# Photos, PNGs are icons and codes, which must stay sharp
+EXTENSIONS = [".jpeg", ".jpg"]
+
+# Within the static files of the app, such that they are collected and hashed
+DIRECTORY = Path(__file__).parent / "static" / "news" / "derivatives"
+PREFIX = "news/derivatives"
+
+
+def filename(name, width, extension):
+    return f"{Path(name).with_suffix('')}-{width}.{extension}"
+
+
+def derivative(name, width, extension):
+    """Static name of a variant, e.g. news/derivatives/news/smile-320.webp"""
+    return f"{PREFIX}/{filename(name, width, extension)}"
+
+
+def sources():
+    """Names of the photos among the static files of the project's apps"""
+    for finder in finders.get_finders():
+        for path, storage in finder.list(ignore_patterns=["derivatives"]):
+            location = Path(getattr(storage, "location", "/"))
+            if (
+                location.is_relative_to(settings.BASE_DIR)
+                and Path(path).suffix.lower() in EXTENSIONS
+            ):
+                yield path
+
+
+def build(names, directory=DIRECTORY, widths=WIDTHS):
+    """Write the missing variants of the images to the directory, returns the manifest"""
+    manifest = {}
+    for name in names:
+        path = Path(finders.find(name))
+        with Image.open(path) as image:
+            original_width, original_height = image.size
+            # Includes the original width, to offer it in the smaller formats
+            image_widths = [w for w in widths if w < original_width] + [original_width]
+            for width in image_widths:
+                height = round(original_height * width / original_width)
+                resized = None
+                for extension, (format, _, quality) in FORMATS.items():
+                    target = directory / filename(name, width, extension)
+                    if (
+                        target.exists()
+                        and target.stat().st_mtime >= path.stat().st_mtime
+                    ):
+                        continue
+
+                    if resized is None:
+                        resized = image.convert("RGB").resize(
+                            (width, height), Image.Resampling.LANCZOS
+                        )
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    resized.save(target, format, quality=quality)
+        manifest[name] = {
+            "width": original_width,
+            "height": original_height,
+            "widths": image_widths,
+        }
+
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "manifest.json", "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    load_manifest.cache_clear()
+    return manifest
+
+
+@functools.cache
+def load_manifest(directory=DIRECTORY):
+    """Widths of the variants by image, or nothing if they weren't built"""
+    try:
+        with open(directory / "manifest.json") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
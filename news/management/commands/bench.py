@@ -0,0 +1,311 @@
+import json
+import time
+import tracemalloc
+from io import StringIO
+from statistics import median, quantiles
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.backends.django import Template
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+import bookkeeping.urls
+import news.urls
+import trainings.urls
+from bookkeeping.models import Absorption, Bill, Expense, Purchase, Report
+from news.models import Pilot, Post
+from trainings.models import Signup
+
+URL_MODULES = [(news.urls, ""), (trainings.urls, "trainings/"), (bookkeeping.urls, "berichte/")]  # fmt: skip
+ROLES = {
+    "home": None,
+    "contact": None,
+    "register": None,
+    "membership": None,
+    "login": None,
+    "password_reset": None,
+    "post": None,
+    "about_trainings": None,
+    "twint": None,
+    "update_pilot": "pilot",
+    "trainings": "pilot",
+    "training_status": "pilot",
+    "signups": "pilot",
+    "signup": "pilot",
+    "batch_signup": "pilot",
+    "update_signup": "pilot",
+    "bills": "pilot",
+    "create_trainings": "staff",
+    "metrics": "staff",
+}  # All other views are for orgas
+SKIPPED = {
+    "logout": "only POST",
+    "password_reset_confirm": "needs a token",
+    "training_events": "streams for minutes",
+}
+
+
+def content(response):
+    """Body of the response, consuming streams such that their queries count"""
+    if response.streaming:
+        return b"".join(response.streaming_content)
+
+    return response.content
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GET requests to every view as the right role against synthetic "
+        "data of increasing size, in a test database. Reports queries, SQL time, "
+        "render time, p50/p95 wall time, peak memory, and size before and after "
+        "compression. Fails if a view regressed compared to a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1, 2, 4], help="in seasons"
+        )
+        parser.add_argument("--pilots-per-season", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write results as JSON")
+        parser.add_argument("--baseline", help="JSON of an earlier run to compare")
+        parser.add_argument(
+            "--threshold", type=float, default=0.25, help="allowed slowdown of p50"
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            results = {}
+            for size in options["sizes"]:
+                self.seed(size, options)
+                results[size] = self.bench(options["repeat"])
+                self.report(size, results[size])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        results = {
+            "options": {
+                key: options[key]
+                for key in ["sizes", "pilots_per_season", "repeat", "seed"]
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+
+        if baseline:
+            self.compare(
+                baseline, json.loads(json.dumps(results)), options["threshold"]
+            )
+
+    def seed(self, size, options):
+        call_command("flush", interactive=False, verbosity=0)
+        call_command(
+            "seed_synthetic",
+            seasons=size,
+            pilots=size * options["pilots_per_season"],
+            seed=options["seed"],
+            today=True,
+            stdout=StringIO(),
+        )
+        Post.objects.create(
+            title="Benchmark",
+            slug="benchmark",
+            author=Pilot.objects.filter(role=Pilot.Role.STAFF).first(),
+            content="Synthetic",
+        )
+
+    def fixtures(self):
+        """Users & arguments for URLs, preferring objects of today's training"""
+        today = timezone.now().date()
+        signups_today = Signup.objects.filter(training__date=today)
+        pilot_signup = (
+            signups_today.filter(pilot__role__lt=Pilot.Role.ORGA).first()
+            or signups_today.first()
+        )
+        unpaid_signup = signups_today.filter(
+            status=Signup.Status.SELECTED, bill__isnull=True
+        ).first()
+        report_today = Report.objects.filter(training__date=today)
+        pks = {
+            "update_expense": Expense.objects.filter(report__in=report_today),
+            "update_absorption": Absorption.objects.filter(report__in=report_today),
+            "update_bill": Bill.objects.filter(report__in=report_today),
+            "delete_purchase": Purchase.objects.filter(report__in=report_today),
+        }
+        users = {
+            "pilot": pilot_signup.pilot if pilot_signup else None,
+            "orga": Pilot.objects.filter(role=Pilot.Role.ORGA).first(),
+            "staff": Pilot.objects.filter(role=Pilot.Role.STAFF).first(),
+        }
+        kwargs = {
+            "year": today.year,
+            "date": today.isoformat() if report_today.exists() else None,
+            "signup": unpaid_signup.pk if unpaid_signup else None,
+            "run": 1,
+            "slug": "benchmark",
+            "kind": "rechnungen",
+        }
+        return users, kwargs, {name: pks[name].first() for name in pks}
+
+    def urls(self):
+        for module, prefix in URL_MODULES:
+            for pattern in module.urlpatterns:
+                assert isinstance(pattern, URLPattern)
+                yield prefix + str(pattern.pattern), pattern
+
+    def bench(self, repeat):
+        users, fixtures, objects = self.fixtures()
+        clients = {None: Client(raise_request_exception=False)}
+        for role, user in users.items():
+            clients[role] = Client(raise_request_exception=False)
+            if user:
+                clients[role].force_login(user)
+
+        results = {}
+        for label, pattern in self.urls():
+            if reason := SKIPPED.get(pattern.name):
+                results[label] = {"skipped": reason}
+                continue
+
+            kwargs = {}
+            for argument in pattern.pattern.converters:
+                if argument == "pk":
+                    value = objects.get(pattern.name)
+                    kwargs["pk"] = value.pk if value else None
+                else:
+                    kwargs[argument] = fixtures.get(argument)
+            if None in kwargs.values():
+                results[label] = {"skipped": "no data"}
+                continue
+
+            client = clients[ROLES.get(pattern.name, "orga")]
+            results[label] = self.measure(
+                client, reverse(pattern.name, kwargs=kwargs), repeat
+            )
+        return results
+
+    @staticmethod
+    def measure(client, path, repeat):
+        sql_times, render_times = [], []
+
+        def time_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                sql_times.append(time.perf_counter() - start)
+
+        render = Template.render
+
+        def time_render(template, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return render(template, *args, **kwargs)
+            finally:
+                render_times.append(time.perf_counter() - start)
+
+        client.get(path)  # Warm up
+        wall_times, sql_totals, render_totals, num_queries = [], [], [], []
+        with connection.execute_wrapper(time_query), mock.patch.object(
+            Template, "render", time_render
+        ):
+            for _ in range(repeat):
+                sql_times.clear()
+                render_times.clear()
+                start = time.perf_counter()
+                response = client.get(path)
+                body = content(response)
+                wall_times.append(time.perf_counter() - start)
+                sql_totals.append(sum(sql_times))
+                render_totals.append(sum(render_times))
+                num_queries.append(len(sql_times))
+
+        tracemalloc.start()
+        content(client.get(path))
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        compressed = client.get(path, headers={"accept-encoding": "br, gzip"})
+
+        percentiles = quantiles(wall_times, n=20) if repeat > 1 else wall_times * 19
+        return {
+            "status": response.status_code,
+            "queries": max(num_queries),
+            "sql_ms": round(median(sql_totals) * 1000, 2),
+            "render_ms": round(median(render_totals) * 1000, 2),
+            "p50_ms": round(median(wall_times) * 1000, 2),
+            "p95_ms": round(percentiles[18] * 1000, 2),
+            "peak_kib": round(peak_memory / 1024),
+            "bytes": len(body),
+            "sent_bytes": len(content(compressed)),
+        }
+
+    def report(self, size, results):
+        self.stdout.write(
+            f"\n{size} season(s)\n{'url':52} {'status':>6} {'queries':>7} "
+            f"{'sql ms':>7} {'render':>7} {'p50 ms':>7} {'p95 ms':>7} {'KiB':>6} "
+            f"{'kB':>6} {'sent':>6}"
+        )
+        for label, result in results.items():
+            if "skipped" in result:
+                self.stdout.write(f"{label:52} skipped, {result['skipped']}")
+                continue
+
+            self.stdout.write(
+                f"{label:52} {result['status']:6} {result['queries']:7} "
+                f"{result['sql_ms']:7.1f} {result['render_ms']:7.1f} "
+                f"{result['p50_ms']:7.1f} {result['p95_ms']:7.1f} "
+                f"{result['peak_kib']:6} {result['bytes'] / 1000:6.1f} "
+                f"{result['sent_bytes'] / 1000:6.1f}"
+            )
+
+        measured = [result for result in results.values() if "skipped" not in result]
+        total = sum(result["bytes"] for result in measured)
+        sent = sum(result["sent_bytes"] for result in measured)
+        if total:
+            self.stdout.write(
+                f"Compression saved {(total - sent) / 1000:.1f} of {total / 1000:.1f} "
+                f"kB ({1 - sent / total:.0%})."
+            )
+
+    def compare(self, baseline, results, threshold):
+        """Fail on more queries or slower p50 than allowed by the threshold"""
+        regressions = []
+        for size, urls in results["results"].items():
+            for label, result in urls.items():
+                before = baseline["results"].get(size, {}).get(label)
+                if not before or "skipped" in before or "skipped" in result:
+                    continue
+
+                if result["queries"] > before["queries"]:
+                    regressions.append(
+                        f"{label} ({size} seasons): {before['queries']} -> "
+                        f"{result['queries']} queries"
+                    )
+                # Ignore noise of fast views
+                allowed = max(before["p50_ms"] * (1 + threshold), before["p50_ms"] + 1)
+                if result["p50_ms"] > allowed:
+                    regressions.append(
+                        f"{label} ({size} seasons): p50 {before['p50_ms']} -> "
+                        f"{result['p50_ms']} ms"
+                    )
+        if regressions:
+            raise CommandError("Regressions:\n" + "\n".join(regressions))
+
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, median, quantiles
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare connecting to Postgres for each request, persistent connections, and "
+        "psycopg's pool under a burst of concurrent requests, each running a query "
+        "between Django's request_started and request_finished cleanup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=25)
+        parser.add_argument("--requests", type=int, default=40, help="per thread")
+        parser.add_argument("--pool-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        default = connections["default"]
+        if default.vendor != "postgresql":
+            raise CommandError("Set DATABASE_URL to a Postgres database.")
+
+        settings_dict = {**default.settings_dict, "OPTIONS": {}}
+        modes = {
+            "connect": {**settings_dict, "CONN_MAX_AGE": 0},
+            "persist": {**settings_dict, "CONN_MAX_AGE": 600},
+        }
+        if self.psycopg_pool_installed():
+            modes["pool"] = {
+                **settings_dict,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": {"pool": {"min_size": 2, "max_size": options["pool_size"]}},
+            }
+
+        self.stdout.write(
+            f"{'mode':8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'connect ms':>11}"
+        )
+        for mode, settings_dict in modes.items():
+            results = self.burst(
+                default.__class__, f"benchmark_{mode}", settings_dict, options
+            )
+            self.report(mode, *results)
+
+    @staticmethod
+    def psycopg_pool_installed():
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def burst(wrapper_class, alias, settings_dict, options):
+        def requests():
+            connection = wrapper_class(settings_dict, alias)
+            durations, connects = [], []
+            for _ in range(options["requests"]):
+                start = time.perf_counter()
+                connection.close_if_unusable_or_obsolete()  # On request_started
+                connection.ensure_connection()
+                connects.append(time.perf_counter() - start)
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.close_if_unusable_or_obsolete()  # On request_finished
+                durations.append(time.perf_counter() - start)
+            connection.close()
+            return durations, connects, connection
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as executor:
+            results = list(
+                executor.map(lambda _: requests(), range(options["threads"]))
+            )
+        duration = time.perf_counter() - start
+        results[0][2].close_pool()
+        durations = [d for result in results for d in result[0]]
+        connects = [c for result in results for c in result[1]]
+        return duration, durations, connects
+
+    def report(self, mode, duration, durations, connects):
+        self.stdout.write(
+            f"{mode:8} {len(durations) / duration:8.0f} "
+            f"{median(durations) * 1000:8.2f} "
+            f"{quantiles(durations, n=20)[18] * 1000:8.2f} "
+            f"{mean(connects) * 1000:11.2f}"
+        )
@@ -0,0 +1,127 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from statistics import quantiles
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and latency of the read views when served via WSGI and "
+        "via ASGI, using the settings from gunicorn.conf.py and the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="Pilot to log in as, required for views")
+        parser.add_argument("--connections", type=int, default=25)
+        parser.add_argument("--duration", type=float, default=10, help="per path, s")
+        parser.add_argument("--interface", choices=["wsgi", "asgi"], action="append")
+        parser.add_argument("--path", action="append", help="default: read views")
+
+    def handle(self, *args, **options):
+        cookie = ""
+        paths = options["path"] or [reverse("home")]
+        if options["email"]:
+            try:
+                pilot = get_user_model().objects.get(email=options["email"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Pilot {options['email']} does not exist.")
+            client = Client()
+            client.force_login(pilot)
+            session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+            cookie = f"{settings.SESSION_COOKIE_NAME}={session_key}"
+            if not options["path"]:
+                paths += [reverse("trainings"), reverse("signups"), reverse("bills")]
+
+        self.stdout.write(
+            f"{'':5} {'path':28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>7}"
+        )
+        for interface in options["interface"] or ["wsgi", "asgi"]:
+            port = self.free_port()
+            server = self.start_server(interface, port)
+            try:
+                for path in paths:
+                    results = self.load(
+                        port, path, cookie, options["connections"], options["duration"]
+                    )
+                    self.report(interface, path, results, options["duration"])
+            finally:
+                server.terminate()
+                server.wait()
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    def start_server(interface, port):
+        env = os.environ | {"SERVER_INTERFACE": interface, "PORT": str(port)}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--log-level", "warning"],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"Could not start {interface} server.")
+
+    @staticmethod
+    def load(port, path, cookie, connections, duration):
+        """Each connection sends requests one after another until the duration passed"""
+        end = time.monotonic() + duration
+
+        def connect():
+            latencies, errors = [], 0
+            while time.monotonic() < end:
+                connection = HTTPConnection("127.0.0.1", port, timeout=30)
+                start = time.perf_counter()
+                try:
+                    connection.request("GET", path, headers={"Cookie": cookie})
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+                except OSError:
+                    errors += 1
+                finally:
+                    connection.close()
+            return latencies, errors
+
+        with ThreadPoolExecutor(connections) as executor:
+            results = list(executor.map(lambda _: connect(), range(connections)))
+        latencies = sorted(latency for result in results for latency in result[0])
+        errors = sum(result[1] for result in results)
+        return latencies, errors
+
+    def report(self, interface, path, results, duration):
+        latencies, errors = results
+        if len(latencies) < 2:
+            self.stdout.write(f"{interface:5} {path:28} failed, {errors} errors")
+            return
+
+        percentiles = quantiles(latencies, n=100)
+        p50, p95, p99 = (percentiles[i - 1] * 1000 for i in (50, 95, 99))
+        self.stdout.write(
+            f"{interface:5} {path:28} {len(latencies) / duration:8.1f} {p50:8.1f} "
+            f"{p95:8.1f} {p99:8.1f} {errors:7}"
+        )
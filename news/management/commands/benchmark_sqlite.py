@@ -0,0 +1,136 @@
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from news.database import apply_pragmas
+
+SCHEMA = """
+CREATE TABLE signup (id INTEGER PRIMARY KEY, training INTEGER, pilot INTEGER, paid BOOL);
+CREATE INDEX signup_training ON signup (training);
+CREATE TABLE bill (id INTEGER PRIMARY KEY, signup INTEGER UNIQUE, amount INTEGER);
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent read & write throughput of SQLite with Django's defaults "
+        "and with SQLITE_PRAGMAS, on a scratch database shaped like signups & bills. "
+        "Readers list the signups of a training with their bills, writers settle bills."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=5, help="per profile, s")
+        parser.add_argument("--trainings", type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':8} {'reads/s':>8} {'writes/s':>9} {'p95 read':>9} "
+            f"{'p95 write':>10} {'errors':>7}"
+        )
+        profiles = {
+            "default": ({}, "DEFERRED"),
+            "tuned": (settings.SQLITE_PRAGMAS, "IMMEDIATE"),
+        }
+        for profile, (pragmas, transaction_mode) in profiles.items():
+            with TemporaryDirectory() as directory:
+                path = Path(directory) / "benchmark.sqlite3"
+                self.seed(path, options["trainings"])
+                results = self.load(path, pragmas, transaction_mode, options)
+            self.report(profile, results, options["duration"])
+
+    @staticmethod
+    def seed(path, trainings):
+        with sqlite3.connect(path) as db:
+            db.executescript(SCHEMA)
+            db.executemany(
+                "INSERT INTO signup (training, pilot, paid) VALUES (?, ?, 0)",
+                (
+                    (training, pilot)
+                    for training in range(trainings)
+                    for pilot in range(30)
+                ),
+            )
+        db.close()
+
+    def load(self, path, pragmas, transaction_mode, options):
+        results = {"reads": [], "writes": [], "errors": 0}
+        lock = threading.Lock()
+        stop = time.perf_counter() + options["duration"]
+
+        def connect():
+            # Django's default timeout of Python's sqlite3 module
+            db = sqlite3.connect(path, timeout=5, isolation_level=None)
+            apply_pragmas(db, pragmas)
+            return db
+
+        def read(db):
+            training = random.randrange(options["trainings"])
+            db.execute(
+                "SELECT * FROM signup LEFT JOIN bill ON bill.signup = signup.id "
+                "WHERE training = ?",
+                [training],
+            ).fetchall()
+
+        def write(db):
+            db.execute(f"BEGIN {transaction_mode}")
+            try:
+                signup = db.execute(
+                    "SELECT id FROM signup WHERE training = ? AND NOT paid LIMIT 1",
+                    [random.randrange(options["trainings"])],
+                ).fetchone()
+                if signup:
+                    db.execute(
+                        "INSERT INTO bill (signup, amount) VALUES (?, 27)", signup
+                    )
+                    db.execute("UPDATE signup SET paid = 1 WHERE id = ?", signup)
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+
+        def work(operation, durations):
+            db = connect()
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    operation(db)
+                except sqlite3.OperationalError:  # Database is locked
+                    with lock:
+                        results["errors"] += 1
+                    continue
+                durations.append(time.perf_counter() - start)
+            db.close()
+
+        threads = [
+            threading.Thread(target=work, args=(read, results["reads"]))
+            for _ in range(options["readers"])
+        ] + [
+            threading.Thread(target=work, args=(write, results["writes"]))
+            for _ in range(options["writers"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, profile, results, duration):
+        def p95(durations):
+            if len(durations) < 2:
+                return float("nan")
+            return quantiles(durations, n=20)[18] * 1000
+
+        self.stdout.write(
+            f"{profile:8} {len(results['reads']) / duration:8.0f} "
+            f"{len(results['writes']) / duration:9.0f} {p95(results['reads']):9.1f} "
+            f"{p95(results['writes']):10.1f} {results['errors']:7}"
+        )
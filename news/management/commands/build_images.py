@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from news import images
+
+
+class Command(BaseCommand):
+    help = (
+        "Write resized AVIF and WebP variants of the photos among the static files, "
+        "to be run before collectstatic. Skips variants newer than their photo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="static names, by default all")
+        parser.add_argument("--widths", type=int, nargs="+", default=images.WIDTHS)
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(images.sources())
+        manifest = images.build(names, widths=options["widths"])
+        for name, image in manifest.items():
+            self.stdout.write(f"{name}: {', '.join(map(str, image['widths']))} px")
+        self.stdout.write(
+            self.style.SUCCESS(f"Built variants of {len(manifest)} photos.")
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in batches, to be run periodically. Unlike Django's "
+        "clearsessions, this doesn't lock the table for long when many expired."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.1, help="between, in s")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        deleted = 0
+        while keys := list(
+            expired.values_list("session_key", flat=True)[: options["batch_size"]]
+        ):
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
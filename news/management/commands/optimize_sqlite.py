@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the SQLite database, to be run periodically: update the statistics "
+        "of the query planner and move the write-ahead log into the database."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The database is not SQLite.")
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA optimize")
+            cursor.execute("PRAGMA journal_mode")
+            if cursor.fetchone()[0] != "wal":
+                self.stdout.write(self.style.SUCCESS("Optimized."))
+                return
+
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            busy, pages, checkpointed = cursor.fetchone()
+        if busy:
+            raise CommandError("Checkpoint blocked by another connection, try again.")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Optimized, checkpointed {checkpointed} of {pages} pages of the "
+                "write-ahead log."
+            )
+        )
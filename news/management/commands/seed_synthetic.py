@@ -0,0 +1,353 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from math import ceil
+from random import Random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from bookkeeping.models import (
+    Absorption,
+    Bill,
+    Expense,
+    PaymentMethods,
+    Purchase,
+    Report,
+    Run,
+)
+from news import caching
+from news.models import Pilot
+from trainings.forms import wednesday_before
+from trainings.models import Signup, Training
+
+EMAIL_DOMAIN = "synthetic.example.com"
+# fmt: off
+FIRST_NAMES = [
+    "Anna", "Beat", "Corinne", "Dario", "Eva", "Fabian", "Gabi", "Hans", "Ines",
+    "Jonas", "Käthi", "Lukas", "Mia", "Nico", "Olivia", "Pascal", "Rahel", "Simon",
+    "Tanja", "Urs", "Vreni", "Walter", "Yvonne", "Zora",
+]
+LAST_NAMES = [
+    "Aebi", "Bühler", "Feuz", "Frutiger", "Gerber", "Kunz", "Mathys", "Rubin",
+    "Schneider", "Stähli", "von Allmen", "von Bergen", "Wyss", "Zurbuchen",
+]
+# fmt: on
+
+
+def season_days(year):
+    """Weekends from May to September and the Axalpwochen in early August"""
+    day = date(year, 5, 1)
+    while day <= date(year, 9, 30):
+        if day.weekday() >= 5 or is_axalpwoche(day):
+            yield day
+        day += timedelta(days=1)
+
+
+def is_axalpwoche(day):
+    return day.month == 8 and day.day <= 14
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic pilots, trainings, signups, reports, runs, bills, "
+        "purchases, expenses, and absorptions of the last seasons. The data follows "
+        "the invariants of the views and is the same for the same seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seasons", type=int, default=1)
+        parser.add_argument("--pilots", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--today", action="store_true", help="add a training in progress today"
+        )
+
+    def handle(self, *args, **options):
+        if options["seasons"] < 1:
+            raise CommandError("At least one season is needed.")
+
+        if options["pilots"] < 4:
+            raise CommandError("At least four pilots are needed.")
+
+        self.today = timezone.now().date()
+        this_year = self.today.year
+        days = [
+            day
+            for year in range(this_year - options["seasons"] + 1, this_year + 1)
+            for day in season_days(year)
+        ]
+        if options["today"] and self.today not in days:
+            days = sorted(days + [self.today])
+        if Pilot.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").exists():
+            raise CommandError("Synthetic data exists already, flush it first.")
+
+        if Training.objects.filter(date__in=days).exists():
+            raise CommandError("Trainings exist already during the seasons.")
+
+        self.random = Random(options["seed"])
+        self.options = options
+        self.objects = {
+            model: []
+            for model in [
+                Pilot,
+                Training,
+                Signup,
+                Report,
+                Run,
+                Purchase,
+                Bill,
+                Expense,
+                Absorption,
+            ]
+        }
+        self.pilots = self.generate_pilots(options["pilots"])
+        self.day_passes = {pilot.email: [] for pilot in self.pilots}
+        self.cash = 200
+        for day in days:
+            self.generate_training(day)
+
+        with transaction.atomic():
+            for model, objects in self.objects.items():
+                model.objects.bulk_create(objects, batch_size=options["chunk_size"])
+                self.stdout.write(f"{len(objects):8} {model._meta.verbose_name_plural}")
+        # Bulk creating doesn't send signals
+        caching.invalidate(*self.objects)
+
+    def add(self, instance):
+        self.objects[type(instance)].append(instance)
+        return instance
+
+    def generate_pilots(self, num_pilots):
+        # Ensure every role, followed by realistic shares
+        roles = [Pilot.Role.STAFF, Pilot.Role.ORGA, Pilot.Role.MEMBER, Pilot.Role.GUEST]
+        roles += self.random.choices(
+            Pilot.Role.values, weights=[40, 40, 15, 5], k=num_pilots - len(roles)
+        )
+        return [
+            self.add(
+                Pilot(
+                    email=f"pilot-{i:04}@{EMAIL_DOMAIN}",
+                    password="!synthetic",  # Unusable
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=self.random.choice(LAST_NAMES),
+                    phone=f"+41 79 {self.random.randint(100, 999)} "
+                    f"{self.random.randint(10, 99)} {self.random.randint(10, 99)}",
+                    role=role,
+                    prepaid_flights=Decimal(0),
+                )
+            )
+            for i, role in enumerate(roles)
+        ]
+
+    def generate_training(self, day):
+        training = self.add(
+            Training(
+                date=day,
+                priority_date=wednesday_before(day),
+                info="Axalpwochen" if is_axalpwoche(day) else "",
+            )
+        )
+        pilots = self.random.sample(
+            self.pilots, k=min(len(self.pilots), self.random.randint(4, 16))
+        )
+        signups = [self.generate_signup(pilot, training) for pilot in pilots]
+
+        # Like Training.select_signups: orgas first, then in order of signing up
+        active = [
+            signup for signup in signups if signup.status != Signup.Status.CANCELED
+        ]
+        orgas = [signup for signup in active if signup.pilot.is_orga][
+            : training.min_orgas
+        ]
+        others = [signup for signup in active if signup not in orgas]
+        selected = (orgas + others)[: training.max_pilots]
+        for signup in selected:
+            signup.status = Signup.Status.SELECTED
+
+        if len(selected) < 2:
+            return
+
+        if day == self.today and self.options["today"]:
+            if orgas:
+                training.emergency_mail_sender = orgas[0].pilot
+            self.generate_report(training, selected, orgas, in_progress=True)
+        elif day < self.today and self.random.random() < 0.9:
+            self.generate_report(training, selected, orgas)
+
+    def generate_signup(self, pilot, training):
+        duration = Signup.Duration.ALL_DAY
+        if self.random.random() < 0.2:
+            duration = self.random.choice(Signup.Duration.values)
+        return self.add(
+            Signup(
+                pilot=pilot,
+                training=training,
+                status=(
+                    Signup.Status.CANCELED
+                    if self.random.random() < 0.1
+                    else Signup.Status.WAITING
+                ),
+                is_certain=self.random.random() < 0.85,
+                duration=duration,
+                for_sketchy_weather=self.random.random() < 0.6,
+                comment="Komme mit dem Zug" if self.random.random() < 0.05 else "",
+            )
+        )
+
+    def generate_report(self, training, selected, orgas, in_progress=False):
+        """Reports in progress have bills of only some pilots and no cash at end"""
+        report = self.add(
+            Report(
+                training=training,
+                cash_at_start=self.cash,
+                orga_1=orgas[0] if orgas else None,
+                orga_2=orgas[1] if len(orgas) > 1 else None,
+            )
+        )
+        runs = self.generate_runs(report, selected)
+        cash_revenue = sum(
+            self.generate_bill(report, signup, runs[id(signup)], signup in orgas)
+            for signup in (selected[::2] if in_progress else selected)
+        )
+
+        expenses = [
+            Expense(
+                report=report,
+                reason=Expense.Reasons.GAS.label,
+                amount=self.random.randint(40, 120),
+            )
+        ]
+        if self.random.random() < 0.3:
+            expenses.append(
+                Expense(report=report, reason=Expense.Reasons.PARKING.label, amount=20)
+            )
+        cash_at_end = self.cash + cash_revenue
+        for expense in expenses:
+            if expense.amount <= cash_at_end:
+                cash_at_end -= self.add(expense).amount
+        if cash_at_end > 400 and self.random.random() < 0.5:
+            cash_at_end -= self.add(
+                Absorption(
+                    report=report,
+                    signup=(orgas or selected)[0],
+                    amount=int(cash_at_end - 200) // 50 * 50,
+                    method=self.random.choice(
+                        [PaymentMethods.BANK_TRANSFER, PaymentMethods.TWINT]
+                    ),
+                )
+            ).amount
+        if not in_progress:
+            report.cash_at_end = self.cash = cash_at_end
+
+    def generate_runs(self, report, selected):
+        kinds = [
+            Run.Kind.FLIGHT,
+            Run.Kind.FLIGHT_WITH_LIFT,
+            Run.Kind.FLIGHT_WITH_POSTBUS,
+            Run.Kind.BREAK,
+        ]
+        start = timezone.make_aware(datetime.combine(report.training.date, time(9)))
+        # Unsaved instances are not hashable, thus the runs are keyed by id
+        runs = {id(signup): [] for signup in selected}
+        for i in range(self.random.randint(3, 7)):
+            services = {id(self.random.choice(selected)): Run.Kind.BUS}
+            if self.random.random() < 0.3:
+                services[id(self.random.choice(selected))] = Run.Kind.BOAT
+            for signup in selected:
+                kind = (
+                    services.get(id(signup))
+                    or self.random.choices(kinds, weights=[70, 10, 5, 15])[0]
+                )
+                runs[id(signup)].append(
+                    self.add(
+                        Run(
+                            signup=signup,
+                            report=report,
+                            kind=kind,
+                            created_on=start + timedelta(minutes=50 * i),
+                        )
+                    )
+                )
+        return runs
+
+    def generate_bill(self, report, signup, runs, is_training_orga):
+        """Like Bill.to_pay, returns the cash revenue"""
+        pilot = signup.pilot
+        purchases = []
+        if pilot.is_member and pilot.prepaid_flights < 3 and self.random.random() < 0.3:
+            purchases.append(Purchase.Items.PREPAID_FLIGHTS)
+            pilot.prepaid_flights += 10
+        if self.random.random() < 0.03:
+            purchases.append(Purchase.Items.REARMING_KIT)
+        if self.random.random() < 0.02:
+            purchases.append(Purchase.Items.LIFEJACKET)
+        price = 0
+        for item in purchases:
+            description, item_price = item.label.split(", Fr. ")
+            price += int(item_price)
+            self.add(
+                Purchase(
+                    signup=signup,
+                    report=report,
+                    description=description,
+                    price=int(item_price),
+                )
+            )
+        num_flights = sum(run.is_flight for run in runs)
+        if self.needs_day_pass(signup, num_flights):
+            price += Purchase.DAY_PASS_PRICE
+            self.day_passes[pilot.email].append(signup.training.date)
+            self.add(
+                Purchase(
+                    signup=signup,
+                    report=report,
+                    description=Purchase.DAY_PASS_DESCRIPTION,
+                    price=Purchase.DAY_PASS_PRICE,
+                )
+            )
+
+        num_with_bus = sum(run.with_bus for run in runs)
+        num_with_lift = sum(run.with_lift for run in runs)
+        num_services = sum(run.is_service for run in runs) + is_training_orga
+        flights = num_with_bus + Decimal(num_with_lift) / 2 - num_services
+        prepaid_flights = min(flights, pilot.prepaid_flights)
+        pilot.prepaid_flights -= prepaid_flights
+        pilot.is_new = False
+        # Pilots round up to whole francs
+        amount = ceil((flights - prepaid_flights) * Bill.PRICE_OF_FLIGHT + price)
+        method = self.random.choices(
+            [PaymentMethods.CASH, PaymentMethods.TWINT], weights=[60, 40]
+        )[0]
+        self.add(
+            Bill(
+                signup=signup,
+                report=report,
+                prepaid_flights=prepaid_flights,
+                amount=Decimal(amount),
+                method=method,
+            )
+        )
+        return amount if method == PaymentMethods.CASH else 0
+
+    def needs_day_pass(self, signup, num_flights):
+        """Like Signup.needs_day_pass"""
+        if signup.pilot.is_member or num_flights < 3:
+            return False
+
+        day = signup.training.date
+        day_passes_of_season = [
+            day_pass
+            for day_pass in self.day_passes[signup.pilot.email]
+            if day_pass.year == day.year
+        ]
+        if len(day_passes_of_season) >= 4:
+            return False
+
+        day_passes_of_last_month = [
+            day_pass
+            for day_pass in day_passes_of_season
+            if day - timedelta(days=31) < day_pass
+        ]
+        return len(day_passes_of_last_month) < 2
@@ -0,0 +1,61 @@
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Plan lines reading a whole table, in SQLite's EXPLAIN QUERY PLAN or Postgres' EXPLAIN
+FULL_SCAN = re.compile(r"^\W*(?:SCAN (?:TABLE )?(\w+)\b(?! USING)|Seq Scan on (\w+))")
+# Prefetching lists a parameter per object, which would split the same query
+PARAMETER_LIST = re.compile(r"\(%s(?:, %s)+\)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the slow query log, including rotated files: queries grouped by "
+        "their SQL, sorted by total time, with their views and plan, and the tables "
+        "read in full, which might need an index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=settings.SLOW_QUERY_LOG)
+        parser.add_argument("--top", type=int, default=20)
+
+    def handle(self, *args, **options):
+        log = Path(options["log"])
+        files = sorted(log.parent.glob(f"{log.name}*"), reverse=True)
+        if not files:
+            raise CommandError(f"No slow queries logged in {log}.")
+
+        queries = defaultdict(lambda: {"durations": [], "views": set(), "plan": None})
+        for file in files:
+            for line in file.read_text().splitlines():
+                entry = json.loads(line)
+                query = queries[PARAMETER_LIST.sub("(%s, ...)", entry["sql"])]
+                if entry["ms"] >= max(query["durations"], default=0):
+                    query["plan"] = entry["plan"]
+                query["durations"].append(entry["ms"])
+                query["views"].add(entry["view"] or "-")
+
+        ranking = sorted(queries.items(), key=lambda item: -sum(item[1]["durations"]))
+        scans = defaultdict(int)
+        for sql, query in ranking:
+            for line in query["plan"] or []:
+                if match := FULL_SCAN.match(line):
+                    scans[match.group(1) or match.group(2)] += len(query["durations"])
+
+        for sql, query in ranking[: options["top"]]:
+            durations = query["durations"]
+            self.stdout.write(
+                f"\n{len(durations)}x, total {sum(durations):.0f} ms, "
+                f"max {max(durations):.0f} ms, in {', '.join(sorted(query['views']))}"
+            )
+            self.stdout.write(sql)
+            for line in query["plan"] or ["No plan"]:
+                self.stdout.write(f"  {line}")
+
+        self.stdout.write("\nSlow queries reading whole tables:")
+        for table, count in sorted(scans.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"{count:6}x {table}")
@@ -0,0 +1,58 @@
+"""
+Metrics in Prometheus' text format. Gunicorn sets PROMETHEUS_MULTIPROC_DIR, such that
+each worker writes its values to files there, which are aggregated when scraped.
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST as CONTENT_TYPE,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    "acbeo_request_duration_seconds",
+    "Duration of requests by URL name",
+    ["view", "method"],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+QUERIES = Histogram(
+    "acbeo_request_queries",
+    "Database queries per request by URL name",
+    ["view"],
+    buckets=[0, 1, 2, 5, 10, 20, 50, 100, 200],
+)
+SELECTIONS = Counter(
+    "acbeo_signup_selections",
+    "Recomputations of the selected signups of a training",
+)
+CACHE_REQUESTS = Counter(
+    "acbeo_cache_requests",
+    "Lookups of computed values in the cache by namespace and result, hit or miss",
+    ["namespace", "result"],
+)
+# In multiprocess mode, the worker's pid is added as label
+WORKER = Gauge(
+    "acbeo_worker_start_time_seconds",
+    "Start of the worker process serving the app",
+    ["interface"],
+    multiprocess_mode="liveall",
+)
+WORKER.labels(interface=os.getenv("SERVER_INTERFACE", "wsgi")).set(time.time())
+
+
+def generate():
+    """Metrics of all workers in multiprocess mode, or of this process"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -1,16 +1,541 @@
-from django.http import HttpResponsePermanentRedirect
+import cProfile
+import gzip
+import io
+import json
+import logging
+import pstats
+import random
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from pathlib import Path
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponsePermanentRedirect
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .models import Pilot
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("instrumentation")
+slow_query_logger = logging.getLogger("slow_queries")
+
+
+class HybridMiddleware:
+    """
+    Middleware running synchronously via WSGI and asynchronously via ASGI, such that
+    Django doesn't switch threads between them. Subclasses implement `call` for the
+    former and `__acall__` for the latter, and are marked by sync_and_async_middleware.
+    """
 
-class RedirectToNonWwwMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.call(request)
+
+
+@sync_and_async_middleware
+class RedirectToNonWwwMiddleware(HybridMiddleware):
+    def call(self, request):
         response = self.get_response(request)
+        return self.redirect(request) or response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.redirect(request) or response
+
+    @staticmethod
+    def redirect(request):
         host = request.META.get("HTTP_HOST")
 
         if host and host.startswith("www."):
             non_www = host.replace("www.", "")
             return HttpResponsePermanentRedirect("https://" + non_www + request.path)
 
+
+def compression(enabled):
+    """
+    Force or prevent compressing the responses of a view, e.g. for class-based views
+    @method_decorator(compression(False), name="dispatch")
+    """
+
+    def decorator(view):
+        view.compression = enabled
+        return view
+
+    return decorator
+
+
+@sync_and_async_middleware
+class CompressionMiddleware(HybridMiddleware):
+    """
+    Compress responses of COMPRESSION_CONTENT_TYPES larger than COMPRESSION_MIN_SIZE
+    with brotli or gzip. To prevent BREACH, i.e. guessing secrets from the size of
+    compressed pages reflecting input, pages with a CSRF token are not compressed,
+    unless their view forces it, see `compression`. Tokens are found in forms, or by
+    the flag that the token was used, which CsrfViewMiddleware resets, thus this must
+    come after it. Views decorated with csrf_protect, e.g. the login, reset it earlier.
+    """
+
+    def call(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        view = request.resolver_match.func if request.resolver_match else None
+        enabled = getattr(view, "compression", None)
+        if (
+            enabled is False
+            or response.streaming
+            or response.has_header("Content-Encoding")
+        ):
+            return response
+
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        if enabled is None and (
+            request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            or b"csrfmiddlewaretoken" in response.content
+        ):
+            return response
+
+        encoding = self.encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding == "br":
+            compressed = brotli.compress(response.content, quality=5)
+        elif encoding == "gzip":
+            compressed = gzip.compress(response.content, compresslevel=6, mtime=0)
+        else:
+            return response
+
+        response.content = compressed
+        response["Content-Encoding"] = encoding
+        response["Content-Length"] = str(len(compressed))
+        if response.has_header("ETag"):
+            response["ETag"] = "W/" + response["ETag"].removeprefix("W/")
+        return response
+
+    @staticmethod
+    def encoding(accept_encoding):
+        """Brotli if accepted and installed, otherwise gzip if accepted"""
+        accepted = set()
+        for value in accept_encoding.lower().split(","):
+            name, *parameters = [part.strip() for part in value.split(";")]
+            weights = [part[2:] for part in parameters if part.startswith("q=")]
+            try:
+                if weights and float(weights[0]) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(name)
+        if "br" in accepted and brotli:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Load the logged in pilot from the cache instead of the database. Pilots are cached
+    on their first request and removed on saving, see news/models.py.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: self.get_user(request))
+        request.auser = partial(self.aget_user, request)
+
+    async def __acall__(self, request):
+        # Only sets lazy attributes, thus doesn't need a thread like MiddlewareMixin
+        self.process_request(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def verify(request, pilot, session_hash):
+        """Check the session like auth.get_user, e.g. after changing the password"""
+        return (
+            pilot is not None
+            and session_hash is not None
+            and constant_time_compare(session_hash, pilot.get_session_auth_hash())
+        )
+
+    def get_user(self, request):
+        if not hasattr(request, "_cached_user"):
+            pk = request.session.get(auth.SESSION_KEY)
+            pilot = cache.get(Pilot.cache_key(pk)) if pk else None
+            if not self.verify(
+                request, pilot, request.session.get(auth.HASH_SESSION_KEY)
+            ):
+                pilot = auth.get_user(request)
+                if pilot.is_authenticated:
+                    cache.set(Pilot.cache_key(pilot.pk), pilot, Pilot.CACHE_TIMEOUT)
+            request._cached_user = pilot
+        return request._cached_user
+
+    async def aget_user(self, request):
+        if not hasattr(request, "_acached_user"):
+            pk = await request.session.aget(auth.SESSION_KEY)
+            pilot = await cache.aget(Pilot.cache_key(pk)) if pk else None
+            session_hash = await request.session.aget(auth.HASH_SESSION_KEY)
+            if not self.verify(request, pilot, session_hash):
+                pilot = await auth.aget_user(request)
+                if pilot.is_authenticated:
+                    await cache.aset(
+                        Pilot.cache_key(pilot.pk), pilot, Pilot.CACHE_TIMEOUT
+                    )
+            request._acached_user = pilot
+        return request._acached_user
+
+
+@sync_and_async_middleware
+class ReadYourWritesMiddleware(HybridMiddleware):
+    """
+    After writing, e.g. a POST, users read from the primary database for
+    REPLICA_STICKINESS seconds, as the replica might not have their changes yet.
+    """
+
+    def call(self, request):
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            request.session["read_primary_until"] = (
+                time.time() + settings.REPLICA_STICKINESS
+            )
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            await request.session.aset(
+                "read_primary_until", time.time() + settings.REPLICA_STICKINESS
+            )
+        return response
+
+    @staticmethod
+    def wrote(request, response):
+        return (
+            settings.REPLICA_DATABASE in settings.DATABASES
+            and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+            and response.status_code < 400
+        )
+
+
+# Execute wrappers of the current request. Unlike connection.execute_wrapper(), they
+# also see the queries run in threads by sync_to_async, which passes the context along.
+query_wrappers = ContextVar("query_wrappers", default=())
+
+
+def execute_with_query_wrappers(execute, sql, params, many, context):
+    for wrapper in reversed(query_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_wrappers(connection, **kwargs):
+    # First, as connection.execute_wrapper() removes the last one when exiting
+    if execute_with_query_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_with_query_wrappers)
+
+
+connection_created.connect(install_query_wrappers)
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """Wrap the queries of the current request, on every connection and thread"""
+    for connection in connections.all(initialized_only=True):
+        install_query_wrappers(connection)
+    token = query_wrappers.set((*query_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        query_wrappers.reset(token)
+
+
+@sync_and_async_middleware
+class InstrumentationMiddleware(HybridMiddleware):
+    """
+    Measure database queries, template rendering and total time of each request. Staff
+    gets them in the Server-Timing header, shown by the browser's devtools, every
+    request is logged as JSON, and durations and queries are exported as metrics.
+    Queries slower than SLOW_QUERY_MS are logged with their plan to SLOW_QUERY_LOG.
+    """
+
+    def call(self, request):
+        with self.measure(request):
+            response = self.get_response(request)
+        return self.report(request, response, getattr(request, "user", None))
+
+    async def __acall__(self, request):
+        with self.measure(request):
+            response = await self.get_response(request)
+        user = await request.auser() if hasattr(request, "auser") else None
+        return self.report(request, response, user)
+
+    @contextmanager
+    def measure(self, request):
+        request.timings = timings = {"queries": 0, "db": 0, "render": 0}
+
+        def time_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                result = execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - start
+                timings["queries"] += 1
+                timings["db"] += duration
+            if duration * 1000 >= settings.SLOW_QUERY_MS:
+                self.log_slow_query(
+                    request, context["connection"], sql, params, many, duration
+                )
+            return result
+
+        start = time.perf_counter()
+        with wrap_queries(time_query):
+            yield
+        timings["total"] = time.perf_counter() - start
+
+    def report(self, request, response, user):
+        timings = request.timings
+        view = request.resolver_match.view_name if request.resolver_match else None
+        metrics.REQUEST_DURATION.labels(view=view, method=request.method).observe(
+            timings["total"]
+        )
+        metrics.QUERIES.labels(view=view).observe(timings["queries"])
+
+        if user and user.is_staff:
+            response["Server-Timing"] = (
+                f'db;dur={timings["db"] * 1000:.1f};desc="{timings["queries"]} queries", '
+                f'render;dur={timings["render"] * 1000:.1f}, '
+                f'total;dur={timings["total"] * 1000:.1f}'
+            )
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "queries": timings["queries"],
+                    "db_ms": round(timings["db"] * 1000, 1),
+                    "render_ms": round(timings["render"] * 1000, 1),
+                    "total_ms": round(timings["total"] * 1000, 1),
+                }
+            )
+        )
+        return response
+
+    @staticmethod
+    def log_slow_query(request, connection, sql, params, many, duration):
+        """Log a JSON line with the query, its view and plan, for `slow_queries`"""
+        plan = None
+        if not many and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            # Bypass the execute wrappers to not time or log the plan itself
+            try:
+                with connection.cursor() as cursor:
+                    cursor.cursor.execute(
+                        f"{connection.ops.explain_query_prefix()} {sql}", params
+                    )
+                    plan = [str(row[-1]) for row in cursor.cursor.fetchall()]
+            except DatabaseError as error:
+                plan = [f"No plan: {error}"]
+
+        view = request.resolver_match.view_name if request.resolver_match else None
+        slow_query_logger.info(
+            json.dumps(
+                {
+                    "time": timezone.now().isoformat(),
+                    "view": view,
+                    "path": request.path,
+                    "ms": round(duration * 1000, 1),
+                    "sql": sql,
+                    "params": params,
+                    "plan": plan,
+                },
+                default=str,
+            )
+        )
+
+    def process_template_response(self, request, response):
+        """Time rendering, which happens after this hook"""
+        start = time.perf_counter()
+
+        def stop(response):
+            request.timings["render"] += time.perf_counter() - start
+
+        response.add_post_render_callback(stop)
         return response
+
+
+@sync_and_async_middleware
+class ProfilerMiddleware(HybridMiddleware):
+    """
+    Staff can append `?profile=cprofile` or `?profile=sql` to any URL to get a profile
+    instead of the page. With `PROFILE_SAMPLE_RATE = N`, 1 in N requests is profiled and
+    stored in PROFILE_DIR, if it took at least PROFILE_SLOW_MS. cProfile only sees one
+    thread: via WSGI the ORM & templates, via ASGI the event loop, including the code of
+    concurrent requests, but not the ORM & templates run in threads.
+    """
+
+    max_profiles = 100
+
+    def call(self, request):
+        mode = request.GET.get("profile")
+        if mode in ("cprofile", "sql") and request.user.is_staff:
+            profile = self.profile_calls if mode == "cprofile" else self.profile_queries
+            with profile() as report:
+                self.get_response(request)
+            return report()
+
+        rate = settings.PROFILE_SAMPLE_RATE
+        if rate and random.randrange(rate) == 0:
+            with self.sample(request) as keep:
+                response = self.get_response(request)
+            keep()
+            return response
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        mode = request.GET.get("profile")
+        if mode in ("cprofile", "sql") and (await request.auser()).is_staff:
+            profile = self.profile_calls if mode == "cprofile" else self.profile_queries
+            with profile() as report:
+                await self.get_response(request)
+            return report()
+
+        rate = settings.PROFILE_SAMPLE_RATE
+        if rate and random.randrange(rate) == 0:
+            with self.sample(request) as keep:
+                response = await self.get_response(request)
+            keep()
+            return response
+
+        return await self.get_response(request)
+
+    @contextmanager
+    def profile_calls(self):
+        """cProfile stats sorted by cumulative time"""
+        profiler = cProfile.Profile()
+
+        def report():
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(100)
+            return HttpResponse(stream.getvalue(), content_type="text/plain")
+
+        profiler.enable()
+        try:
+            yield report
+        finally:
+            profiler.disable()
+
+    @contextmanager
+    def profile_queries(self):
+        """Every query with its duration and the stack within the project"""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stack = [
+                    frame
+                    for frame in traceback.extract_stack()[:-1]
+                    if frame.filename.startswith(str(settings.BASE_DIR))
+                    and frame.filename != __file__
+                ]
+                queries.append((sql, params, time.perf_counter() - start, stack))
+
+        def report():
+            total = sum(duration for _, _, duration, _ in queries)
+            lines = [f"{len(queries)} queries in {total * 1000:.1f} ms"]
+            duplicates = Counter((sql, repr(params)) for sql, params, _, _ in queries)
+            lines += ["", "Duplicates, same query with the same parameters:"]
+            lines += [
+                f"{count:4}x {sql}"
+                for (sql, _), count in duplicates.most_common()
+                if count > 1
+            ]
+            similar = Counter(sql for sql, _, _, _ in queries)
+            lines += ["", "Similar, same query with other parameters, e.g. N+1:"]
+            lines += [
+                f"{count:4}x {sql}" for sql, count in similar.most_common() if count > 1
+            ]
+            for i, (sql, params, duration, stack) in enumerate(queries, start=1):
+                lines += [
+                    "",
+                    f"#{i}, {duration * 1000:.2f} ms",
+                    sql,
+                    f"Parameters: {params}",
+                ]
+                lines += [
+                    f"  {Path(frame.filename).relative_to(settings.BASE_DIR)}:"
+                    f"{frame.lineno} in {frame.name}: {frame.line}"
+                    for frame in stack
+                ]
+            return HttpResponse("\n".join(lines), content_type="text/plain")
+
+        with wrap_queries(record):
+            yield report
+
+    @contextmanager
+    def sample(self, request):
+        """Profile the request, and keep the profile if it was slow"""
+        profiler = cProfile.Profile()
+
+        def keep():
+            duration = time.perf_counter() - start
+            if duration * 1000 < settings.PROFILE_SLOW_MS:
+                return
+
+            directory = Path(settings.PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            view = request.resolver_match.url_name if request.resolver_match else None
+            profiler.dump_stats(
+                directory
+                / f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{duration * 1000:.0f}ms.prof"
+            )
+            profiles = sorted(
+                directory.glob("*.prof"), key=lambda path: path.stat().st_mtime
+            )
+            for profile in profiles[: -self.max_profiles]:
+                profile.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield keep
+        finally:
+            profiler.disable()
@@ -1,10 +1,14 @@
 from django.conf import settings
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.dispatch import receiver
 from django.utils.timezone import now
 
+from . import caching
+
 
 class Post(models.Model):
     title = models.CharField(max_length=200)
@@ -52,7 +56,10 @@ def validate_phone(phone):
 
 
 class Pilot(AbstractBaseUser):
-    Role = models.IntegerChoices("Role", "GUEST MEMBER ORGA STAFF")
+    # The qualname allows pickling pilots, e.g. to cache them
+    Role = models.IntegerChoices(
+        "Role", "GUEST MEMBER ORGA STAFF", qualname="Pilot.Role"
+    )
 
     email = models.EmailField(max_length=255, unique=True)
     first_name = models.CharField(max_length=150)
@@ -69,6 +76,7 @@ class Pilot(AbstractBaseUser):
     objects = PilotManager()
 
     USERNAME_FIELD = "email"
+    CACHE_TIMEOUT = 10 * 60  # s, see news.middleware.CachedAuthenticationMiddleware
 
     class Meta:
         ordering = ["first_name", "last_name"]
@@ -86,6 +94,10 @@ class Pilot(AbstractBaseUser):
     def has_module_perms(self, app_label):
         return True
 
+    @staticmethod
+    def cache_key(pk):
+        return f"pilot:{pk}"
+
     def make_member(self):
         self.role = self.Role.MEMBER
         self.save()
@@ -144,3 +156,10 @@ class Pilot(AbstractBaseUser):
     def has_bills(self):
         signups = self.signups.prefetch_related("bill")
         return any(signup.is_paid for signup in signups)
+
+
+@receiver(models.signals.post_save, sender=Pilot)
+@receiver(models.signals.post_delete, sender=Pilot)
+def uncache_pilot(sender, instance, update_fields=None, **kwargs):
+    if not caching.logging_in(update_fields):
+        cache.delete(Pilot.cache_key(instance.pk))
@@ -0,0 +1,70 @@
+import re
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(name, alt, sizes="100vw", loading="lazy", **attributes):
+    """
+    Static photo with its variants, if built, from which browsers pick the smallest
+    sufficient for `sizes`, e.g.
+    {% responsive_image 'news/smile.jpeg' 'Fullstall' sizes='50vw' class='card-img' %}
+    Photos are loaded lazily, except with loading='eager', e.g. above the fold.
+    """
+    image = images.load_manifest().get(name)
+    attributes = format_html_join("", ' {}="{}"', sorted(attributes.items()))
+    if not image:
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            static(name),
+            alt,
+            loading,
+            attributes,
+        )
+
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (
+                mime_type,
+                ", ".join(
+                    f"{static(images.derivative(name, width, extension))} {width}w"
+                    for width in image["widths"]
+                ),
+                sizes,
+            )
+            for extension, (_, mime_type, _) in images.FORMATS.items()
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" width="{}" height="{}" loading="{}" '
+        'decoding="async"{}></picture>',
+        sources,
+        static(name),
+        alt,
+        image["width"],
+        image["height"],
+        loading,
+        attributes,
+    )
+
+
+@register.filter
+def lazy_images(content):
+    """Load images in trusted HTML, e.g. posts, only when scrolled into view"""
+    return mark_safe(
+        re.sub(
+            r"<img(?![^>]*\sloading=)",
+            '<img loading="lazy" decoding="async"',
+            content,
+            flags=re.IGNORECASE,
+        )
+    )
@@ -0,0 +1,25 @@
+"""Helpers shared by the tests of the apps"""
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from trainings.models import Signup, Training
+
+
+class IndexTestMixin:
+    """Check that hot queries use the composite indexes, on SQLite and Postgres"""
+
+    def setUp(self):
+        self.pilot = get_user_model().objects.create(
+            email="pilot@example.com", first_name="Pilot"
+        )
+        self.training = Training.objects.create(date=timezone.now().date())
+        self.signup = Signup.objects.create(pilot=self.pilot, training=self.training)
+        if connection.vendor == "postgresql":
+            # Tables of tests are too small to prefer indexes
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, index, queryset):
+        self.assertIn(index, queryset.explain())
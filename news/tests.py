@@ -1,15 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
 from http import HTTPStatus
-
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
 from django.core import mail
-from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from PIL import Image
+import brotli
 
+from . import caching, images, metrics
 from .models import Pilot, Post
-from .middleware import RedirectToNonWwwMiddleware
+from .management.commands.bench import Command as Bench
+from .middleware import (
+    CachedAuthenticationMiddleware,
+    CompressionMiddleware,
+    InstrumentationMiddleware,
+    ProfilerMiddleware,
+    ReadYourWritesMiddleware,
+    RedirectToNonWwwMiddleware,
+    compression,
+)
 from trainings.models import Signup, Training
-from bookkeeping.models import Purchase, Report
+from bookkeeping.models import Bill, Expense, Purchase, Report, Run
 
 
 class PilotTests(TestCase):
@@ -85,6 +125,686 @@ class RedirectToNonWwwMiddlewareTests(SimpleTestCase):
         self.assertIs(response, self.dummy_response)
 
 
+class CompressionMiddlewareTests(TestCase):
+    def setUp(self):
+        author = Pilot.objects.create(email="author@example.com", first_name="Author")
+        Post.objects.create(
+            title="News", slug="news", author=author, content="Training! " * 500
+        )
+
+    def test_compress_html(self):
+        uncompressed = self.client.get(reverse("home"))
+        self.assertFalse(uncompressed.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", uncompressed["Vary"])
+
+        for encoding, decompress in [
+            ("br", brotli.decompress),
+            ("gzip", gzip.decompress),
+        ]:
+            with self.subTest(encoding=encoding):
+                response = self.client.get(
+                    reverse("home"), headers={"accept-encoding": f"{encoding}, deflate"}
+                )
+                self.assertEqual(encoding, response["Content-Encoding"])
+                self.assertEqual(str(len(response.content)), response["Content-Length"])
+                self.assertLess(len(response.content), len(uncompressed.content) / 5)
+                self.assertEqual(uncompressed.content, decompress(response.content))
+
+    def test_pages_with_csrf_tokens_not_compressed(self):
+        for name in ["contact", "login"]:
+            with self.subTest(view=name):
+                response = self.client.get(
+                    reverse(name), headers={"accept-encoding": "br, gzip"}
+                )
+                self.assertContains(response, "csrfmiddlewaretoken")
+                self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_content_types_and_sizes(self):
+        request = RequestFactory().get("/", headers={"accept-encoding": "gzip"})
+        content = "x" * 2000
+        responses = {
+            "html": (HttpResponse(content), True),
+            "json": (JsonResponse({"x": content}), True),
+            "text": (HttpResponse(content, content_type="text/plain"), False),
+            "small": (HttpResponse("x" * 100), False),
+            "streaming": (StreamingHttpResponse(iter([content])), False),
+        }
+        for kind, (response, compressed) in responses.items():
+            with self.subTest(kind=kind):
+                middleware = CompressionMiddleware(lambda request: response)
+                response = middleware(request)
+                self.assertEqual(compressed, response.has_header("Content-Encoding"))
+
+    async def test_compress_via_asgi(self):
+        response = await self.async_client.get(
+            reverse("home"), headers={"accept-encoding": "gzip"}
+        )
+        self.assertEqual("gzip", response["Content-Encoding"])
+
+    def test_per_view(self):
+        request = RequestFactory().get("/", headers={"accept-encoding": "gzip"})
+        content = '<input name="csrfmiddlewaretoken">' + "x" * 2000
+        for enabled, compressed in [(True, True), (False, False), (None, False)]:
+            with self.subTest(enabled=enabled):
+                request.resolver_match = mock.Mock(
+                    func=compression(enabled)(lambda request: None)
+                )
+                middleware = CompressionMiddleware(
+                    lambda request: HttpResponse(content)
+                )
+                response = middleware(request)
+                self.assertEqual(compressed, response.has_header("Content-Encoding"))
+
+    def test_accepted_encoding(self):
+        for accept_encoding, encoding in [
+            ("gzip, deflate, br", "br"),
+            ("br;q=0, gzip;q=0.5", "gzip"),
+            ("BR; q=0.8", "br"),
+            ("gzip;q=0", None),
+            ("identity", None),
+            ("", None),
+        ]:
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(
+                    encoding, CompressionMiddleware.encoding(accept_encoding)
+                )
+
+
+class HybridMiddlewareTests(SimpleTestCase):
+    def test_sync_and_async(self):
+        async def aget_response(request):
+            return HttpResponse()
+
+        for middleware in [
+            RedirectToNonWwwMiddleware,
+            CompressionMiddleware,
+            CachedAuthenticationMiddleware,
+            ReadYourWritesMiddleware,
+            InstrumentationMiddleware,
+            ProfilerMiddleware,
+        ]:
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(middleware.sync_capable and middleware.async_capable)
+                self.assertFalse(iscoroutinefunction(middleware(lambda r: None)))
+                self.assertTrue(iscoroutinefunction(middleware(aget_response)))
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    def setUp(self):
+        self.staff = Pilot.objects.create(
+            email="staff@example.com", first_name="Staff", role=Pilot.Role.STAFF
+        )
+        Post.objects.create(
+            title="Post", slug="post", author=self.staff, content="Content"
+        )
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        metrics = [
+            metric.split(";")[0] for metric in response["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(["db", "render", "total"], metrics)
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+
+    async def test_server_timing_via_asgi(self):
+        # Queries run in threads by sync_to_async are counted too
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("home"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+    def test_no_server_timing_for_others(self):
+        for role in [Pilot.Role.GUEST, Pilot.Role.MEMBER, Pilot.Role.ORGA]:
+            with self.subTest(role=role):
+                pilot = Pilot.objects.create(email=f"{role}@example.com", role=role)
+                self.client.force_login(pilot)
+                response = self.client.get(reverse("home"))
+                self.assertNotIn("Server-Timing", response)
+
+        self.client.logout()
+        response = self.client.get(reverse("home"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_logs_json(self):
+        with self.assertLogs("instrumentation", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("post", kwargs={"slug": "post"}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(1, len(logs.records))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual("GET", line["method"])
+        self.assertEqual("/post/", line["path"])
+        self.assertEqual(200, line["status"])
+        self.assertEqual(len(queries), line["queries"])
+        self.assertGreater(line["render_ms"], 0)
+        self.assertGreaterEqual(line["total_ms"], line["render_ms"])
+
+
+class ProfilerMiddlewareTests(TestCase):
+    def setUp(self):
+        self.staff = Pilot.objects.create(
+            email="staff@example.com", first_name="Staff", role=Pilot.Role.STAFF
+        )
+        Post.objects.create(
+            title="Post", slug="post", author=self.staff, content="Content"
+        )
+
+    def test_cprofile_for_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("home"), {"profile": "cprofile"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual("text/plain", response["Content-Type"])
+        self.assertContains(response, "Ordered by: cumulative time")
+        self.assertContains(response, "django/template/response.py")
+
+    def test_sql_for_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("home"), {"profile": "sql"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual("text/plain", response["Content-Type"])
+        content = response.content.decode()
+        self.assertRegex(content, r"^\d+ queries in \d+\.\d ms")
+        self.assertIn("Duplicates", content)
+        self.assertIn("Similar", content)
+        self.assertIn("news_post", content)
+        self.assertIn("trainings/templatetags/training_extras.py:", content)
+
+    async def test_sql_via_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("home"), {"profile": "sql"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn("news_post", response.content.decode())
+
+    def test_no_profile_for_others(self):
+        for role in [Pilot.Role.GUEST, Pilot.Role.MEMBER, Pilot.Role.ORGA]:
+            with self.subTest(role=role):
+                pilot = Pilot.objects.create(email=f"{role}@example.com", role=role)
+                self.client.force_login(pilot)
+                for mode in ["cprofile", "sql"]:
+                    response = self.client.get(reverse("home"), {"profile": mode})
+                    self.assertTemplateUsed(response, "news/post_list.html")
+
+        self.client.logout()
+        response = self.client.get(reverse("home"), {"profile": "sql"})
+        self.assertTemplateUsed(response, "news/post_list.html")
+
+    def test_samples_slow_requests(self):
+        with TemporaryDirectory() as directory:
+            with override_settings(
+                PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=0, PROFILE_DIR=directory
+            ):
+                response = self.client.get(reverse("home"))
+            self.assertTemplateUsed(response, "news/post_list.html")
+            profiles = os.listdir(directory)
+            self.assertEqual(1, len(profiles))
+            self.assertRegex(profiles[0], r"^\d{8}-\d{6}-home-\d+ms\.prof$")
+
+            with override_settings(
+                PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=60_000, PROFILE_DIR=directory
+            ):
+                self.client.get(reverse("home"))
+            self.assertEqual(1, len(os.listdir(directory)))
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        self.staff = Pilot.objects.create(
+            email="staff@example.com", first_name="Staff", role=Pilot.Role.STAFF
+        )
+        Post.objects.create(
+            title="Post", slug="post", author=self.staff, content="Content"
+        )
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_logs_slow_queries_with_plan(self):
+        with self.assertLogs("slow_queries", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("post", kwargs={"slug": "post"}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(queries), len(logs.records))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual("post", line["view"])
+        self.assertEqual("/post/", line["path"])
+        self.assertIn("news_post", line["sql"])
+        self.assertEqual(["post"], line["params"])
+        self.assertIn("news_post", "\n".join(line["plan"]))
+
+    def test_fast_queries_are_not_logged(self):
+        with self.assertNoLogs("slow_queries"):
+            self.client.get(reverse("post", kwargs={"slug": "post"}))
+
+    def test_report(self):
+        entries = [
+            {
+                "view": "reports",
+                "ms": 150,
+                "sql": "SELECT * FROM run WHERE signup_id IN (%s, %s)",
+                "plan": ["SCAN run"],
+            },
+            {
+                "view": "balance",
+                "ms": 250,
+                "sql": "SELECT * FROM run WHERE signup_id IN (%s, %s, %s)",
+                "plan": ["SCAN run"],
+            },
+            {
+                "view": None,
+                "ms": 300,
+                "sql": "SELECT * FROM signup WHERE training_id = %s",
+                "plan": [
+                    "SEARCH signup USING INDEX signup_training_id (training_id=?)"
+                ],
+            },
+        ]
+        with TemporaryDirectory() as directory:
+            log = os.path.join(directory, "slow-queries.log")
+            with open(log, "w") as file:
+                file.write(json.dumps(entries[0]) + "\n")
+            with open(log + ".1", "w") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in entries[1:])
+            out = StringIO()
+            call_command("slow_queries", log=log, stdout=out)
+
+        report = out.getvalue().splitlines()
+        self.assertEqual("2x, total 400 ms, max 250 ms, in balance, reports", report[1])
+        self.assertEqual("SELECT * FROM run WHERE signup_id IN (%s, ...)", report[2])
+        self.assertEqual("  SCAN run", report[3])
+        self.assertEqual("1x, total 300 ms, max 300 ms, in -", report[5])
+        self.assertEqual(
+            ["Slow queries reading whole tables:", "     2x run"], report[-2:]
+        )
+
+    def test_report_without_log(self):
+        with TemporaryDirectory() as directory:
+            with self.assertRaises(CommandError):
+                call_command("slow_queries", log=os.path.join(directory, "missing.log"))
+
+
+class CachedAuthenticationMiddlewareTests(TestCase):
+    def setUp(self):
+        self.pilot = Pilot.objects.create(
+            email="pilot@example.com", first_name="Pilot", phone="+41 79 123 45 67"
+        )
+        self.pilot.set_password("password")
+        self.pilot.save()
+        self.client.force_login(self.pilot)
+
+    def test_pilot_loaded_from_cache(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse("update_pilot"))
+        self.assertIsNotNone(cache.get(Pilot.cache_key(self.pilot.pk)))
+
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(reverse("update_pilot"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context["user"], self.pilot)
+        self.assertEqual(len(first) - 1, len(second))
+
+    def test_saving_pilot_clears_cache(self):
+        self.client.get(reverse("update_pilot"))
+        self.pilot.first_name = "Renamed"
+        self.pilot.save()
+        self.assertIsNone(cache.get(Pilot.cache_key(self.pilot.pk)))
+
+        response = self.client.get(reverse("update_pilot"))
+        self.assertContains(response, "Renamed")
+
+    def test_changing_password_logs_out(self):
+        self.client.get(reverse("update_pilot"))
+        self.pilot.set_password("changed")
+        self.pilot.save()
+
+        response = self.client.get(reverse("update_pilot"))
+        self.assertRedirects(
+            response, f"{reverse('login')}?next={reverse('update_pilot')}"
+        )
+
+    def test_stale_cache_ignored_after_password_change(self):
+        self.client.get(reverse("update_pilot"))
+        stale = cache.get(Pilot.cache_key(self.pilot.pk))
+        stale.set_password("changed")
+        cache.set(Pilot.cache_key(self.pilot.pk), stale)
+
+        response = self.client.get(reverse("update_pilot"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        cached = cache.get(Pilot.cache_key(self.pilot.pk))
+        self.assertEqual(self.pilot.password, cached.password)
+
+
+class CachingTests(SimpleTestCase):
+    """Against local stand-ins for the shared cache, e.g. Redis in production"""
+
+    def backends(self):
+        with TemporaryDirectory() as directory:
+            for backend, location in [
+                ("django.core.cache.backends.locmem.LocMemCache", "caching-tests"),
+                ("django.core.cache.backends.filebased.FileBasedCache", directory),
+            ]:
+                with self.subTest(backend=backend), override_settings(
+                    CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+                ):
+                    cache.clear()
+                    yield
+
+    def test_versioned_key_changes_with_models(self):
+        for _ in self.backends():
+            key = caching.versioned_key("balance", 2024, models=[Post, Pilot])
+            self.assertTrue(key.startswith("balance:2024:post"))
+            self.assertEqual(
+                key, caching.versioned_key("balance", 2024, models=[Post, Pilot])
+            )
+
+            caching.invalidate(Pilot)
+            self.assertNotEqual(
+                key, caching.versioned_key("balance", 2024, models=[Post, Pilot])
+            )
+
+    def test_get_or_compute(self):
+        hits = metrics.CACHE_REQUESTS.labels(namespace="test", result="hit")
+        misses = metrics.CACHE_REQUESTS.labels(namespace="test", result="miss")
+        for _ in self.backends():
+            compute = mock.Mock(return_value=42)
+            before = hits._value.get(), misses._value.get()
+            self.assertEqual(42, caching.get_or_compute("test:key", compute))
+            self.assertEqual(42, caching.get_or_compute("test:key", compute))
+            compute.assert_called_once()
+            self.assertEqual(
+                (before[0] + 1, before[1] + 1), (hits._value.get(), misses._value.get())
+            )
+            self.assertFalse(caching.is_locked("test:key"))
+
+    def test_concurrent_requests_compute_once(self):
+        def compute():
+            time.sleep(0.2)
+            return 42
+
+        for _ in self.backends():
+            compute_once = mock.Mock(side_effect=compute)
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                values = list(
+                    executor.map(
+                        lambda _: caching.get_or_compute("test:key", compute_once),
+                        range(5),
+                    )
+                )
+            self.assertEqual([42] * 5, values)
+            compute_once.assert_called_once()
+
+    def test_lock_atomic_in_files(self):
+        # FileBasedCache.add() checks and sets in two steps, which workers can interleave
+        with TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                }
+            }
+        ), mock.patch.object(FileBasedCache, "add", return_value=True):
+            self.assertTrue(caching.acquire_lock("test:key", "first"))
+            self.assertFalse(caching.acquire_lock("test:key", "second"))
+            caching.release_lock("test:key", "second")
+            self.assertTrue(caching.is_locked("test:key"))
+            caching.release_lock("test:key", "first")
+            self.assertFalse(caching.is_locked("test:key"))
+
+    def test_computed_again_if_lock_expired(self):
+        for _ in self.backends():
+            with mock.patch.object(caching, "LOCK_TIMEOUT", 0.1):
+                self.assertTrue(caching.acquire_lock("test:key", "other worker"))
+                self.assertEqual(42, caching.get_or_compute("test:key", lambda: 42))
+
+    def test_computed_after_waiting_briefly(self):
+        for _ in self.backends():
+            with mock.patch.object(caching, "LOCK_WAIT", 0.1):
+                self.assertTrue(caching.acquire_lock("test:key", "other worker"))
+                start = time.monotonic()
+                self.assertEqual(42, caching.get_or_compute("test:key", lambda: 42))
+                self.assertLess(time.monotonic() - start, 1)
+                self.assertTrue(caching.is_locked("test:key"))
+
+
+class ClearSessionsTests(TestCase):
+    def test_only_expired_sessions_deleted(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(
+                session_key=f"expired{i}", session_data="", expire_date=now
+            )
+        Session.objects.create(
+            session_key="valid", session_data="", expire_date=now + timedelta(days=1)
+        )
+
+        out = StringIO()
+        call_command("clear_sessions", batch_size=2, pause=0, stdout=out)
+        self.assertIn("Deleted 5 expired sessions.", out.getvalue())
+        self.assertEqual(["valid"], [s.session_key for s in Session.objects.all()])
+
+
+class StaticFilesTests(SimpleTestCase):
+    # As in production, while other tests use plain storage, see acbeo/test_runner.py
+    storages = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        },
+    }
+
+    def test_hashed_files_compressed_and_immutable(self):
+        with TemporaryDirectory() as directory, override_settings(
+            STATIC_ROOT=directory,
+            STORAGES=self.storages,
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            url = staticfiles_storage.url("news/custom.css")
+            self.assertRegex(url, r"^/static/news/custom\.[0-9a-f]{12}\.css$")
+
+            client = Client()  # WhiteNoise finds files when loading the middleware
+            for encoding in ["br", "gzip"]:
+                with self.subTest(encoding=encoding):
+                    response = client.get(url, headers={"accept-encoding": encoding})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertEqual(encoding, response.headers["Content-Encoding"])
+                    self.assertIn("immutable", response.headers["Cache-Control"])
+                    self.assertIn(
+                        "max-age=315360000", response.headers["Cache-Control"]
+                    )
+
+            response = client.get("/static/news/custom.css")
+            self.assertNotIn("immutable", response.headers["Cache-Control"])
+
+            # Templates linking missing files fail to render, e.g. after renaming one
+            for name in ["contact", "login"]:
+                with self.subTest(view=name):
+                    response = client.get(reverse(name))
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertContains(response, url)
+
+    def test_missing_reference_fails_collectstatic(self):
+        with TemporaryDirectory() as static, TemporaryDirectory() as root:
+            with open(os.path.join(static, "broken.css"), "w") as file:
+                file.write("body { background: url('missing.png'); }")
+            with override_settings(
+                STATIC_ROOT=root,
+                STATICFILES_DIRS=[static],
+                STATICFILES_FINDERS=[
+                    "django.contrib.staticfiles.finders.FileSystemFinder"
+                ],
+                STORAGES=self.storages,
+            ), self.assertRaisesRegex(ValueError, "missing.png"):
+                call_command("collectstatic", interactive=False, verbosity=0)
+
+
+class ResponsiveImageTests(SimpleTestCase):
+    def test_build_variants(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            manifest = images.build(
+                ["news/smile.jpeg"], directory=directory, widths=[320, 640, 2048]
+            )
+            self.assertEqual(
+                {
+                    "news/smile.jpeg": {
+                        "width": 1024,
+                        "height": 572,
+                        "widths": [320, 640, 1024],
+                    }
+                },
+                manifest,
+            )
+            self.assertEqual(manifest, images.load_manifest(directory))
+            original = settings.BASE_DIR / "news/static/news/smile.jpeg"
+            for width in [320, 640, 1024]:
+                for extension in images.FORMATS:
+                    variant = directory / images.filename(
+                        "news/smile.jpeg", width, extension
+                    )
+                    with Image.open(variant) as image:
+                        self.assertEqual(width, image.width)
+                    self.assertLess(variant.stat().st_size, original.stat().st_size)
+
+            # Up to date variants are kept
+            variant = directory / images.filename("news/smile.jpeg", 320, "avif")
+            modified = variant.stat().st_mtime_ns
+            images.build(["news/smile.jpeg"], directory=directory, widths=[320])
+            self.assertEqual(modified, variant.stat().st_mtime_ns)
+
+    def test_srcset(self):
+        manifest = {
+            "news/smile.jpeg": {"width": 1024, "height": 572, "widths": [320, 1024]}
+        }
+        template = Template(
+            "{% load news_extras %}{% responsive_image 'news/smile.jpeg' 'Fullstall' "
+            "sizes='50vw' class='card-img-top' %}"
+        )
+        with mock.patch.object(images, "load_manifest", return_value=manifest):
+            html = template.render(Context())
+        self.assertInHTML(
+            '<source type="image/avif" sizes="50vw" srcset="'
+            "/static/news/derivatives/news/smile-320.avif 320w, "
+            '/static/news/derivatives/news/smile-1024.avif 1024w">',
+            html,
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertLess(html.index("image/avif"), html.index("image/webp"))
+        self.assertInHTML(
+            '<img src="/static/news/smile.jpeg" alt="Fullstall" width="1024" '
+            'height="572" loading="lazy" decoding="async" class="card-img-top">',
+            html,
+        )
+
+        with mock.patch.object(images, "load_manifest", return_value={}):
+            html = template.render(Context())
+        self.assertHTMLEqual(
+            '<img src="/static/news/smile.jpeg" alt="Fullstall" loading="lazy" '
+            'decoding="async" class="card-img-top">',
+            html,
+        )
+
+    def test_eager_image(self):
+        template = Template(
+            "{% load news_extras %}{% responsive_image 'news/smile.jpeg' 'Fullstall' "
+            "loading='eager' fetchpriority='high' %}"
+        )
+        with mock.patch.object(images, "load_manifest", return_value={}):
+            html = template.render(Context())
+        self.assertHTMLEqual(
+            '<img src="/static/news/smile.jpeg" alt="Fullstall" loading="eager" '
+            'decoding="async" fetchpriority="high">',
+            html,
+        )
+
+    def test_first_sidebar_image_loaded_eagerly(self):
+        response = self.client.get(reverse("contact"))
+        html = response.content.decode()
+        self.assertLess(html.index('loading="eager"'), html.index("news/synchro"))
+        self.assertEqual(1, html.count('loading="eager"'))
+
+    def test_lazy_images_in_posts(self):
+        template = Template("{% load news_extras %}{{ content | safe | lazy_images }}")
+        html = template.render(
+            Context({"content": '<img src="a.jpg"><img loading="eager" src="b.jpg">'})
+        )
+        self.assertHTMLEqual(
+            '<img loading="lazy" decoding="async" src="a.jpg">'
+            '<img loading="eager" src="b.jpg">',
+            html,
+        )
+
+
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        self.staff = Pilot.objects.create(
+            email="staff@example.com", first_name="Staff", role=Pilot.Role.STAFF
+        )
+
+    def test_only_staff_or_with_token(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+        for role in [Pilot.Role.GUEST, Pilot.Role.MEMBER, Pilot.Role.ORGA]:
+            with self.subTest(role=role):
+                pilot = Pilot.objects.create(email=f"{role}@example.com", role=role)
+                self.client.force_login(pilot)
+                response = self.client.get(reverse("metrics"))
+                self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+        self.client.logout()
+        with self.settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), headers={"Authorization": "Bearer wrong"}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+            response = self.client.get(
+                reverse("metrics"), headers={"Authorization": "Bearer secret"}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        with self.settings(METRICS_TOKEN=None):
+            response = self.client.get(
+                reverse("metrics"), headers={"Authorization": "Bearer None"}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_metrics(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn(
+            'acbeo_request_duration_seconds_count{method="GET",view="home"}', content
+        )
+        self.assertIn('acbeo_request_queries_bucket{le="0.0",view="home"}', content)
+        self.assertIn("acbeo_signup_selections_total", content)
+        self.assertIn("acbeo_worker_start_time_seconds{interface=", content)
+
+    def test_aggregates_workers(self):
+        with TemporaryDirectory() as directory:
+            env = os.environ | {"PROMETHEUS_MULTIPROC_DIR": directory}
+            for _ in range(2):
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        "from news import metrics; metrics.SELECTIONS.inc(3)",
+                    ],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    check=True,
+                )
+
+            self.client.force_login(self.staff)
+            with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+                response = self.client.get(reverse("metrics"))
+        content = response.content.decode()
+        self.assertIn("acbeo_signup_selections_total 6.0", content)
+        self.assertEqual(2, content.count("acbeo_worker_start_time_seconds{"))
+
+
 class PostListViewTests(TestCase):
     def setUp(self):
         author = Pilot.objects.create(email="author@example.com", first_name="Author")
@@ -467,7 +1187,7 @@ class MembershipFormViewTests(TestCase):
                 pilot=self.guest, training=training, signed_up_on=timezone.now()
             )
             Purchase.save_day_pass(signup, report)
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(6):
             response = self.client.post(
                 reverse("membership"), data=self.membership_data, follow=True
             )
@@ -514,6 +1234,7 @@ class PilotAdminTests(TestCase):
         )
 
     def test_make_member(self):
+        version = cache.get(caching.version_key(Pilot))
         response = self.client.post(
             reverse("admin:news_pilot_changelist"),
             data={
@@ -526,8 +1247,10 @@ class PilotAdminTests(TestCase):
 
         self.pilot.refresh_from_db()
         self.assertTrue(self.pilot.is_member)
+        self.assertNotEqual(version, cache.get(caching.version_key(Pilot)))
 
     def test_make_orga(self):
+        version = cache.get(caching.version_key(Pilot))
         response = self.client.post(
             reverse("admin:news_pilot_changelist"),
             data={
@@ -540,3 +1263,165 @@ class PilotAdminTests(TestCase):
 
         self.pilot.refresh_from_db()
         self.assertTrue(self.pilot.is_orga)
+        self.assertNotEqual(version, cache.get(caching.version_key(Pilot)))
+
+
+@skipUnless(connection.vendor == "sqlite", "Tunes SQLite")
+class SQLiteTuningTests(TestCase):
+    def test_pragmas(self):
+        with TemporaryDirectory() as directory:
+            wrapper = connections["default"].__class__(
+                {**connection.settings_dict, "NAME": os.path.join(directory, "db")}
+            )
+            with wrapper.cursor() as cursor:
+                for pragma, expected in [
+                    ("journal_mode", "wal"),
+                    ("synchronous", 1),
+                    ("mmap_size", 128 * 1024 * 1024),
+                    ("cache_size", -32 * 1024),
+                    ("busy_timeout", 5000),
+                    ("temp_store", 2),
+                ]:
+                    with self.subTest(pragma=pragma):
+                        cursor.execute(f"PRAGMA {pragma}")
+                        self.assertEqual(expected, cursor.fetchone()[0])
+            wrapper.close()
+
+    def test_optimize_sqlite(self):
+        out = StringIO()
+        call_command("optimize_sqlite", stdout=out)
+        self.assertIn("Optimized", out.getvalue())
+
+    def test_benchmark_sqlite(self):
+        out = StringIO()
+        call_command(
+            "benchmark_sqlite",
+            readers=1,
+            writers=1,
+            duration=0.1,
+            trainings=2,
+            stdout=out,
+        )
+        report = out.getvalue().splitlines()
+        self.assertEqual(
+            ["profile", "default", "tuned"], [r.split()[0] for r in report]
+        )
+
+    def test_benchmark_connections_needs_postgres(self):
+        with self.assertRaisesMessage(CommandError, "Postgres"):
+            call_command("benchmark_connections")
+
+
+class SeedSyntheticTests(TestCase):
+    def seed(self, **options):
+        call_command(
+            "seed_synthetic", seasons=2, pilots=12, stdout=StringIO(), **options
+        )
+
+    def test_all_choices_are_generated(self):
+        self.seed()
+        self.assertEqual(
+            set(Pilot.Role.values), {pilot.role for pilot in Pilot.objects.all()}
+        )
+        self.assertEqual(
+            set(Signup.Status.values),
+            set(Signup.objects.values_list("status", flat=True)),
+        )
+        self.assertEqual(
+            set(Run.Kind.values), set(Run.objects.values_list("kind", flat=True))
+        )
+        for model in [Report, Bill, Purchase, Expense]:
+            with self.subTest(model=model):
+                self.assertTrue(model.objects.exists())
+
+    def test_invariants(self):
+        self.seed()
+        bills = Bill.objects.select_related(
+            "signup__pilot", "signup__training__report"
+        ).prefetch_related("signup__runs", "signup__purchases")
+        for bill in bills:
+            self.assertLessEqual(bill.to_pay, bill.amount)
+        self.assertFalse(Pilot.objects.filter(prepaid_flights__lt=0).exists())
+        reports = Report.objects.prefetch_related("bills", "expenses", "absorptions")
+        self.assertEqual({0}, {report.difference for report in reports})
+        signups = Signup.objects.filter(bill__isnull=False).prefetch_related("runs")
+        for signup in signups:
+            self.assertFalse(signup.needs_day_pass)
+
+    def test_deterministic_given_seed(self):
+        def dump():
+            return list(
+                Signup.objects.order_by("training__date", "pilot__email").values_list(
+                    "pilot__email", "pilot__first_name", "training__date", "status"
+                )
+            ) + list(Bill.objects.order_by("pk").values_list("amount", "method"))
+
+        self.seed(seed=42)
+        first_dump = dump()
+        Pilot.objects.all().delete()
+        Training.objects.all().delete()
+        self.seed(seed=42)
+        self.assertEqual(first_dump, dump())
+
+        with self.assertRaises(CommandError):
+            self.seed(seed=42)
+
+    def test_cached_values_invalidated(self):
+        # Bulk creating sends no signals, see news/caching.py
+        models = [Bill, Report]
+        key = caching.versioned_key("balance", models=models)
+        self.seed()
+        self.assertNotEqual(key, caching.versioned_key("balance", models=models))
+
+    def test_training_in_progress_today(self):
+        self.seed(today=True)
+        report = Report.objects.get(training__date=timezone.now().date())
+        self.assertIsNone(report.cash_at_end)
+        self.assertTrue(report.runs.exists())
+        selected = report.training.signups.filter(status=Signup.Status.SELECTED)
+        self.assertLess(report.bills.count(), selected.count())
+
+
+class BenchTests(SimpleTestCase):
+    def setUp(self):
+        self.command = Bench(stdout=StringIO())
+        self.baseline = {
+            "results": {
+                "1": {
+                    "berichte/": {"queries": 16, "p50_ms": 100},
+                    "kontakt/": {"queries": 0, "p50_ms": 2},
+                    "abmelden/": {"skipped": "only POST"},
+                }
+            }
+        }
+
+    def test_no_regressions(self):
+        results = {
+            "results": {
+                "1": {
+                    "berichte/": {"queries": 15, "p50_ms": 120},
+                    "kontakt/": {"queries": 0, "p50_ms": 2.9},
+                    "abmelden/": {"skipped": "only POST"},
+                    "neu/": {"queries": 50, "p50_ms": 500},
+                },
+                "2": {"berichte/": {"queries": 30, "p50_ms": 200}},
+            }
+        }
+        self.command.compare(self.baseline, results, threshold=0.25)
+        self.assertIn("No regressions", self.command.stdout._out.getvalue())
+
+    def test_more_queries_and_slower_views_are_regressions(self):
+        results = {
+            "results": {
+                "1": {
+                    "berichte/": {"queries": 17, "p50_ms": 126},
+                    "kontakt/": {"queries": 0, "p50_ms": 3.1},
+                }
+            }
+        }
+        with self.assertRaises(CommandError) as context:
+            self.command.compare(self.baseline, results, threshold=0.25)
+        message = str(context.exception)
+        self.assertIn("berichte/ (1 seasons): 16 -> 17 queries", message)
+        self.assertIn("berichte/ (1 seasons): p50 100 -> 126 ms", message)
+        self.assertIn("kontakt/ (1 seasons): p50 2 -> 3.1 ms", message)
@@ -0,0 +1,250 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .management.commands.bench import ROLES, SKIPPED, Command as Bench, content
+from .models import Pilot, Post
+from bookkeeping.models import (
+    Absorption,
+    Bill,
+    Expense,
+    PaymentMethods,
+    Purchase,
+    Report,
+    Run,
+)
+from trainings.models import Signup, Training
+
+TODAY = timezone.now().date()
+
+# Queries per view with a cold and a warm cache, which must not depend on the amount of
+# data. Adding a query to a view thus needs a change here. With a cold cache, sessions,
+# pilots, and cached computations like the balance are read from the database.
+QUERY_BUDGETS = {
+    "": (2, 2),
+    "kontakt/": (0, 0),
+    "registrieren/": (0, 0),
+    "mitglied-werden/": (0, 0),
+    "anmelden/": (0, 0),
+    "konto-bearbeiten/": (2, 0),
+    "passwort-zuruecksetzen/": (0, 0),
+    "metrics": (2, 0),
+    "<slug:slug>/": (2, 2),
+    "trainings/": (9, 7),
+    "trainings/status/": (9, 7),
+    "trainings/infos/": (0, 0),
+    "trainings/erstellen/": (3, 1),
+    "trainings/<date:date>/ansagen/": (4, 2),
+    "trainings/<date:date>/seepolizeimail/": (13, 11),
+    "trainings/meine-trainings/": (7, 5),
+    "trainings/einschreiben/": (2, 0),
+    "trainings/<date:date>/einschreiben/": (2, 0),
+    "trainings/mehrfach-einschreiben/": (2, 0),
+    "trainings/<date:date>/bearbeiten/": (6, 4),
+    "berichte/": (13, 10),
+    "berichte/<int:year>/": (13, 10),
+    "berichte/bilanz/": (13, 1),
+    "berichte/bilanz/<int:year>/": (13, 1),
+    "berichte/bilanz/<int:year>/journal/": (12, 0),
+    "berichte/pilotinnen/": (8, 5),
+    "berichte/pilotinnen/<int:year>/": (8, 5),
+    "berichte/export/<int:year>/<slug:kind>/": (3, 1),
+    "berichte/erstellen/": (4, 2),
+    "berichte/<date:date>/": (17, 15),
+    "berichte/<date:date>/ausgabe-erfassen/": (5, 3),
+    "berichte/<date:date>/ausgabe-bearbeiten/<int:pk>/": (4, 2),
+    "berichte/<date:date>/abschoepfen/": (7, 5),
+    "berichte/<date:date>/abschoepfung-bearbeiten/<int:pk>/": (7, 5),
+    "berichte/run-erstellen/": (11, 9),
+    "berichte/run-bearbeiten/<int:run>/": (9, 7),
+    "berichte/<date:date>/abos-abrechnen/": (13, 11),
+    "berichte/<date:date>/bezahlen/<int:signup>/": (19, 17),
+    "berichte/<date:date>/bezahlung-bearbeiten/<int:pk>/": (11, 9),
+    "berichte/<date:date>/einkauf-erfassen/<int:signup>/": (7, 5),
+    "berichte/<date:date>/einkauf-entfernen/<int:pk>/": (6, 4),
+    "berichte/twint/": (0, 0),
+    "berichte/twint/abgleichen/": (3, 1),
+    "berichte/meine-rechnungen/": (7, 4),
+    "berichte/meine-rechnungen/<int:year>/": (7, 4),
+}
+
+
+class QueryBudgetTests(TestCase):
+    """Requests every view as the right role, with data grown by `scale`"""
+
+    scale = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Pilot.objects.create(
+            email="staff@example.com", first_name="Staff", role=Pilot.Role.STAFF
+        )
+        cls.orga = Pilot.objects.create(
+            email="orga@example.com", first_name="Orga", role=Pilot.Role.ORGA
+        )
+        cls.pilot = Pilot.objects.create(
+            email="pilot@example.com", first_name="Pilot", role=Pilot.Role.MEMBER
+        )
+        Post.objects.create(
+            title="Post", slug="post", author=cls.staff, content="Content"
+        )
+        pilots = [cls.staff, cls.orga, cls.pilot] + Pilot.objects.bulk_create(
+            Pilot(
+                email=f"pilot_{i}@example.com",
+                first_name=f"Pilot {i}",
+                role=Pilot.Role.MEMBER if i % 2 else Pilot.Role.GUEST,
+            )
+            for i in range(3 * cls.scale)
+        )
+
+        trainings = Training.objects.bulk_create(
+            Training(date=TODAY - timedelta(days=i), emergency_mail_sender=cls.orga)
+            for i in range(2 * cls.scale)
+        )
+        # Everybody signs up today, earlier the first pilots and ten others
+        others = pilots[4:]
+        pilots_by_training = {trainings[0].pk: pilots}
+        for i, training in enumerate(trainings[1:]):
+            start = 10 * i % len(others)
+            pilots_by_training[training.pk] = (
+                pilots[:4] + (others[start:] + others[:start])[:10]
+            )
+        signups = Signup.objects.bulk_create(
+            Signup(
+                pilot=pilot,
+                training=training,
+                status=(
+                    Signup.Status.SELECTED
+                    if i < training.max_pilots
+                    else Signup.Status.WAITING
+                ),
+            )
+            for training in trainings
+            for i, pilot in enumerate(pilots_by_training[training.pk])
+        )
+        # The staff member is the orga of the day
+        reports = Report.objects.bulk_create(
+            Report(training=signup.training, cash_at_start=100, orga_1=signup)
+            for signup in signups
+            if signup.pilot == cls.staff
+        )
+        selected = [
+            signup for signup in signups if signup.status == Signup.Status.SELECTED
+        ]
+        report_of = {report.pk: report for report in reports}
+        Run.objects.bulk_create(
+            Run(
+                signup=signup,
+                report=report_of[signup.training_id],
+                kind=Run.Kind.FLIGHT,
+                created_on=timezone.now() - timedelta(days=i, minutes=j),
+            )
+            for i, signup in enumerate(selected)
+            for j in range(3)
+        )
+        Purchase.objects.bulk_create(
+            Purchase(
+                signup=signup,
+                report=report_of[signup.training_id],
+                description=Purchase.DAY_PASS_DESCRIPTION,
+                price=Purchase.DAY_PASS_PRICE,
+            )
+            for signup in selected
+        )
+        # The first guest is still to pay today
+        cls.unpaid_signup = signups[3]
+        Bill.objects.bulk_create(
+            Bill(
+                signup=signup,
+                report=report_of[signup.training_id],
+                prepaid_flights=0,
+                amount=27,
+                method=PaymentMethods.CASH,
+            )
+            for signup in selected
+            if signup != cls.unpaid_signup
+        )
+        Expense.objects.bulk_create(
+            Expense(report=report, reason=Expense.Reasons.GAS.label, amount=50)
+            for report in reports
+        )
+        Absorption.objects.bulk_create(
+            Absorption(
+                report=report,
+                signup=report.orga_1,
+                amount=50,
+                method=PaymentMethods.TWINT,
+            )
+            for report in reports
+        )
+
+    def kwargs(self, pattern):
+        today = Report.objects.get(training__date=TODAY)
+        values = {
+            "year": TODAY.year,
+            "date": TODAY.isoformat(),
+            "slug": "post",
+            "run": 1,
+            "signup": self.unpaid_signup.pk,
+            "kind": "rechnungen",
+        }
+        pks = {
+            "update_expense": today.expenses,
+            "update_absorption": today.absorptions,
+            "update_bill": today.bills,
+            "delete_purchase": today.purchases,
+        }
+        return {
+            argument: (
+                pks[pattern.name].first().pk if argument == "pk" else values[argument]
+            )
+            for argument in pattern.pattern.converters
+        }
+
+    def test_query_budgets(self):
+        users = {
+            None: None,
+            "pilot": self.pilot,
+            "orga": self.orga,
+            "staff": self.staff,
+        }
+        for label, pattern in Bench().urls():
+            if pattern.name in SKIPPED:
+                continue
+
+            with self.subTest(url=label, scale=self.scale):
+                self.client.logout()
+                if user := users[ROLES.get(pattern.name, "orga")]:
+                    self.client.force_login(user)
+                path = reverse(pattern.name, kwargs=self.kwargs(pattern))
+                cache.clear()
+                queries = []
+                for _ in range(2):  # With a cold, then a warm cache
+                    with CaptureQueriesContext(connection) as context:
+                        response = self.client.get(path)
+                        content(response)
+                    self.assertIn(
+                        response.status_code, [HTTPStatus.OK, HTTPStatus.FOUND]
+                    )
+                    queries.append(context.captured_queries)
+                self.assertEqual(
+                    QUERY_BUDGETS[label],
+                    tuple(map(len, queries)),
+                    f"{label} needs {tuple(map(len, queries))} queries with a cold and "
+                    "a warm cache, update QUERY_BUDGETS if intended:\n"
+                    + "\n".join(query["sql"] for query in queries[0] + queries[1]),
+                )
+
+
+class TenfoldQueryBudgetTests(QueryBudgetTests):
+    scale = 10
+
+
+class HundredfoldQueryBudgetTests(QueryBudgetTests):
+    scale = 100
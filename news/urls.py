@@ -22,5 +22,6 @@ urlpatterns = [
         views.PilotPasswordResetConfirmView.as_view(),
         name="password_reset_confirm",
     ),
+    path("metrics", views.MetricsView.as_view(), name="metrics"),
     path("<slug:slug>/", views.PostDetailView.as_view(), name="post"),
 ]
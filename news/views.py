@@ -1,17 +1,137 @@
+import time
+from functools import wraps
+from hmac import compare_digest
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import PasswordResetView, PasswordResetConfirmView
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
 from django.urls import reverse_lazy
 from django.views import generic
 
+from . import metrics
+from .database import replica
 from .forms import ContactForm, MembershipForm, PilotCreationForm, PilotUpdateForm
 from .models import Post
 
 
-class PostListView(generic.ListView):
+class AsyncViewMixin:
+    """Load the user asynchronously, such that async views can use LoginRequiredMixin"""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            request.user = await request.auser()
+            response = view(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+            return response
+
+        return async_view
+
+
+class ReadFromReplicaMixin:
+    """
+    Read from the replica database, for heavy views that tolerate slightly stale data.
+    Users who just wrote read from the primary, see ReadYourWritesMiddleware. Responses
+    are rendered within the replica context, as templates can still evaluate querysets.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.session.get("read_primary_until", 0) > time.time():
+            return super().dispatch(request, *args, **kwargs)
+
+        with replica():
+            response = super().dispatch(request, *args, **kwargs)
+            if not isawaitable(response):
+                return self.render(response)
+
+        async def read_from_replica():
+            with replica():
+                return await sync_to_async(self.render)(await response)
+
+        return read_from_replica()
+
+    @staticmethod
+    def render(response):
+        if hasattr(response, "render") and callable(response.render):
+            response.render()
+        return response
+
+
+class AsyncListView(AsyncViewMixin, generic.ListView):
+    """
+    ListView loading its objects with Django's async ORM in `aget_queryset`, such that
+    workers can serve other requests meanwhile when deployed via ASGI. The context is
+    still built in a thread, because properties of the objects can hit the database.
+    """
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def get(self, request, *args, **kwargs):
+        queryset = await self.aget_queryset()
+        # Names of template and context are derived from the model, as the loaded
+        # objects are a list rather than a QuerySet
+        self.model = queryset.model
+        if page_size := self.get_paginate_by(queryset):
+            self.pagination = await self.apaginate_queryset(queryset, page_size)
+            queryset = self.pagination[2]
+        else:
+            queryset = [instance async for instance in queryset]
+        self.object_list = queryset
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Count and slice in the database, but only load the objects of the page"""
+        paginator = self.get_paginator(
+            range(await queryset.acount()),
+            page_size,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(
+            self.page_kwarg, 1
+        )
+        try:
+            page = paginator.page(page if page != "last" else paginator.num_pages)
+        except InvalidPage as error:
+            raise Http404(f"Ungültige Seite ({error}).")
+
+        bottom = (page.number - 1) * paginator.per_page
+        queryset = queryset[bottom : bottom + len(page.object_list)]
+        page.object_list = [instance async for instance in queryset]
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.pagination
+
+    def get_context_object_name(self, object_list):
+        return self.context_object_name or f"{self.model._meta.model_name}_list"
+
+    def get_template_names(self):
+        if self.template_name:
+            return [self.template_name]
+
+        opts = self.model._meta
+        return [f"{opts.app_label}/{opts.model_name}{self.template_name_suffix}.html"]
+
+
+class PostListView(AsyncListView):
     model = Post
     paginate_by = 3
 
+    async def aget_queryset(self):
+        return Post.objects.select_related("author")
+
 
 class PostDetailView(generic.DetailView):
     model = Post
@@ -106,3 +226,21 @@ class MembershipFormView(NonMemberOnlyMixin, SuccessMessageMixin, generic.FormVi
         form.send_mail()
         self.request.user.make_member()
         return super().form_valid(form)
+
+
+class MetricsView(UserPassesTestMixin, generic.View):
+    """Metrics for Prometheus, for staff or with METRICS_TOKEN as bearer token"""
+
+    raise_exception = True
+
+    def test_func(self):
+        if self.request.user.is_staff:
+            return True
+
+        authorization = self.request.headers.get("Authorization", "")
+        return bool(settings.METRICS_TOKEN) and compare_digest(
+            authorization, f"Bearer {settings.METRICS_TOKEN}"
+        )
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.generate(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,138 @@
+"""
+Live events of upcoming trainings, i.e. signup changes and newly recorded runs.
+
+Workers only share the database, thus it is polled every `settings.EVENTS_POLL_INTERVAL`
+seconds, by one poller per worker fanning the events out to all its streams.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def signup_event(signup):
+    return {
+        "type": "signup",
+        "date": signup.training.date.isoformat(),
+        "signup": signup.pk,
+        "pilot": signup.pilot.pk,
+        "name": str(signup.pilot),
+        "status": signup.status,
+        "modified": signup.updated_on.isoformat(),
+    }
+
+
+def run_event(run):
+    return {
+        "type": "run",
+        "date": run.signup.training.date.isoformat(),
+        "run": run.pk,
+        "signup": run.signup.pk,
+        "pilot": run.signup.pilot.pk,
+        "kind": run.kind,
+        "created_on": run.created_on.isoformat(),
+    }
+
+
+class EventBroker:
+    """
+    In-process pub/sub feeding the event streams of this worker. While streams are
+    subscribed, a single poller publishes the changes in the database.
+    """
+
+    MAX_QUEUED_EVENTS = 100
+
+    def __init__(self):
+        self.subscribers = set()
+        self.poller = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.MAX_QUEUED_EVENTS)
+        self.subscribers.add(queue)
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self.poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.poller:
+            self.poller.cancel()
+            self.poller = None
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Clients of stalled streams reconnect and reload anyway
+                pass
+
+    async def poll(self):
+        """Publish signup changes and new runs until the last stream unsubscribed"""
+        from bookkeeping.models import Run
+        from .models import Signup
+
+        since = timezone.now()  # Only changes after subscribing are streamed
+        last_run = await Run.objects.order_by("pk").alast()
+        last_run_pk = last_run.pk if last_run else 0
+        while True:
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+            today = timezone.now().date()
+            signups = (
+                Signup.objects.filter(updated_on__gt=since, training__date__gte=today)
+                .select_related("pilot", "training")
+                .order_by("updated_on")
+            )
+            async for signup in signups:
+                since = signup.updated_on
+                self.publish(signup_event(signup))
+            runs = (
+                Run.objects.filter(pk__gt=last_run_pk)
+                .select_related("signup__pilot", "signup__training")
+                .order_by("pk")
+            )
+            async for run in runs:
+                last_run_pk = run.pk
+                self.publish(run_event(run))
+
+
+broker = EventBroker()
+
+
+class EventStream:
+    """
+    Events of upcoming trainings for one client, from the broker. Runs are only
+    streamed to orgas, like the reports they are shown in.
+    """
+
+    def __init__(self, pilot, date=None):
+        self.pilot = pilot
+        self.date = date
+
+    def is_relevant(self, event):
+        if event["date"] < timezone.now().date().isoformat():
+            return False
+
+        if self.date and event["date"] != self.date.isoformat():
+            return False
+
+        return event["type"] != "run" or self.pilot.is_orga
+
+    async def __aiter__(self):
+        """Yield events, or None to keep alive, until the stream's duration passed"""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + settings.EVENTS_STREAM_DURATION
+        queue = broker.subscribe()
+        try:
+            while loop.time() < end:
+                timeout = min(end - loop.time(), settings.EVENTS_POLL_INTERVAL)
+                try:
+                    event = await asyncio.wait_for(queue.get(), max(0, timeout))
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if self.is_relevant(event):
+                    yield event
+        finally:
+            broker.unsubscribe(queue)
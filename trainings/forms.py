@@ -5,11 +5,44 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.utils.formats import date_format
 from django.utils.html import strip_tags
 from .models import Training, Signup
+from news import caching
+
+
+def wednesday_before(day):
+    return day + timedelta(days=(2 - day.weekday()) % 7 - 7)
+
+
+Weekdays = models.IntegerChoices("Weekdays", "Mo Di Mi Do Fr Sa So", start=0)
+
+
+class WeekdaysField(forms.TypedMultipleChoiceField):
+    """Days of the week to repeat on, defaulting to all days"""
+
+    widget = forms.CheckboxSelectMultiple(attrs={"class": "form-check-input"})
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            choices=Weekdays.choices,
+            coerce=int,
+            initial=Weekdays.values,
+            required=False,
+            **kwargs,
+        )
+
+
+def days_between(first_day, last_day, weekdays):
+    weekdays = weekdays or Weekdays.values
+    num_days = (last_day - first_day).days + 1
+    return [
+        day
+        for day in (first_day + timedelta(days=i) for i in range(num_days))
+        if day.weekday() in weekdays
+    ]
 
 
 def date_relative_to_next_august(month, day):
@@ -19,8 +52,11 @@ def date_relative_to_next_august(month, day):
 
 
 class TrainingCreateForm(forms.Form):
+    MAX_TRAININGS = 62
+
     first_day = forms.DateField(initial=lambda: date_relative_to_next_august(8, 1))
     last_day = forms.DateField(initial=lambda: date_relative_to_next_august(8, 31))
+    weekdays = WeekdaysField()
     priority_date = forms.DateField(initial=lambda: date_relative_to_next_august(4, 15))
     max_pilots = forms.IntegerField(
         initial=11, validators=[MinValueValidator(6), MaxValueValidator(33)]
@@ -53,9 +89,15 @@ class TrainingCreateForm(forms.Form):
         if first_day > last_day:
             raise ValidationError("Der erste Tag muss vor dem Letzten liegen.")
 
-        if last_day - first_day > timedelta(days=31):
+        weekdays = cleaned_data.get("weekdays")
+        cleaned_data["dates"] = days_between(first_day, last_day, weekdays)
+        if not cleaned_data["dates"]:
+            raise ValidationError("Keine Tage mit den gewählten Wochentagen.")
+
+        if len(cleaned_data["dates"]) > self.MAX_TRAININGS:
             raise ValidationError(
-                "Es können höchstens 31 Trainings auf einmal erstellt werden."
+                f"Es können höchstens {self.MAX_TRAININGS} Trainings auf einmal "
+                "erstellt werden."
             )
 
         priority_date = cleaned_data.get("priority_date")
@@ -68,17 +110,27 @@ class TrainingCreateForm(forms.Form):
             )
 
     def create_trainings(self):
-        day = self.cleaned_data["first_day"]
-        while day <= self.cleaned_data["last_day"]:
-            if Training.objects.filter(date=day).exists():
-                training = Training.objects.get(date=day)
-            else:
-                training = Training(date=day)
-            training.info = self.cleaned_data["info"]
-            training.max_pilots = self.cleaned_data["max_pilots"]
-            training.priority_date = self.cleaned_data["priority_date"]
-            training.save()
-            day += timedelta(days=1)
+        """Update existing and create missing trainings, keeping their signups"""
+        dates = self.cleaned_data["dates"]
+        fields = {
+            "info": self.cleaned_data["info"],
+            "max_pilots": self.cleaned_data["max_pilots"],
+            "priority_date": self.cleaned_data["priority_date"],
+        }
+        with transaction.atomic():
+            trainings = Training.objects.in_bulk(dates, field_name="date")
+            # bulk_update doesn't set auto_now fields
+            now = timezone.now()
+            for training in trainings.values():
+                for field, value in fields.items():
+                    setattr(training, field, value)
+                training.updated_on = now
+            Training.objects.bulk_update(trainings.values(), [*fields, "updated_on"])
+            Training.objects.bulk_create(
+                [Training(date=day, **fields) for day in dates if day not in trainings]
+            )
+        # Bulk operations don't send signals
+        caching.invalidate(Training)
 
 
 class TrainingUpdateForm(forms.ModelForm):
@@ -200,6 +252,98 @@ class SignupCreateForm(forms.ModelForm):
         return training_date
 
 
+class SignupBatchCreateForm(forms.ModelForm):
+    first_day = forms.DateField()
+    last_day = forms.DateField()
+    weekdays = WeekdaysField()
+
+    class Meta:
+        model = Signup
+        exclude = ("pilot", "training", "status")
+
+    def clean_first_day(self):
+        first_day = self.cleaned_data["first_day"]
+        if first_day < timezone.now().date():
+            raise ValidationError(
+                "Einschreiben ist nur für kommende Trainings möglich."
+            )
+        return first_day
+
+    def clean_last_day(self):
+        last_day = self.cleaned_data["last_day"]
+        if last_day > timezone.now().date() + timedelta(days=365):
+            raise ValidationError(
+                "Einschreiben ist höchstens ein Jahr im Voraus möglich."
+            )
+        return last_day
+
+    def clean(self):
+        cleaned_data = super().clean()
+        first_day = cleaned_data.get("first_day")
+        last_day = cleaned_data.get("last_day")
+        if not (first_day and last_day):
+            return
+
+        if first_day > last_day:
+            raise ValidationError("Der erste Tag muss vor dem Letzten liegen.")
+
+        if last_day - first_day > timedelta(days=31):
+            raise ValidationError(
+                "Es kann höchstens für 31 Tage auf einmal eingeschrieben werden."
+            )
+
+        weekdays = cleaned_data.get("weekdays")
+        cleaned_data["dates"] = days_between(first_day, last_day, weekdays)
+        if not cleaned_data["dates"]:
+            raise ValidationError("Keine Tage mit den gewählten Wochentagen.")
+
+    def create_signups(self, pilot):
+        """Create missing trainings and signups, return dates signed up & conflicts"""
+        try:
+            return self._create_signups(pilot)
+        except IntegrityError:
+            # Signed up meanwhile, e.g. by submitting twice, thus reading conflicts again
+            return self._create_signups(pilot)
+
+    def _create_signups(self, pilot):
+        dates = self.cleaned_data["dates"]
+        with transaction.atomic():
+            trainings = Training.objects.in_bulk(dates, field_name="date")
+            Training.objects.bulk_create(
+                [
+                    Training(date=day, priority_date=wednesday_before(day))
+                    for day in dates
+                    if day not in trainings
+                ],
+                ignore_conflicts=True,  # Trainings created meanwhile
+            )
+            if len(trainings) < len(dates):
+                trainings = Training.objects.in_bulk(dates, field_name="date")
+
+            conflicts = set(
+                Signup.objects.filter(
+                    pilot=pilot, training__date__in=dates
+                ).values_list("training__date", flat=True)
+            )
+            signed_up = [day for day in dates if day not in conflicts]
+            Signup.objects.bulk_create(
+                [
+                    Signup(
+                        pilot=pilot,
+                        training=trainings[day],
+                        is_certain=self.cleaned_data["is_certain"],
+                        duration=self.cleaned_data["duration"],
+                        for_sketchy_weather=self.cleaned_data["for_sketchy_weather"],
+                        comment=self.cleaned_data["comment"],
+                    )
+                    for day in signed_up
+                ]
+            )
+        # Bulk operations don't send signals
+        caching.invalidate(Training, Signup)
+        return signed_up, sorted(conflicts)
+
+
 class SignupUpdateForm(forms.ModelForm):
     class Meta:
         model = Signup
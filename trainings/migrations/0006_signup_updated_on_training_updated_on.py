@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainings', '0005_alter_training_max_pilots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signup',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='training',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0006_signup_updated_on_training_updated_on"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="signup",
+            name="trainings_s_status_c94ee7_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="training",
+            name="trainings_t_date_81aa6e_idx",
+        ),
+        migrations.AddIndex(
+            model_name="signup",
+            index=models.Index(
+                fields=["training", "status", "signed_up_on"],
+                name="trainings_s_trainin_159cbc_idx",
+            ),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.db import models
 from django.utils import timezone
 
 from bookkeeping.models import Purchase
+from news import metrics
 
 
 class Training(models.Model):
@@ -29,9 +30,9 @@ class Training(models.Model):
         null=True,
         db_index=False,
     )
+    updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["date"])]
         ordering = ["date"]
 
     def __str__(self):
@@ -70,6 +71,7 @@ class Training(models.Model):
         return [signup.pilot for signup in self.active_signups if signup.pilot.is_new]
 
     def select_signups(self):
+        metrics.SELECTIONS.inc()
         signups = self.signups.all()
 
         selected_orgas = [signup for signup in signups if signup.is_selected_orga]
@@ -109,9 +111,11 @@ class Signup(models.Model):
     )
     for_sketchy_weather = models.BooleanField(default=True)
     comment = models.CharField(max_length=150, default="", blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["status"])]
+        # Signups of a training in order, optionally of a status
+        indexes = [models.Index(fields=["training", "status", "signed_up_on"])]
         unique_together = (("pilot", "training"),)
         ordering = ["status", "signed_up_on"]
 
@@ -164,7 +168,8 @@ class Signup(models.Model):
 
     @property
     def is_training_orga(self):
-        return self in {self.training.report.orga_1, self.training.report.orga_2}
+        report = self.training.report
+        return self.pk in {report.orga_1_id, report.orga_2_id}
 
     @property
     def needs_day_pass(self):
@@ -7,6 +7,7 @@ from django.utils import timezone
 
 from .models import Training, Signup
 from bookkeeping.models import Bill, PaymentMethods, Purchase, Report, Run
+from news.testing import IndexTestMixin
 
 
 TODAY = timezone.now().date()
@@ -461,3 +462,15 @@ class SignupTests(TestCase):
             method=PaymentMethods.CASH,
         ).save()
         self.assertTrue(self.signup.is_paid)
+
+
+class IndexTests(IndexTestMixin, TestCase):
+    def test_signups_of_training(self):
+        index = Signup._meta.indexes[0].name
+        self.assertUsesIndex(index, self.training.signups.all())
+        self.assertUsesIndex(
+            index,
+            Signup.objects.filter(
+                training=self.training, status=Signup.Status.SELECTED
+            ).order_by("signed_up_on"),
+        )
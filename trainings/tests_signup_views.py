@@ -306,6 +306,146 @@ class SignupCreateViewTests(TestCase):
         self.assertEqual(1, len(Signup.objects.all()))
 
 
+class SignupBatchCreateViewTests(TestCase):
+    def setUp(self):
+        self.pilot = get_user_model().objects.create(email="pilot@example.com")
+        self.client.force_login(self.pilot)
+        self.data = {
+            "first_day": TODAY,
+            "last_day": TODAY + timedelta(days=7),
+            "weekdays": list(range(7)),
+            "is_certain": False,
+            "duration": Signup.Duration.LEAVING_EARLY,
+            "for_sketchy_weather": False,
+            "comment": "Axalpwoche",
+        }
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse("batch_signup"), follow=True)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "news/login.html")
+
+    def test_form_is_prefilled(self):
+        response = self.client.get(reverse("batch_signup"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/signup_batch_create.html")
+        self.assertContains(response, f'value="{TODAY.isoformat()}"')
+        self.assertContains(
+            response, f'value="{(TODAY + timedelta(days=6)).isoformat()}"'
+        )
+        for weekday in range(7):
+            self.assertContains(response, f'id="id_weekdays_{weekday}" checked')
+
+    def test_signup_for_range_creates_trainings_and_signups(self):
+        Training.objects.create(date=TOMORROW, info="Existing training")
+        response = self.client.post(
+            reverse("batch_signup"), data=self.data, follow=True
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/signup_list.html")
+        self.assertContains(response, "alert-success")
+        self.assertContains(response, "<b>8 Trainings</b>")
+
+        trainings = Training.objects.all()
+        self.assertEqual(8, len(trainings))
+        self.assertEqual("Existing training", trainings[1].info)
+        for training in trainings.exclude(date=TOMORROW):
+            self.assertEqual(2, training.priority_date.weekday())
+            self.assertLess(training.priority_date, training.date)
+
+        signups = Signup.objects.all()
+        self.assertEqual(8, len(signups))
+        for signup in signups:
+            self.assertEqual(self.pilot, signup.pilot)
+            self.assertFalse(signup.is_certain)
+            self.assertEqual(Signup.Duration.LEAVING_EARLY, signup.duration)
+            self.assertFalse(signup.for_sketchy_weather)
+            self.assertEqual("Axalpwoche", signup.comment)
+
+    def test_signup_for_weekdays_only(self):
+        self.data["weekdays"] = [TODAY.weekday(), TOMORROW.weekday()]
+        response = self.client.post(
+            reverse("batch_signup"), data=self.data, follow=True
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, "<b>3 Trainings</b>")
+        self.assertEqual(
+            [TODAY, TOMORROW, TODAY + timedelta(days=7)],
+            [signup.training.date for signup in Signup.objects.order_by("training")],
+        )
+
+    def test_conflicts_are_reported(self):
+        Signup.objects.create(
+            pilot=self.pilot, training=Training.objects.create(date=TOMORROW)
+        )
+        response = self.client.post(
+            reverse("batch_signup"), data=self.data, follow=True
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/signup_list.html")
+        self.assertContains(response, "alert-success")
+        self.assertContains(response, "<b>7 Trainings</b>")
+        self.assertContains(response, "alert-warning")
+        self.assertContains(response, "bereits eingeschrieben")
+        self.assertEqual(8, len(Signup.objects.all()))
+        self.assertTrue(Signup.objects.get(training__date=TOMORROW).is_certain)
+
+        response = self.client.post(
+            reverse("batch_signup"), data=self.data, follow=True
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/signup_batch_create.html")
+        self.assertContains(response, "alert-warning")
+        self.assertNotContains(response, "alert-success")
+        self.assertEqual(8, len(Signup.objects.all()))
+
+    def test_concurrent_signups_are_reported_as_conflicts(self):
+        Signup.objects.create(
+            pilot=self.pilot, training=Training.objects.create(date=TOMORROW)
+        )
+        signups = Signup.objects.filter
+        missed = iter([True])
+
+        def signed_up_meanwhile(**kwargs):
+            if next(missed, False):
+                return signups(**kwargs).exclude(training__date=TOMORROW)
+            return signups(**kwargs)
+
+        with mock.patch.object(Signup.objects, "filter", signed_up_meanwhile):
+            response = self.client.post(
+                reverse("batch_signup"), data=self.data, follow=True
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, "<b>7 Trainings</b>")
+        self.assertContains(response, "bereits eingeschrieben")
+        self.assertEqual(8, len(Signup.objects.all()))
+        self.assertTrue(Signup.objects.get(training__date=TOMORROW).is_certain)
+
+    def test_invalid_ranges(self):
+        for first_day, last_day in [
+            (YESTERDAY, TOMORROW),
+            (TOMORROW, TODAY),
+            (TODAY, TODAY + timedelta(days=32)),
+            (TODAY + timedelta(days=360), TODAY + timedelta(days=370)),
+        ]:
+            with self.subTest(first_day=first_day, last_day=last_day):
+                self.data |= {"first_day": first_day, "last_day": last_day}
+                response = self.client.post(reverse("batch_signup"), data=self.data)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTemplateUsed(response, "trainings/signup_batch_create.html")
+                self.assertContains(response, "alert-warning")
+                self.assertEqual(0, len(Training.objects.all()))
+
+        self.data |= {"first_day": TODAY, "last_day": TODAY, "weekdays": [7]}
+        response = self.client.post(reverse("batch_signup"), data=self.data)
+        self.assertContains(response, "alert-warning")
+        self.data["weekdays"] = [TOMORROW.weekday()]
+        response = self.client.post(reverse("batch_signup"), data=self.data)
+        self.assertContains(response, "Keine Tage mit den gewählten Wochentagen.")
+        self.assertEqual(0, len(Training.objects.all()))
+
+
 class SignupUpdateViewTests(TestCase):
     def setUp(self):
         self.pilot = get_user_model().objects.create(email="pilot@example.com")
@@ -615,18 +755,18 @@ class DatabaseCallsTests(TestCase):
             training.select_signups()
 
     def test_signup_list_view(self):
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(7):
             response = self.client.get(reverse("signups"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/signup_list.html")
 
     def test_signup_create_view(self):
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(2):
             response = self.client.get(reverse("signup"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/signup_create.html")
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(4):
             response = self.client.post(
                 reverse("signup"),
                 data={
@@ -637,13 +777,27 @@ class DatabaseCallsTests(TestCase):
             )
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
-    def test_signup_update_view(self):
+    def test_signup_batch_create_view(self):
         with self.assertNumQueries(8):
+            response = self.client.post(
+                reverse("batch_signup"),
+                data={
+                    "first_day": TODAY,
+                    "last_day": TODAY + timedelta(days=20),
+                    "weekdays": list(range(7)),
+                    "duration": Signup.Duration.ALL_DAY,
+                },
+            )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(21, len(Signup.objects.filter(pilot__first_name="Orga")))
+
+    def test_signup_update_view(self):
+        with self.assertNumQueries(7):
             response = self.client.get(reverse("update_signup", kwargs={"date": TODAY}))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/signup_update.html")
 
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(3):
             response = self.client.post(
                 reverse("update_signup", kwargs={"date": TODAY}),
                 data={
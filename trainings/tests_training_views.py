@@ -1,16 +1,20 @@
+import asyncio
 from datetime import date, timedelta
 from http import HTTPStatus
+import json
 import locale
 from random import randint
 from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core import mail
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
+from .events import broker
 from .models import Training, Signup
+from bookkeeping.models import Report, Run
 
 
 locale.setlocale(locale.LC_TIME, "de_CH")
@@ -213,6 +217,244 @@ class TrainingListViewTests(TestCase):
         self.assertEqual(2, str(response.content).count(reverse("create_report")))
 
 
+class TrainingStatusViewTests(TestCase):
+    def setUp(self):
+        self.pilot = get_user_model().objects.create(
+            email="pilot@example.com", first_name="Pilot"
+        )
+        self.pilot_b = get_user_model().objects.create(
+            email="pilot_b@example.com", first_name="Pilot B"
+        )
+        self.client.force_login(self.pilot)
+
+        Training(date=YESTERDAY).save()
+        self.todays_training = Training.objects.create(date=TODAY)
+        self.tomorrows_training = Training.objects.create(date=TOMORROW)
+        self.signup = Signup.objects.create(
+            pilot=self.pilot, training=self.todays_training
+        )
+        Signup(
+            pilot=self.pilot_b, training=self.todays_training, is_certain=False
+        ).save()
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse("training_status"))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_status_of_upcoming_trainings(self):
+        response = self.client.get(reverse("training_status"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+        status = response.json()
+        self.assertEqual(status["pilot"], self.pilot.pk)
+        self.assertEqual(status["dates"], [TODAY.isoformat(), TOMORROW.isoformat()])
+        self.assertEqual(len(status["trainings"]), 2)
+
+        todays_status = status["trainings"][0]
+        self.assertEqual(todays_status["max_pilots"], 11)
+        self.assertEqual(todays_status["number_of_selected_pilots"], 2)
+        self.assertEqual(todays_status["number_of_motivated_pilots"], 1)
+        self.assertEqual(
+            todays_status["signups"],
+            [
+                [self.pilot.pk, str(self.pilot), Signup.Status.SELECTED],
+                [self.pilot_b.pk, str(self.pilot_b), Signup.Status.SELECTED],
+            ],
+        )
+        self.assertEqual(status["trainings"][1]["signups"], [])
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse("training_status"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        etag = response["ETag"]
+
+        response = self.client.get(
+            reverse("training_status"), headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        self.signup.cancel()
+        self.signup.save()
+        response = self.client.get(
+            reverse("training_status"), headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        self.signup.delete()
+        response = self.client.get(
+            reverse("training_status"), headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()["trainings"][0]["signups"]), 1)
+
+    def test_unchanged_without_selecting_signups(self):
+        response = self.client.get(reverse("training_status"))
+        etag = response["ETag"]
+
+        with mock.patch.object(Training, "select_signups") as select_signups:
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    reverse("training_status"), headers={"If-None-Match": etag}
+                )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        select_signups.assert_not_called()
+
+    def test_not_modified_since(self):
+        response = self.client.get(reverse("training_status"))
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(
+            reverse("training_status"), headers={"If-Modified-Since": last_modified}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_only_changed_trainings_since(self):
+        response = self.client.get(reverse("training_status"))
+        since = response.json()["last_modified"]
+        response = self.client.get(reverse("training_status"), {"since": since})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        status = response.json()
+        self.assertEqual(status["dates"], [TODAY.isoformat(), TOMORROW.isoformat()])
+        self.assertEqual(status["trainings"], [])
+
+        Signup(pilot=self.pilot, training=self.tomorrows_training).save()
+        response = self.client.get(reverse("training_status"), {"since": since})
+        status = response.json()
+        self.assertEqual(len(status["trainings"]), 1)
+        self.assertEqual(status["trainings"][0]["date"], TOMORROW.isoformat())
+        self.assertLess(since, status["last_modified"])
+
+    def test_invalid_since(self):
+        # The latter is well-formed, but no valid date
+        for since in ["gestern", "2024-02-30T10:00:00+00:00"]:
+            with self.subTest(since=since):
+                response = self.client.get(
+                    reverse("training_status"), {"since": since}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+@override_settings(EVENTS_POLL_INTERVAL=0.1, EVENTS_STREAM_DURATION=0.5)
+class TrainingEventsViewTests(TestCase):
+    def setUp(self):
+        self.orga = get_user_model().objects.create(
+            email="orga@example.com", role=get_user_model().Role.ORGA
+        )
+        self.pilot = get_user_model().objects.create(email="pilot@example.com")
+        self.todays_training = Training.objects.create(date=TODAY)
+        self.tomorrows_training = Training.objects.create(date=TOMORROW)
+        self.orga_signup = Signup.objects.create(
+            pilot=self.orga, training=self.todays_training
+        )
+        self.report = Report.objects.create(
+            training=self.todays_training, cash_at_start=1337
+        )
+
+    async def stream_events(self, url, change):
+        """Make change while streaming and return the events"""
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b"retry: 100\n\n")
+
+        events = asyncio.ensure_future(self.collect(content))
+        await asyncio.sleep(0.05)
+        await change()
+        return await events
+
+    async def collect(self, content):
+        events = []
+        async for chunk in content:
+            if chunk.startswith(b"event: "):
+                events.append(json.loads(chunk.decode().split("data: ")[1]))
+        return events
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse("training_events"))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_no_content_via_wsgi(self):
+        self.client.force_login(self.pilot)
+        response = self.client.get(reverse("training_events"))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+
+    async def test_signup_changes_are_streamed(self):
+        await self.async_client.aforce_login(self.pilot)
+
+        async def signup():
+            await Signup.objects.acreate(
+                pilot=self.pilot, training=self.tomorrows_training
+            )
+
+        events = await self.stream_events(reverse("training_events"), signup)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["type"], "signup")
+        self.assertEqual(events[0]["date"], TOMORROW.isoformat())
+        self.assertEqual(events[0]["pilot"], self.pilot.pk)
+        self.assertEqual(events[0]["status"], Signup.Status.WAITING)
+        self.assertFalse(broker.subscribers)
+        self.assertIsNone(broker.poller)
+
+    async def test_one_poller_for_all_streams(self):
+        await self.async_client.aforce_login(self.pilot)
+
+        async def cancel():
+            self.orga_signup.status = Signup.Status.CANCELED
+            await self.orga_signup.asave()
+
+        async def no_change():
+            pass
+
+        with mock.patch.object(broker, "poll", wraps=broker.poll) as poll:
+            streams = await asyncio.gather(
+                self.stream_events(reverse("training_events"), cancel),
+                self.stream_events(reverse("training_events"), no_change),
+            )
+        poll.assert_called_once()
+        for events in streams:
+            self.assertEqual(len(events), 1)
+            self.assertEqual(events[0]["signup"], self.orga_signup.pk)
+            self.assertEqual(events[0]["status"], Signup.Status.CANCELED)
+
+    async def test_only_events_of_given_date_are_streamed(self):
+        await self.async_client.aforce_login(self.pilot)
+
+        async def signup():
+            await Signup.objects.acreate(
+                pilot=self.pilot, training=self.tomorrows_training
+            )
+
+        events = await self.stream_events(
+            reverse("training_events", kwargs={"date": TODAY}), signup
+        )
+        self.assertEqual(events, [])
+
+    async def test_runs_are_only_streamed_to_orgas(self):
+        async def run():
+            await Run.objects.acreate(
+                signup=self.orga_signup,
+                report=self.report,
+                kind=Run.Kind.FLIGHT,
+                created_on=timezone.now(),
+            )
+
+        await self.async_client.aforce_login(self.pilot)
+        events = await self.stream_events(reverse("training_events"), run)
+        self.assertEqual(events, [])
+
+        await self.async_client.aforce_login(self.orga)
+        events = await self.stream_events(reverse("training_events"), run)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["type"], "run")
+        self.assertEqual(events[0]["kind"], Run.Kind.FLIGHT)
+        self.assertEqual(events[0]["signup"], self.orga_signup.pk)
+
+
 class TrainingCreateViewTests(TestCase):
     def setUp(self):
         self.orga = get_user_model().objects.create(
@@ -336,12 +578,65 @@ class TrainingCreateViewTests(TestCase):
         self.assertContains(response, "alert-warning")
         self.assertEqual(0, len(Training.objects.all()))
 
-    def test_cannot_create_more_than_31_trainings(self):
+    def test_create_trainings_on_weekends(self):
+        Training.objects.create(date=TOMORROW, info="Old info")
+        last_week = timezone.now() - timedelta(days=7)
+        Training.objects.update(updated_on=last_week)
+        first_day, last_day = TOMORROW, TOMORROW + timedelta(days=150)
+        response = self.client.post(
+            reverse("create_trainings"),
+            data={
+                "first_day": first_day,
+                "last_day": last_day,
+                "weekdays": [5, 6],
+                "info": "Saison",
+                "max_pilots": 11,
+                "priority_date": TODAY,
+            },
+            follow=True,
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/training_list.html")
+        weekend_days = [
+            first_day + timedelta(days=i)
+            for i in range(151)
+            if (first_day + timedelta(days=i)).weekday() >= 5
+        ]
+        trainings = Training.objects.filter(info="Saison")
+        self.assertEqual(weekend_days, [training.date for training in trainings])
+
+        training = Training.objects.get(date=TOMORROW)
+        if TOMORROW.weekday() >= 5:
+            self.assertEqual("Saison", training.info)
+            self.assertLess(last_week, training.updated_on)
+        else:
+            self.assertEqual("Old info", training.info)
+            self.assertEqual(last_week, training.updated_on)
+
+    def test_cannot_create_trainings_on_no_days(self):
+        response = self.client.post(
+            reverse("create_trainings"),
+            data={
+                "first_day": TOMORROW,
+                "last_day": TOMORROW,
+                "weekdays": [(TOMORROW.weekday() + 1) % 7],
+                "info": "Info",
+                "max_pilots": 11,
+                "priority_date": TODAY,
+            },
+            follow=True,
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "trainings/training_create.html")
+        self.assertContains(response, "Keine Tage mit den gewählten Wochentagen.")
+        self.assertEqual(0, len(Training.objects.all()))
+
+    def test_cannot_create_more_than_62_trainings(self):
         response = self.client.post(
             reverse("create_trainings"),
             data={
                 "first_day": TODAY,
-                "last_day": TODAY + timedelta(days=32),
+                "last_day": TODAY + timedelta(days=62),
                 "info": "Info",
                 "max_pilots": 11,
                 "priority_date": TODAY,
@@ -857,23 +1152,28 @@ class DatabaseCallsTests(TestCase):
                 Signup(pilot=pilot, training=training).save()
 
     def test_training_list_view(self):
-        with self.assertNumQueries(10 + self.num_days * self.num_pilots):
+        with self.assertNumQueries(9 + self.num_days * self.num_pilots):
             response = self.client.get(reverse("trainings"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/training_list.html")
 
+    def test_training_status_view(self):
+        with self.assertNumQueries(8 + self.num_days * self.num_pilots):
+            response = self.client.get(reverse("training_status"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
     def test_training_create_view(self):
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(2):
             response = self.client.get(reverse("create_trainings"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/training_create.html")
 
-        with self.assertNumQueries(2 + 2 * self.num_days):
+        with self.assertNumQueries(5):
             response = self.client.post(
                 reverse("create_trainings"),
                 data={
-                    "first_day": TODAY + timedelta(days=90),
-                    "last_day": TODAY + timedelta(days=90 + self.num_days - 1),
+                    "first_day": TODAY,
+                    "last_day": TODAY + timedelta(days=2 * self.num_days - 1),
                     "info": "Info",
                     "max_pilots": 11,
                     "priority_date": TODAY,
@@ -881,17 +1181,17 @@ class DatabaseCallsTests(TestCase):
                 follow=False,
             )
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
-        self.assertEqual(2 * self.num_days, len(Training.objects.all()))
+        self.assertEqual(2 * self.num_days, len(Training.objects.filter(info="Info")))
 
     def test_training_update_view(self):
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(3):
             response = self.client.get(
                 reverse("update_training", kwargs={"date": TODAY})
             )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/training_update.html")
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(2):
             response = self.client.post(
                 reverse("update_training", kwargs={"date": TODAY}),
                 data={
@@ -903,14 +1203,14 @@ class DatabaseCallsTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
     def test_emergency_mail_view(self):
-        with self.assertNumQueries(12 + self.num_pilots):
+        with self.assertNumQueries(11 + self.num_pilots):
             response = self.client.get(
                 reverse("emergency_mail", kwargs={"date": TODAY})
             )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "trainings/emergency_mail.html")
 
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(6):
             response = self.client.post(
                 reverse("emergency_mail", kwargs={"date": TODAY}),
                 data={
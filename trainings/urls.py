@@ -20,6 +20,13 @@ register_converter(DateConverter, "date")
 
 urlpatterns = [
     path("", views.TrainingListView.as_view(), name="trainings"),
+    path("status/", views.TrainingStatusView.as_view(), name="training_status"),
+    path("events/", views.TrainingEventsView.as_view(), name="training_events"),
+    path(
+        "<date:date>/events/",
+        views.TrainingEventsView.as_view(),
+        name="training_events",
+    ),
     path(
         "infos/",
         TemplateView.as_view(template_name="trainings/about.html"),
@@ -39,6 +46,11 @@ urlpatterns = [
     path("meine-trainings/", views.SignupListView.as_view(), name="signups"),
     path("einschreiben/", views.SignupCreateView.as_view(), name="signup"),
     path("<date:date>/einschreiben/", views.SignupCreateView.as_view(), name="signup"),
+    path(
+        "mehrfach-einschreiben/",
+        views.SignupBatchCreateView.as_view(),
+        name="batch_signup",
+    ),
     path(
         "<date:date>/bearbeiten/",
         views.SignupUpdateView.as_view(),
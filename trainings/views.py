@@ -1,35 +1,50 @@
 from datetime import timedelta
+from hashlib import md5
+import json
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import prefetch_related_objects
-from django.http import Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, prefetch_related_objects
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
 from django.utils.formats import date_format
+from django.utils.http import http_date
 from django.views import generic
 
 from . import forms
+from .events import EventStream
 from .models import Signup, Training
+from news.views import AsyncListView, AsyncViewMixin
 
 
-class TrainingListView(LoginRequiredMixin, generic.ListView):
+async def aupcoming_trainings():
+    trainings = Training.objects.filter(
+        date__gte=timezone.now().date()
+    ).prefetch_related("signups__pilot")
+    async for training in trainings:
+        await sync_to_async(training.select_signups)()
+    # Selecting signups can alter their order, but Signup instances cannot be
+    # sorted. Refreshing them from the DB is the best solution I found 🤷
+    trainings = Training.objects.filter(
+        date__gte=timezone.now().date()
+    ).prefetch_related("signups__pilot")
+    return trainings
+
+
+class TrainingListView(LoginRequiredMixin, AsyncListView):
     paginate_by = 4
 
-    def get_queryset(self):
-        trainings = Training.objects.filter(
-            date__gte=timezone.now().date()
-        ).prefetch_related("signups__pilot")
-        for training in trainings:
-            training.select_signups()
-        # Selecting signups can alter their order, but Signup instances cannot be
-        # sorted. Refreshing them from the DB is the best solution I found 🤷
-        trainings = Training.objects.filter(
-            date__gte=timezone.now().date()
-        ).prefetch_related("signups__pilot")
-        return trainings
+    async def aget_queryset(self):
+        return await aupcoming_trainings()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -39,6 +54,138 @@ class TrainingListView(LoginRequiredMixin, generic.ListView):
         return context
 
 
+class TrainingStatusView(AsyncViewMixin, LoginRequiredMixin, generic.View):
+    """
+    Compact JSON of upcoming trainings for clients polling for their status. Signups
+    are listed as [pilot.pk, pilot name, status] with status as in Signup.Status.
+    Supports conditional GET and `?since=<last_modified>` to only get the trainings
+    changed since the previous response.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        since = None
+        if "since" in request.GET:
+            try:
+                # An unencoded "+" of the UTC offset arrives as space
+                since = parse_datetime(request.GET["since"].replace(" ", "+"))
+            except ValueError:
+                since = None
+            if not since:
+                return JsonResponse({"error": "Ungültiges Datum."}, status=400)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        # Answer polls of unchanged trainings before selecting signups and serializing
+        if {"HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE"} & request.META.keys():
+            etag, last_modified = await self.afingerprint(request)
+            if response := get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            ):
+                return response
+
+        trainings = await aupcoming_trainings()
+        # Selecting signups might have changed them
+        etag, last_modified = await self.afingerprint(request)
+        trainings = [training async for training in trainings]
+        modified = {
+            training.date: max(
+                [training.updated_on]
+                + [signup.updated_on for signup in training.signups.all()]
+            )
+            for training in trainings
+        }
+        newest = max(modified.values(), default=None)
+        status = {
+            "pilot": request.user.pk,
+            "last_modified": newest and newest.isoformat(),
+            "dates": [training.date.isoformat() for training in trainings],
+            "trainings": [
+                self.training_status(training)
+                for training in trainings
+                if not since or since < modified[training.date]
+            ],
+        }
+
+        response = JsonResponse(status)
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    async def afingerprint(request):
+        """
+        ETag and Last-Modified of the upcoming trainings from one aggregate query. Deleted
+        signups don't change the latter, thus the former also hashes the counts. As the
+        selection depends on the date, it is hashed too.
+        """
+        today = timezone.now().date()
+        fingerprint = await Training.objects.filter(date__gte=today).aaggregate(
+            number_of_trainings=Count("pk", distinct=True),
+            number_of_signups=Count("signups"),
+            trainings_updated_on=Max("updated_on"),
+            signups_updated_on=Max("signups__updated_on"),
+        )
+        etag = json.dumps(
+            [request.user.pk, today, request.GET.get("since"), fingerprint],
+            cls=DjangoJSONEncoder,
+        )
+        etag = md5(etag.encode(), usedforsecurity=False).hexdigest()
+        last_modified = max(
+            filter(
+                None,
+                [fingerprint["trainings_updated_on"], fingerprint["signups_updated_on"]],
+            ),
+            default=None,
+        )
+        # HTTP dates have whole seconds
+        return f'"{etag}"', last_modified and int(last_modified.timestamp())
+
+    def training_status(self, training):
+        signups = training.signups.all()
+        return {
+            "date": training.date.isoformat(),
+            "info": training.info,
+            "max_pilots": training.max_pilots,
+            "number_of_selected_pilots": sum(signup.is_selected for signup in signups),
+            "number_of_motivated_pilots": training.number_of_motivated_pilots,
+            "signups": [
+                [signup.pilot.pk, str(signup.pilot), signup.status]
+                for signup in signups
+            ],
+        }
+
+
+class TrainingEventsView(AsyncViewMixin, LoginRequiredMixin, generic.View):
+    """
+    Server-sent events of signup changes and new runs of upcoming trainings or of the
+    training on the given date. Clients reconnect after streams ended. Requires ASGI,
+    as Django serves async streams via WSGI only once they ended. Then "204 No Content"
+    tells clients to stop reconnecting and poll trainings/status/ instead.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+
+        response = StreamingHttpResponse(
+            self.stream(EventStream(request.user, self.kwargs.get("date"))),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, events):
+        yield f"retry: {int(settings.EVENTS_POLL_INTERVAL * 1000)}\n\n"
+        async for event in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
 class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
         return self.request.user.is_staff
@@ -130,18 +277,18 @@ class EmergencyMailView(OrgaRequiredMixin, SuccessMessageMixin, generic.UpdateVi
         return self.success_url
 
 
-class SignupListView(LoginRequiredMixin, generic.ListView):
+class SignupListView(LoginRequiredMixin, AsyncListView):
     model = Signup
 
-    def get_queryset(self):
+    async def aget_queryset(self):
         today = timezone.now().date()
         queryset = (
             Signup.objects.filter(pilot=self.request.user, training__date__gte=today)
             .select_related("training")
             .prefetch_related("training__signups__pilot")
         )
-        for signup in queryset:
-            signup.training.select_signups()
+        async for signup in queryset:
+            await sync_to_async(signup.training.select_signups)()
         # After selecting signups, they have to be refreshed from the DB
         queryset = (
             Signup.objects.filter(pilot=self.request.user, training__date__gte=today)
@@ -175,11 +322,8 @@ class SignupCreateView(LoginRequiredMixin, SuccessMessageMixin, generic.CreateVi
         if Training.objects.filter(date=self.date).exists():
             training = Training.objects.get(date=self.date)
         else:
-            wednesday_before = self.date + timedelta(
-                days=(2 - self.date.weekday()) % 7 - 7
-            )
             training = Training.objects.create(
-                date=self.date, priority_date=wednesday_before
+                date=self.date, priority_date=forms.wednesday_before(self.date)
             )
         if Signup.objects.filter(pilot=pilot, training=training).exists():
             form.add_error(
@@ -215,6 +359,39 @@ class SignupCreateView(LoginRequiredMixin, SuccessMessageMixin, generic.CreateVi
         return success_url
 
 
+class SignupBatchCreateView(LoginRequiredMixin, generic.FormView):
+    form_class = forms.SignupBatchCreateForm
+    template_name = "trainings/signup_batch_create.html"
+    success_url = reverse_lazy("signups")
+
+    def get_initial(self):
+        """Default to the next week"""
+        today = timezone.now().date()
+        return {
+            "first_day": today.isoformat(),
+            "last_day": (today + timedelta(days=6)).isoformat(),
+        }
+
+    def form_valid(self, form):
+        signed_up, conflicts = form.create_signups(self.request.user)
+        conflicts = ", ".join(date_format(day, "D., j. M.") for day in conflicts)
+        if not signed_up:
+            form.add_error(None, f"Du bist bereits eingeschrieben für {conflicts}.")
+            return super().form_invalid(form)
+
+        messages.success(
+            self.request,
+            f"Eingeschrieben für <b>{len(signed_up)} Trainings</b> vom "
+            f"{date_format(signed_up[0], 'j. F')} bis "
+            f"{date_format(signed_up[-1], 'j. F Y')}.",
+        )
+        if conflicts:
+            messages.warning(
+                self.request, f"Du warst bereits eingeschrieben für {conflicts}."
+            )
+        return super().form_valid(form)
+
+
 class SignupUpdateView(LoginRequiredMixin, generic.UpdateView):
     form_class = forms.SignupUpdateForm
     template_name = "trainings/signup_update.html"